@@ -0,0 +1,75 @@
+""" JSON 编解码耗时对比: 标准库(改造前的写法) vs session_tester.codec
+
+用法: python benchmarks/bench_codec.py [--backend orjson|ujson|json] [--rounds N]
+输出每个请求(一次 HttpTransaction)在各环节的平均耗时，单位微秒
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from session_tester import codec  # noqa: E402
+from session_tester.session import HttpTransaction, Session  # noqa: E402
+from session_tester.user_info import UserInfo  # noqa: E402
+
+
+def make_session(rounds: int) -> Session:
+    req = {
+        "userid": "f3c2a9e0b7d64e1c9a8b7c6d5e4f3a2b",
+        "device": {"os": "android", "os_version": "14", "model": "Pixel 8", "lang": "zh_CN", "screen": [1080, 2400]},
+        "items": [{"id": i, "cnt": i % 7, "tag": f"道具{i}"} for i in range(20)],
+    }
+    rsp = {"code": 0, "msg": "ok", "data": {
+        "items": [{"id": i, "name": f"道具-{i}", "price": i * 1.5, "attrs": {"lvl": i % 10, "rare": i % 3 == 0}}
+                  for i in range(40)],
+        "sign": "8b1a9953c4611296a827abf8c47804d7"}}
+    s = Session("bench", create_flag=False)
+    s.session_id = 1
+    s.user_info = UserInfo(userid=req["userid"], extra={"index": 1})
+    s.transactions = [HttpTransaction("http://127.0.0.1:8000/api", "POST", 200, json.JSONEncoder().encode(req),
+                                      json.dumps(rsp), cost_time=0.01) for _ in range(rounds)]
+    return s, req
+
+
+def bench(name, func, number):
+    t = min(timeit.repeat(func, number=number, repeat=5)) / number
+    return name, t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=None)
+    parser.add_argument("--rounds", type=int, default=10, help="每个会话的请求数")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    codec.use_backend(args.backend)
+
+    s, req = make_session(args.rounds)
+    old_record = json.dumps(s.to_dict(), indent=2)
+    new_record = s.to_json()
+    rsp = s.transactions[0].response
+    n = args.number
+    rows = [
+        ("请求编码", bench("json.JSONEncoder().encode", lambda: json.JSONEncoder().encode(req), n * 10),
+         bench("codec.dumps", lambda: codec.dumps(req), n * 10)),
+        ("会话序列化", bench("json.dumps(indent=2)", lambda: json.dumps(s.to_dict(), indent=2), n),
+         bench("Session.to_json()", s.to_json, n)),
+        ("会话反序列化", bench("json.loads", lambda: Session.from_dict(json.loads(old_record)), n),
+         bench("Session.from_json", lambda: Session.from_json(new_record), n)),
+        ("响应解析", bench("json.loads", lambda: json.loads(rsp), n * 10),
+         bench("codec.loads", lambda: codec.loads(rsp), n * 10)),
+    ]
+    print(f"backend: {codec.backend()}, 每会话 {args.rounds} 个请求, "
+          f"会话记录 {len(old_record.encode())} -> {len(new_record.encode())} 字节")
+    print(f"{'环节':<8}{'改造前':>28}{'us/请求':>10}{'改造后':>22}{'us/请求':>10}{'加速':>8}")
+    for title, (old_name, old_t), (new_name, new_t) in rows:
+        per = args.rounds if title.startswith("会话") else 1
+        old_us, new_us = old_t * 1e6 / per, new_t * 1e6 / per
+        print(f"{title:<8}{old_name:>28}{old_us:>10.2f}{new_name:>22}{new_us:>10.2f}{old_us / new_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -71,7 +71,8 @@ class T(TestSuite):
         """
         item_set = set()
         for t in s.transactions:
-            items = t.rsp_json().get("items", [])
+            # 只解析 items 字段
+            items = t.extract("items", [])
             for item in items:
                 if item in item_set:
                     return CheckResult(False, f"item[{item}] repeat, {t}")
@@ -1,16 +1,27 @@
 from .client import Client
+from .distributed import Coordinator, Agent
 from .decorator import SessionMaintainerSimple, sm_n_rounds, sm_no_update, sm_no_init, sm_simple_n, \
     ts_with_http_cost_stat
-from .session import Session, HttpTransaction
+from .request import StReq, ReqTemplate
+from .retention import BodyRetention, KeepAll, KeepLastN, KeepSampled, KeepDigestOnly
+from .retry import RetryPolicy
+from .session import Session, HttpTransaction, ResponseDroppedError
 from .session_maintainer import SessionMaintainerBase
 from .test_suite import TestSuite
-from .testcase import SingleRequestCase, SingleSessionCase, AllSessionCase, CheckResult
+from .testcase import SingleRequestCase, SingleSessionCase, AllSessionCase, StreamingAllSessionCase, \
+    TransactionTableCase, CheckResult
 from .tester import Tester
+from .transaction_table import TransactionTable
 from .user_info import UserInfo
-from .utils import auto_gen_cases_from_chk_func, load_user_info_from_json, load_user_info_from_csv
+from .utils import auto_gen_cases_from_chk_func, load_user_info_from_json, load_user_info_from_csv, \
+    iter_user_info_from_json, iter_user_info_from_json_lines, iter_user_info_from_csv
 
-__all__ = ["Client", "Session", "UserInfo", "SingleRequestCase", "SingleSessionCase", "AllSessionCase", "Tester",
-           "TestSuite", "CheckResult", "HttpTransaction", "SessionMaintainerBase",
+__all__ = ["Client", "Session", "UserInfo", "SingleRequestCase", "SingleSessionCase", "AllSessionCase",
+           "StreamingAllSessionCase", "TransactionTableCase", "Tester",
+           "TestSuite", "CheckResult", "HttpTransaction", "ResponseDroppedError", "SessionMaintainerBase",
+           "TransactionTable", "StReq", "ReqTemplate", "RetryPolicy", "Coordinator", "Agent",
+           # retention.py
+           "BodyRetention", "KeepAll", "KeepLastN", "KeepSampled", "KeepDigestOnly",
            "SessionMaintainerSimple",
            # session_maintainer.py
            "sm_n_rounds", "sm_no_update", "sm_no_init", "sm_simple_n",
@@ -18,4 +29,5 @@ __all__ = ["Client", "Session", "UserInfo", "SingleRequestCase", "SingleSessionC
            "ts_with_http_cost_stat",
            # utils.py
            "auto_gen_cases_from_chk_func", "load_user_info_from_csv", "load_user_info_from_json",
+           "iter_user_info_from_csv", "iter_user_info_from_json", "iter_user_info_from_json_lines",
            ]
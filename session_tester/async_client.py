@@ -0,0 +1,82 @@
+import asyncio
+
+from .client import ClientBase, STEP_SEND, STEP_WAIT_SLOT
+from . import timing
+from .http_pool import AsyncConnStats, aiohttp_phase_trace_config
+from .request import StReq
+from .scheduler import ArrivalScheduler
+from .session_maintainer import SessionMaintainerBase
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def new_http_session(concurrency: int, limit_per_host: int = 0, conn_stats: AsyncConnStats = None):
+    """ 创建事件循环内共用的 aiohttp 会话，连接数上限与并发数一致，limit_per_host 为每个主机的连接上限(0 不限) """
+    if aiohttp is None:
+        raise RuntimeError("asyncio send engine requires aiohttp, please `pip install aiohttp`")
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=limit_per_host or 0)
+    trace_configs = [aiohttp_phase_trace_config()]
+    if conn_stats is not None:
+        trace_configs.append(conn_stats.trace_config())
+    return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+
+
+def _client_timeout(timeout):
+    # 与 requests 保持一致: (连接超时, 读超时) 或者单个总超时
+    if timeout is None:
+        return aiohttp.ClientTimeout(total=None)
+    if isinstance(timeout, (tuple, list)):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+# AsyncClient 在事件循环中维持一个会话，SessionMaintainer 的四个钩子保持同步调用
+class AsyncClient(ClientBase):
+    separate_tls = False  # aiohttp 建连耗时包含 TLS 握手，不单独区分
+
+    def __init__(self, session, session_maintainer: SessionMaintainerBase, http_session,
+                 scheduler: ArrivalScheduler = None, send_stat=None):
+        super().__init__(session, session_maintainer, scheduler, send_stat)
+        self.http_session = http_session
+
+    async def send_request(self, req: StReq, timeout, timer: timing.PhaseTimer = None):
+        timeout = _client_timeout(timeout)
+        if req.http_method == "GET":
+            ctx = self.http_session.get(req.url, params=req.req_data, headers=req.headers, timeout=timeout,
+                                        trace_request_ctx=timer)
+        elif req.http_method == "POST":
+            ctx = self.http_session.post(req.url, data=req.req_data, headers=req.headers, timeout=timeout,
+                                         trace_request_ctx=timer)
+        else:
+            raise RuntimeError(f"unsupported http method: {req.http_method}")
+        async with ctx as r:
+            body = await r.read()
+            if timer is not None:
+                timer.mark_end()
+            text = await r.text()
+            status_code = r.status
+        return status_code, text, len(body)
+
+    async def _perform(self, action: str, arg):
+        if action == STEP_SEND:
+            return await self.send_request(*arg)
+        if action == STEP_WAIT_SLOT:
+            return await self.scheduler.async_wait()
+        await asyncio.sleep(arg)
+        return None
+
+    async def run(self):
+        # 与 Client 共用会话主循环，动作在事件循环中 await 执行
+        steps = self.session_steps()
+        step = self.advance(steps)
+        while step is not None:
+            try:
+                result = await self._perform(*step)
+            except Exception as e:
+                step = self.advance(steps, error=e)
+            else:
+                step = self.advance(steps, result)
@@ -1,53 +1,78 @@
+from collections import Counter
 from typing import List, Dict
 
-from session_tester import AllSessionCase, Session, CheckResult, utils
+import numpy as np
 
+from session_tester import StreamingAllSessionCase, Session, CheckResult, tag_dist
 
-class HttpTransactionDistStatAllSessionCase(AllSessionCase):
-    """ Tag分布，不带校验 """
 
-    def __init__(self, name: str = None, expectation: str = None, tag_get_func=None, filter_func=None):
+class HttpTransactionDistStatAllSessionCase(StreamingAllSessionCase):
+    """ Tag分布，不带校验
+
+    按批统计标签数量(Counter)，批次间和校验进程间直接合并计数，不需要保留全部会话
+    """
+
+    def __init__(self, name: str = None, expectation: str = None, tag_get_func=None, filter_func=None,
+                 tag_path: str = None):
         """
         :param name: 测试名称
         :param expectation: 预期结果
-        :param tag_get_func: 从Session中获取标签的函数
+        :param tag_get_func: 从请求的响应 JSON 中获取标签的函数，返回列表时每个元素各计一次
         :param filter_func: 过滤函数，如果filter_func非空，则只有filter_func(s:Session)返回True的元素才会被统计
+        :param tag_path: 标签在响应中的路径，如 "data.items[*].id"，只解析该路径的值；
+                         同时指定 tag_get_func 时，tag_get_func 的参数为该路径的值
         """
+        if tag_get_func is None and tag_path is None:
+            raise ValueError("tag_get_func or tag_path is required")
         super().__init__(name, expectation)
         self.tag_get_func = tag_get_func
         self.filter_func = filter_func
+        self.tag_path = tag_path
 
-    def check(self, ssl: List[Session]) -> CheckResult:
+    def partial(self, session_list: List[Session]) -> Counter:
         if self.filter_func is not None:
-            ssl = list(filter(self.filter_func, ssl))
-        output = utils.transaction_elem_dist_stat(ssl, self.tag_get_func)
-        return CheckResult(True, "", output)
+            session_list = list(filter(self.filter_func, session_list))
+        return tag_dist.count_transaction_tags(session_list, self.tag_get_func, tag_path=self.tag_path)
 
+    def merge(self, acc: Counter, part: Counter) -> Counter:
+        acc.update(part)
+        return acc
 
-class HttpTransactionDistStatCheckAllSessionCase(AllSessionCase):
-    """ Tag分布，带校验 """
+    def finish(self, acc: Counter) -> CheckResult:
+        return CheckResult(True, "", tag_dist.format_dist_list(tag_dist.dist_list(acc)))
 
-    def __init__(self, name: str = None, expectation: str = None, tag_get_func=None, filter_func=None,
-                 dist_expectation: Dict = None):
-        super().__init__(name, expectation, filter_func)
-        self.tag_get_func = tag_get_func
-        self.dist_expectation = dist_expectation
 
-    def check(self, ssl: List[Session]) -> CheckResult:
-        output = utils.transaction_elem_dist_stat(ssl, self.tag_get_func, format_ratio=False)
-        err_result = None
-        for i, line in enumerate(output):
-            if line["group"] not in self.dist_expectation and err_result is None:
-                err_result = CheckResult(False, f"key {line['group']} not in output")
+class HttpTransactionDistStatCheckAllSessionCase(HttpTransactionDistStatAllSessionCase):
+    """ Tag分布，带校验
+
+    预期中有但未出现的标签以数量0、占比0补进报告并参与校验，预期占比超出 tolerance 时校验失败
+    (旧版本只校验出现过的标签，这类标签不会导致失败)；不在预期中的标签同样校验失败。
+    """
+
+    def __init__(self, name: str = None, expectation: str = None, tag_get_func=None, filter_func=None,
+                 dist_expectation: Dict = None, tolerance: float = 1e-3, tag_path: str = None):
+        """
+        :param dist_expectation: 标签 -> 预期占比，预期中有但未出现的标签按占比0校验
+        :param tolerance: 占比允许的误差
+        """
+        super().__init__(name, expectation, tag_get_func, filter_func, tag_path)
+        self.dist_expectation = dist_expectation or {}
+        self.tolerance = tolerance
 
-            if abs(line["ratio"] - self.dist_expectation[line["group"]]) > 1e-3 and err_result is None:
-                err_result = CheckResult(False,
-                                         f"key {line['group']} expect {self.dist_expectation[line['group']]}, got {line['ratio']}")
+    def finish(self, acc: Counter) -> CheckResult:
+        output = tag_dist.format_dist_list(tag_dist.dist_list(acc), format_ratio=False)
+        output += [{"group": k, "count": 0, "ratio": 0.0} for k in self.dist_expectation if k not in acc]
 
-            output[i]["expectition"] = self.dist_expectation[line["group"]]
+        expected = np.array([self.dist_expectation.get(line["group"], np.nan) for line in output], dtype=float)
+        ratios = np.array([line["ratio"] for line in output], dtype=float)
+        for line, e in zip(output, expected):
+            line["expectition"] = None if np.isnan(e) else float(e)
 
-        if err_result is None:
+        # 不在预期中的标签和占比超出误差的标签均视为失败，报告第一个
+        bad = np.flatnonzero(np.isnan(expected) | (np.abs(ratios - expected) > self.tolerance))
+        if not len(bad):
             return CheckResult(True, "", output)
-        else:
-            err_result.report_lines = output
-            return err_result
+        line = output[bad[0]]
+        if np.isnan(expected[bad[0]]):
+            return CheckResult(False, f"key {line['group']} not in expectation", output)
+        return CheckResult(False, f"key {line['group']} expect {line['expectition']}, got {line['ratio']}", output)
@@ -1,122 +1,229 @@
 import datetime
-import json
-import queue
-import threading
 import time
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
+from . import codec, timing
+from .http_pool import HttpSessionPool
 from .logger import logger
 from .request import StReq
+from .retry import RetryPolicy
+from .scheduler import ArrivalScheduler
 from .session import HttpTransaction
 from .session_maintainer import SessionMaintainerBase
 
+# 会话主循环交给收发引擎执行的动作: 等待计划发送时刻、发送一次请求、重试前等待
+STEP_WAIT_SLOT = "wait_slot"
+STEP_SEND = "send"
+STEP_SLEEP = "sleep"
 
-# Client 用于收发HTTP请求的
-class Client:
-    http_session_lock = threading.Lock()
-    http_session_queue = queue.Queue()
 
-    def __init__(self, session, session_maintainer: SessionMaintainerBase):
+# ClientBase 负责会话生命周期中与收发方式无关的部分，同步和异步Client共用
+class ClientBase:
+    _default_retry_policies = {}
+    separate_tls = True  # 能否单独记录 TLS 握手耗时，见 timing.PhaseTimer
+
+    def __init__(self, session, session_maintainer: SessionMaintainerBase, scheduler: ArrivalScheduler = None,
+                 send_stat=None):
         self.session = session
         self.session_maintainer = session_maintainer
-        self.http_session = self.get_http_session()
+        self.scheduler = scheduler
+        self.send_stat = send_stat
 
-    # 这四个函数从session中拿信息做处理
-    def run(self):
+    def init_session(self):
         if self.session_maintainer.init_session is not None:
             self.session_maintainer.init_session(self.session)
 
-        while True:
-            http_trans = HttpTransaction("", "", None, None, None)
-            req = self.session_maintainer.wrap_req(self.session)
-            if not isinstance(req, StReq):
-                req = StReq(req)
-            if req.url is None:
-                req.url = self.session_maintainer.url
-            if req.http_method is None:
-                req.http_method = self.session_maintainer.http_method
+    def build_req(self) -> StReq:
+        req = self.session_maintainer.wrap_req(self.session)
+        if not isinstance(req, StReq):
+            req = StReq(req)
+        if req.url is None:
+            req.url = self.session_maintainer.url
+        if req.http_method is None:
+            req.http_method = self.session_maintainer.http_method
+        if isinstance(req.req_data, (dict, list)):
+            req.req_data = codec.dumps(req.req_data, ensure_ascii=True)
             if req.headers is None:
-                req.headers = {}
-            if isinstance(req.req_data, (dict, list)):
-                req.req_data = json.JSONEncoder().encode(req.req_data)
-                req.headers["Content-Type"] = "application/json"
-
-            http_trans.url = req.url
-            http_trans.method = req.http_method
-
-            def send_request():
-                http_trans.request = req.req_data
-                http_trans.request_time = datetime.datetime.now()
-                if req.http_method == "GET":
-                    r_ = self.http_session.get(req.url, params=req.req_data, headers=req.headers, timeout=req.timeout)
-                elif req.http_method == "POST":
-                    r_ = self.http_session.post(req.url, data=req.req_data, headers=req.headers, timeout=req.timeout)
-                else:
-                    raise RuntimeError(f"unsupported http method: {req.http_method}")
-                end_time = datetime.datetime.now()  # 记录结束时间
-                elapsed_time = (end_time - http_trans.request_time).total_seconds()  # 计算请求时间
-                return r_, elapsed_time
-
-            r = None
-            cost = 0
-            for _ in range(req.retry + 1):
+                req.headers = {"Content-Type": "application/json"}
+            elif req.headers.get("Content-Type") != "application/json":
+                # headers 可能在多个请求间共用，不原地修改
+                req.headers = dict(req.headers, **{"Content-Type": "application/json"})
+        elif req.headers is None:
+            req.headers = {}
+        return req
+
+    def get_retry_policy(self, req: StReq) -> RetryPolicy:
+        if req.retry_policy is not None:
+            return req.retry_policy
+        if self.session_maintainer.retry_policy is not None:
+            return self.session_maintainer.retry_policy
+        policy = self._default_retry_policies.get(req.retry)
+        if policy is None:
+            # 按 StReq.retry 构造的默认策略保持原有行为: 所有非 200 状态码都重试
+            policy = self._default_retry_policies[req.retry] = RetryPolicy(max_retries=req.retry,
+                                                                           retry_on_status=None)
+        return policy
+
+    @staticmethod
+    def finish_attempts(http_trans: HttpTransaction, attempts: list):
+        http_trans.retry_cnt = len(attempts) - 1
+        http_trans.attempts = attempts if len(attempts) > 1 else None
+
+    def session_steps(self):
+        """ 会话主循环: 构造请求、定速调度、按重试策略发送、记录各次尝试和阶段耗时
+
+        与收发方式无关，写成生成器: 产出 (动作, 参数) 由 Client 阻塞执行或由 AsyncClient await 执行，
+        执行结果通过 send 交回，发送失败的异常通过 throw 交回。
+        STEP_SEND 的参数为 (req, timeout, timer)，结果为 (状态码, 响应文本, 响应字节数)。
+        """
+        self.init_session()
+
+        while True:
+            req = self.build_req()
+            http_trans = HttpTransaction(req.url, req.http_method, None, None, None)
+            if self.scheduler is not None:
+                intended = yield STEP_WAIT_SLOT, None
+                http_trans.sched_lag = time.monotonic() - intended
+
+            policy = self.get_retry_policy(req)
+            http_trans.request = req.req_data
+            http_trans.request_time = datetime.datetime.now()
+            started = time.monotonic()
+            attempts = []
+            while True:
+                attempt_start = time.monotonic()
+                timer = timing.PhaseTimer(self.separate_tls)
                 try:
-                    r, cost = send_request()
-                    if r.status_code == 200:
-                        break
-                except:
-                    time.sleep(0.5)
-                http_trans.retry_cnt += 1
-
-            if r is None:
-                self.session.append_transaction(http_trans)
-                logger.error(f"break session, failed to send request: {req}")
-                break
-            http_trans.status_code = r.status_code
-            http_trans.response = r.text
+                    status_code, text, http_trans.rsp_size = \
+                        yield STEP_SEND, (req, policy.attempt_timeout(req.timeout, started), timer)
+                    error = None
+                except Exception as e:
+                    status_code, text, error = None, None, type(e).__name__
+                    http_trans.rsp_size = None
+                attempts.append([round(time.monotonic() - attempt_start, 6), status_code, error])
+                http_trans.phases = timer.phases()
+                if status_code == 200:
+                    break
+                delay = policy.next_delay(len(attempts), status_code, started)
+                if delay is None:
+                    break
+                yield STEP_SLEEP, delay
+            cost = time.monotonic() - started
+            self.finish_attempts(http_trans, attempts)
+
+            if not self.on_response(http_trans, req, status_code, text, cost):
+                return
+
+    @staticmethod
+    def advance(steps, result=None, error: Exception = None):
+        """ 把动作的执行结果(或异常)交回会话主循环，返回下一个动作，会话结束时返回 None """
+        try:
+            return steps.send(result) if error is None else steps.throw(error)
+        except StopIteration:
+            return None
+
+    def on_response(self, http_trans: HttpTransaction, req: StReq, status_code, text, cost) -> bool:
+        """ 记录本轮请求结果，返回是否继续会话 """
+        if status_code is None:
             http_trans.cost_time = cost
             self.session.append_transaction(http_trans)
-            if r.status_code != 200:
-                logger.error("break session, "
-                             f"failed to send request: {req}, status_cod: {r.status_code}, rsp: {r.text}")
-                break
+            if self.send_stat is not None:
+                self.send_stat.add_transaction(http_trans)
+            logger.error(f"break session, failed to send request: {req}")
+            return False
+        http_trans.status_code = status_code
+        http_trans.response = text
+        http_trans.cost_time = cost
+        self.session.append_transaction(http_trans)
+        if self.send_stat is not None:
+            self.send_stat.add_transaction(http_trans)
+        if status_code != 200:
+            logger.error("break session, "
+                         f"failed to send request: {req}, status_cod: {status_code}, rsp: {text}")
+            return False
+
+        if self.session_maintainer.body_retention is not None:
+            self.session_maintainer.body_retention.apply(self.session)
+
+        if self.session_maintainer.update_session is not None:
+            self.session_maintainer.update_session(self.session)
+
+        if self.session_maintainer.should_stop_session is None or \
+                self.session_maintainer.should_stop_session(self.session):
+            return False
+        return True
 
-            if self.session_maintainer.update_session is not None:
-                self.session_maintainer.update_session(self.session)
 
-            if self.session_maintainer.should_stop_session is None or \
-                    self.session_maintainer.should_stop_session(self.session):
-                break
+# Client 用于收发HTTP请求的
+class Client(ClientBase):
+    http_pool = HttpSessionPool()  # 未指定连接池时共用的默认池
+
+    def __init__(self, session, session_maintainer: SessionMaintainerBase, scheduler: ArrivalScheduler = None,
+                 send_stat=None, http_pool: HttpSessionPool = None):
+        super().__init__(session, session_maintainer, scheduler, send_stat)
+        if http_pool is not None:
+            self.http_pool = http_pool
+        self.http_session = None
+
+    def send_request(self, req: StReq, timeout, timer: timing.PhaseTimer = None):
+        # stream=True 时收到响应头即返回，随后读取响应体，以区分首字节和下载耗时
+        timing.activate(timer)
+        try:
+            if req.http_method == "GET":
+                r = self.http_session.get(req.url, params=req.req_data, headers=req.headers, timeout=timeout,
+                                          stream=True)
+            elif req.http_method == "POST":
+                # 字符串报文按 UTF-8 发送，requests 默认按 latin-1 编码，遇到未转义的中文会失败
+                data = req.req_data.encode('utf-8') if isinstance(req.req_data, str) else req.req_data
+                r = self.http_session.post(req.url, data=data, headers=req.headers, timeout=timeout, stream=True)
+            else:
+                raise RuntimeError(f"unsupported http method: {req.http_method}")
+        finally:
+            timing.activate(None)
+        if timer is not None:
+            timer.mark_headers()
+        try:
+            _ = r.content  # 读完响应体后连接归还连接池
+        except Exception:
+            r.close()
+            raise
+        if timer is not None:
+            timer.mark_end()
+        return r
 
-    def __del__(self):
-        self.release_session(self.http_session)
+    def run(self):
+        # 会话期间独占一个 requests.Session，结束后立即归还
+        self.http_session = self.http_pool.checkout()
+        try:
+            self._run()
+        finally:
+            self.http_pool.checkin(self.http_session)
+            self.http_session = None
+
+    def _perform(self, action: str, arg):
+        if action == STEP_SEND:
+            r = self.send_request(*arg)
+            return r.status_code, r.text, len(r.content)
+        if action == STEP_WAIT_SLOT:
+            return self.scheduler.wait()
+        time.sleep(arg)
+        return None
+
+    def _run(self):
+        # 阻塞执行会话主循环的每个动作
+        steps = self.session_steps()
+        step = self.advance(steps)
+        while step is not None:
+            result, error = None, None
+            try:
+                result = self._perform(*step)
+            except Exception as e:
+                error = e
+            step = self.advance(steps, result, error)
 
     @classmethod
     def get_http_session(cls):
-        with cls.http_session_lock:
-            try:
-                return cls.http_session_queue.get_nowait()
-            except:
-                s = requests.Session()
-
-                # 定义重试策略
-                retry_strategy = Retry(
-                    total=3,  # 总共重试次数
-                    backoff_factor=1,  # 重试间隔时间的倍数
-                    status_forcelist=[429, 500, 502, 503, 504],  # 需要重试的HTTP状态码
-                    allowed_methods=["HEAD", "GET", "OPTIONS", "POST"]  # 需要重试的方法
-                )
-
-                # 创建一个适配器并将其安装到会话中
-                adapter = HTTPAdapter(max_retries=retry_strategy)
-                s.mount("http://", adapter)
-                s.mount("https://", adapter)
-                return s
+        return cls.http_pool.checkout()
 
     @classmethod
     def release_session(cls, http_session):
-        with cls.http_session_lock:
-            cls.http_session_queue.put(http_session)
+        cls.http_pool.checkin(http_session)
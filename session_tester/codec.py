@@ -0,0 +1,76 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+JSON_BACKEND_ORJSON = "orjson"
+JSON_BACKEND_UJSON = "ujson"
+JSON_BACKEND_STDLIB = "json"
+
+_backend = JSON_BACKEND_STDLIB
+
+
+def use_backend(name: str = None):
+    """ 选择 JSON 编解码后端，None 表示按 orjson、ujson、标准库的顺序选择已安装的 """
+    global _backend
+    if name is None:
+        name = JSON_BACKEND_ORJSON if orjson is not None else JSON_BACKEND_UJSON if ujson is not None \
+            else JSON_BACKEND_STDLIB
+    if name == JSON_BACKEND_ORJSON and orjson is None or name == JSON_BACKEND_UJSON and ujson is None:
+        raise RuntimeError(f"JSON backend {name} is not installed")
+    if name not in (JSON_BACKEND_ORJSON, JSON_BACKEND_UJSON, JSON_BACKEND_STDLIB):
+        raise ValueError(f"Invalid JSON backend: {name}")
+    _backend = name
+
+
+def backend() -> str:
+    return _backend
+
+
+def dumps(o, indent: int = None, ensure_ascii: bool = False) -> str:
+    """ 序列化为 JSON 字符串，indent 为 None 时输出紧凑格式
+
+    默认非 ASCII 字符不转义，用于会话存储；请求报文传 ensure_ascii=True，与标准库默认的 \\uXXXX 转义一致。
+    快速后端不支持的对象(超过 64 位的整数等)退回标准库处理
+    """
+    if _backend == JSON_BACKEND_ORJSON and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            s = orjson.dumps(o, option=option).decode('utf-8')
+            # orjson 不支持转义非 ASCII 字符，只有纯 ASCII 的结果可以直接使用
+            if not ensure_ascii or s.isascii():
+                return s
+        except TypeError:
+            pass
+    elif _backend == JSON_BACKEND_UJSON:
+        try:
+            return ujson.dumps(o, ensure_ascii=ensure_ascii, escape_forward_slashes=False, indent=indent or 0)
+        except (TypeError, OverflowError):
+            pass
+    return json.dumps(o, ensure_ascii=ensure_ascii, indent=indent, separators=None if indent else (',', ':'))
+
+
+def loads(s):
+    if _backend == JSON_BACKEND_ORJSON:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # orjson 不支持超过 64 位的整数和 NaN，交给标准库再解析一次，真正的格式错误由标准库抛出
+            return json.loads(s)
+    if _backend == JSON_BACKEND_UJSON:
+        try:
+            return ujson.loads(s)
+        except ValueError:
+            return json.loads(s)
+    return json.loads(s)
+
+
+use_backend(os.getenv("SESSION_TESTER_JSON_BACKEND") or None)
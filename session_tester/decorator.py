@@ -1,22 +1,31 @@
-from typing import List
-
 from .session import Session
 from .session_maintainer import SessionMaintainerBase
 from .testcase import CheckResult
-from .utils import stat_http_transaction_cost
+from .transaction_table import TransactionTable
+from .utils import stat_http_transaction_cost, stat_http_transaction_phases
 
 
-# 为测试套件添加请求耗时统计
+# 为测试套件添加请求耗时统计，直接读取请求元数据表，不加载会话
+# 与其他整体校验一致，只统计所有请求都返回 200 的会话，没有这样的会话时报告为空
 def ts_with_http_cost_stat(cls):
     @staticmethod
-    def chk_http_cost_dist(ssl: List[Session]):
+    def chk_http_cost_dist(table: TransactionTable):
         """检查请求耗时分布:
         None
         """
-        _, report = stat_http_transaction_cost(ssl)
+        _, report = stat_http_transaction_cost(table, ok_sessions_only=True)
+        return CheckResult(True, None, report)
+
+    @staticmethod
+    def chk_http_phase_dist(table: TransactionTable):
+        """检查请求阶段耗时分布:
+        None
+        """
+        _, report = stat_http_transaction_phases(table, ok_sessions_only=True)
         return CheckResult(True, None, report)
 
     cls.chk_http_cost_dist = chk_http_cost_dist
+    cls.chk_http_phase_dist = chk_http_phase_dist
     return cls
 
 
@@ -0,0 +1,486 @@
+import datetime
+import queue
+import socket
+import struct
+import threading
+import time
+import traceback
+from typing import Dict, Iterator, List, Optional
+
+from . import codec
+from .live_metrics import LiveMetrics
+from .logger import logger
+from .send_stat import SendStat
+from .session import Session, get_session_store, close_session_store, update_test_session_dir
+from .test_suite import TestSuite, SEND_ENGINE_THREAD, _load_user_info, _QUEUE_END
+from .tester import Tester
+from .transaction_table import TransactionTable
+from .user_info import UserInfo
+
+DEFAULT_AGENT_PORT = 9100
+# Agent 持有(含在途)的用户批数，一批用户全部交给发送线程后再拉取下一批，发送不因网络往返而停顿
+PULL_AHEAD = 2
+
+_HEADER = struct.Struct(">I")
+
+
+def send_msg(sock: socket.socket, msg: dict, lock: threading.Lock = None):
+    """ 发送一条消息: 4 字节大端长度 + UTF-8 JSON """
+    data = codec.dumps(msg).encode('utf-8')
+    if lock is None:
+        sock.sendall(_HEADER.pack(len(data)) + data)
+        return
+    with lock:
+        sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_msg(sock: socket.socket) -> Optional[dict]:
+    """ 接收一条消息，连接关闭时返回 None """
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exact(sock, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return codec.loads(data)
+
+
+def _parse_address(address: str):
+    host, _, port = address.rpartition(":")
+    if not host:
+        return address, DEFAULT_AGENT_PORT
+    return host, int(port)
+
+
+class Agent:
+    """ 分布式发送的执行端，在每台发压机上运行，由 Coordinator 通过 TCP 控制
+
+    Agent 持有与 Coordinator 相同的 Tester(测试套件和会话维护逻辑)，按自身发送进度向 Coordinator 拉取用户信息，
+    发送过程中每隔 report_interval 秒上报累计发送统计，结束后上报最终统计，并按需回传会话供集中校验。
+    会话保存在 Tester 会话目录下的 session_subdir 子目录中，同一台机器上的多个 Agent 互不影响。
+    协议没有认证，只应在可信网络中使用。
+    """
+
+    def __init__(self, tester: Tester, host: str = "0.0.0.0", port: int = DEFAULT_AGENT_PORT,
+                 session_subdir: str = None):
+        self.tester = tester
+        self.host = host
+        self.port = port
+        self.suites: Dict[str, TestSuite] = {ts.name: ts for ts in tester.test_suites}
+        update_test_session_dir(tester.name, session_subdir or f"agent-{port}")
+        self._send_lock = threading.Lock()
+        self._feed = None
+        self._sender = None
+
+    def serve_forever(self, once: bool = False):
+        """ 依次处理 Coordinator 的连接，once 为 True 时处理完一个连接后返回 """
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.host, self.port))
+            server.listen(1)
+            logger.info(f"Agent 监听 {self.host}:{self.port}")
+            while True:
+                conn, addr = server.accept()
+                logger.info(f"Coordinator 已连接: {addr[0]}:{addr[1]}")
+                with conn:
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    try:
+                        self.handle(conn)
+                    except (OSError, RuntimeError) as e:
+                        logger.error(f"Coordinator 连接异常: {e}")
+                self._finish_feed()
+                if once:
+                    return
+
+    def handle(self, conn: socket.socket):
+        while True:
+            msg = recv_msg(conn)
+            if msg is None or msg["type"] == "bye":
+                logger.info("Coordinator 已断开")
+                return
+            handler = getattr(self, f"_on_{msg['type']}", None)
+            if handler is None:
+                raise RuntimeError(f"unknown message type: {msg['type']}")
+            handler(conn, msg)
+
+    def _suite(self, name: str) -> TestSuite:
+        ts = self.suites.get(name)
+        if ts is None:
+            raise RuntimeError(f"unknown test suite: {name}")
+        return ts
+
+    def _finish_feed(self):
+        # 连接中断时让发送线程正常结束
+        if self._feed is not None:
+            self._feed.put(None)
+            self._feed = None
+        if self._sender is not None:
+            self._sender.join()
+            self._sender = None
+
+    def _on_hello(self, conn, _):
+        send_msg(conn, {"type": "hello", "suites": list(self.suites)}, self._send_lock)
+
+    def _on_prepare(self, conn, msg):
+        ts = self._suite(msg["suite"])
+        if msg.get("clear"):
+            ts.clear_sessions()
+        # 与多进程发送一致: user_info_queue 初始为空，load_user_info 从拉取到的用户信息中转入
+        feed = self._feed = queue.Queue()
+        session_maintainer = ts.session_maintainer
+        session_maintainer.user_info_queue = queue.Queue(maxsize=msg["send_kwargs"]["thread_cnt"])
+        session_maintainer.load_user_info = \
+            lambda: session_maintainer.put_user_info(self._pull_users(conn, ts.name, feed))
+        send_msg(conn, {"type": "ready", "suite": ts.name}, self._send_lock)
+
+    def _pull_users(self, conn, name: str, feed: queue.Queue):
+        """ 按发送进度拉取用户信息: user_info_queue 满时不再消费，也就不再拉取，慢的 Agent 分到的用户少 """
+        pull = {"type": "pull", "suite": name}
+        for _ in range(PULL_AHEAD):
+            send_msg(conn, pull, self._send_lock)
+        while True:
+            items = feed.get()
+            if items is None:
+                return
+            for d in items:
+                yield UserInfo.from_dict(d)
+            send_msg(conn, pull, self._send_lock)
+
+    def _on_start(self, conn, msg):
+        ts = self._suite(msg["suite"])
+        self._sender = threading.Thread(target=self._send, args=(conn, ts, msg), daemon=True)
+        self._sender.start()
+
+    def _send(self, conn, ts: TestSuite, msg: dict):
+        delay = msg.get("start_at", 0) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        stopped = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(conn, ts, msg.get("report_interval") or 1, stopped),
+                                    daemon=True)
+        reporter.start()
+        result = {"type": "done", "suite": ts.name}
+        try:
+            result["stat"] = ts.do_send(**msg["send_kwargs"]).to_dict()
+        except Exception:  # pylint: disable=broad-except
+            result["error"] = traceback.format_exc()
+            logger.error(f"{ts.name} 发送失败: {result['error']}")
+        finally:
+            stopped.set()
+            reporter.join()
+            close_session_store()
+        try:
+            send_msg(conn, result, self._send_lock)
+        except OSError as e:
+            logger.error(f"上报发送结果失败: {e}")
+
+    def _report(self, conn, ts: TestSuite, interval: float, stopped: threading.Event):
+        while not stopped.wait(interval):
+            getter = ts.send_stats_getter
+            if getter is None:
+                continue
+            total = SendStat()
+            for stat in getter():
+                total.merge(stat)
+            try:
+                send_msg(conn, {"type": "metrics", "suite": ts.name, "stat": total.to_dict()}, self._send_lock)
+            except OSError:
+                return
+
+    def _on_users(self, _, msg):
+        self._feed.put(msg["items"])
+
+    def _on_users_end(self, *_):
+        self._feed.put(None)
+        self._feed = None
+
+    def _on_fetch_sessions(self, conn, msg):
+        label = msg["suite"]
+        batch_size = msg.get("batch_size", 100)
+        records = []
+        for record in get_session_store().read(label, Session.get_curr_id(label)):
+            records.append(record if isinstance(record, dict) else codec.loads(record))
+            if len(records) >= batch_size:
+                send_msg(conn, {"type": "sessions", "records": records}, self._send_lock)
+                records = []
+        if records:
+            send_msg(conn, {"type": "sessions", "records": records}, self._send_lock)
+        send_msg(conn, {"type": "sessions_end"}, self._send_lock)
+
+
+class _AgentConn:
+    """ Coordinator 与单个 Agent 的连接，读线程将实时指标单独保存，拉取请求转给 pulls，其余消息放入队列 """
+
+    def __init__(self, address: str, connect_timeout: float):
+        self.address = address
+        self.sock = socket.create_connection(_parse_address(address), timeout=connect_timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Lock()
+        self.messages = queue.Queue()
+        self.latest_stat: Optional[SendStat] = None
+        # 发送期间由 Coordinator 设置，Agent 拉取、结束发送或断开时放入本连接
+        self.pulls: Optional[queue.Queue] = None
+        self.finished = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            while True:
+                msg = recv_msg(self.sock)
+                if msg is None:
+                    break
+                if msg["type"] == "metrics":
+                    self.latest_stat = SendStat.from_dict(msg["stat"])
+                elif msg["type"] == "pull":
+                    self._notify()
+                else:
+                    if msg["type"] == "done":
+                        self.finished = True
+                        self._notify()
+                    self.messages.put(msg)
+        except OSError:
+            pass
+        self.finished = True
+        self._notify()
+        self.messages.put(None)
+
+    def _notify(self):
+        pulls = self.pulls
+        if pulls is not None:
+            pulls.put(self)
+
+    def send(self, msg: dict):
+        send_msg(self.sock, msg, self.lock)
+
+    def expect(self, msg_type: str) -> dict:
+        msg = self.messages.get()
+        if msg is None:
+            raise RuntimeError(f"agent {self.address} disconnected")
+        if msg["type"] != msg_type:
+            raise RuntimeError(f"agent {self.address}: expect {msg_type}, got {msg['type']}")
+        return msg
+
+    def close(self):
+        try:
+            self.send({"type": "bye"})
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def _iter_user_batches(q: queue.Queue, batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    while True:
+        item = q.get()
+        if item is _QUEUE_END:
+            break
+        batch.append(item.to_dict())
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Coordinator:
+    """ 分布式发送的控制端
+
+    按测试套件依次: 通知所有 Agent 准备，约定同一时刻开始发送，将本地加载的用户信息按批分发给发起拉取的 Agent，
+    汇总各 Agent 每秒上报的累计统计输出实时指标，发送结束后合并最终统计(耗时直方图按桶相加)。
+    新模式下将各 Agent 的会话取回，重新分配会话ID后写入本地存储，再按单机流程集中校验和生成报告。
+    """
+
+    def __init__(self, tester: Tester, agents: List[str], connect_timeout: float = 10):
+        """
+        :param agents: Agent 地址列表，格式为 host:port
+        """
+        if not agents:
+            raise ValueError("at least one agent is required")
+        self.tester = tester
+        self.agents = agents
+        self.connect_timeout = connect_timeout
+
+    def run(self, mode=Tester.RUN_MODE_NEW, thread_cnt=50, engine=SEND_ENGINE_THREAD, arrival_rate=None,
+            check_batch_size=1000, check_workers=0, report_interval=1, metrics_port=None, pool_maxsize=None,
+            prewarm_connections=0, processes=0, user_batch_size=100, start_delay=1.0) -> Dict[str, SendStat]:
+        """
+        参数与 Tester.run 一致，thread_cnt、pool_maxsize、processes 为每个 Agent 的配置，arrival_rate 为所有 Agent 的总速率
+        :param user_batch_size: 每次分发给 Agent 的用户信息条数，越小各 Agent 分到的用户越贴合各自的发送速度
+        :param start_delay: 通知开始后各 Agent 统一开始发送的延迟(秒)，需大于网络往返时间
+        :return: 测试套件名 -> 合并后的发送统计
+        """
+        if mode not in [Tester.RUN_MODE_NEW, Tester.RUN_MODE_CHECK, Tester.RUN_MODE_BENCHMARK]:
+            raise ValueError(f"Invalid tester run mode: {mode}")
+        if mode == Tester.RUN_MODE_CHECK:
+            self.tester.check_and_report(check_batch_size, check_workers)
+            return {}
+
+        conns = [_AgentConn(address, self.connect_timeout) for address in self.agents]
+        results = {}
+        try:
+            for conn in conns:
+                conn.send({"type": "hello"})
+                suites = conn.expect("hello")["suites"]
+                missing = [ts.name for ts in self.tester.test_suites if ts.name not in suites]
+                if missing:
+                    raise RuntimeError(f"agent {conn.address} has no test suite: {missing}")
+            logger.info(f"已连接 {len(conns)} 个 Agent")
+
+            no_dump = mode == Tester.RUN_MODE_BENCHMARK
+            if not no_dump:
+                for test_suite in self.tester.test_suites:
+                    test_suite.clear_sessions()
+                logger.info("清除会话数据成功")
+            send_kwargs = dict(thread_cnt=thread_cnt, no_dump=no_dump, engine=engine,
+                               arrival_rate=arrival_rate / len(conns) if arrival_rate else None,
+                               pool_maxsize=pool_maxsize, prewarm_connections=prewarm_connections,
+                               processes=processes)
+            for test_suite in self.tester.test_suites:
+                send_stat = self._send(conns, test_suite, send_kwargs, arrival_rate, report_interval, metrics_port,
+                                       user_batch_size, start_delay, clear=not no_dump)
+                send_stat.report()
+                results[test_suite.name] = send_stat
+                if not no_dump:
+                    self._collect_sessions(conns, test_suite)
+        finally:
+            for conn in conns:
+                conn.close()
+        logger.info("发送请求完成" if mode == Tester.RUN_MODE_NEW else "压测请求完成")
+
+        if mode == Tester.RUN_MODE_NEW:
+            self.tester.check_and_report(check_batch_size, check_workers)
+        return results
+
+    def _send(self, conns: List[_AgentConn], test_suite: TestSuite, send_kwargs: dict, arrival_rate,
+              report_interval, metrics_port, user_batch_size: int, start_delay: float, clear: bool) -> SendStat:
+        name = test_suite.name
+        for conn in conns:
+            conn.latest_stat = None
+            conn.finished = False
+            conn.send({"type": "prepare", "suite": name, "clear": clear, "send_kwargs": send_kwargs})
+        for conn in conns:
+            conn.expect("ready")
+
+        # 先设置好拉取队列再通知开始，Agent 开始发送时的拉取请求不会丢失
+        pulls = queue.Queue()
+        for conn in conns:
+            conn.pulls = pulls
+        start_at = time.time() + start_delay
+        for conn in conns:
+            conn.send({"type": "start", "suite": name, "start_at": start_at, "send_kwargs": send_kwargs,
+                       "report_interval": report_interval})
+        logger.info(f"{name} 开始分布式发送({len(conns)} 个 Agent, 每个 Agent 并发 {send_kwargs['thread_cnt']})")
+
+        live_metrics = None
+        if report_interval or metrics_port is not None:
+            live_metrics = LiveMetrics(name, lambda: [c.latest_stat for c in conns if c.latest_stat is not None],
+                                       interval=report_interval or 1, port=metrics_port)
+        time.sleep(max(0.0, start_at - time.time()))
+        send_stat = SendStat(arrival_rate=arrival_rate)
+        send_stat.start_time = datetime.datetime.now()
+        if live_metrics is not None:
+            live_metrics.start()
+        try:
+            user_cnt = self._dispatch_users(conns, pulls, test_suite, user_batch_size)
+            logger.info(f"{name} 已分发 {user_cnt} 个用户")
+            for conn in conns:
+                done = conn.expect("done")
+                if "error" in done:
+                    logger.error(f"{name} Agent {conn.address} 发送失败: {done['error']}")
+                    continue
+                agent_stat = SendStat.from_dict(done["stat"])
+                logger.info(f"    Agent {conn.address}: {agent_stat.total_session_cnt} 个会话, "
+                            f"{agent_stat.total_send_cnt} 个请求, 失败 {agent_stat.total_send_err_cnt}")
+                send_stat.merge(agent_stat)
+        finally:
+            for conn in conns:
+                conn.pulls = None
+            if live_metrics is not None:
+                live_metrics.stop()
+        send_stat.end_time = datetime.datetime.now()
+        return send_stat
+
+    @staticmethod
+    def _dispatch_users(conns: List[_AgentConn], pulls: queue.Queue, test_suite: TestSuite,
+                        user_batch_size: int) -> int:
+        """ 在本地加载用户信息，每收到一个 Agent 的拉取请求就发给它一批，用户发完后回复 users_end
+
+        Agent 按自身发送进度拉取，慢的 Agent 不会拖住其他 Agent；Agent 断开或提前结束时不再给它分发。
+        """
+        session_maintainer = test_suite.session_maintainer
+        q = session_maintainer.user_info_queue
+        prefilled = not q.empty() and q.qsize() > 0
+        loader = threading.Thread(target=_load_user_info, args=(session_maintainer, prefilled, 1), daemon=True)
+        loader.start()
+        batches = _iter_user_batches(q, user_batch_size)
+
+        for conn in conns:
+            if conn.finished:
+                pulls.put(conn)
+        user_cnt, ended = 0, set()
+        while len(ended) < len(conns):
+            conn = pulls.get()
+            if conn in ended:
+                continue
+            if conn.finished:
+                ended.add(conn)
+                continue
+            batch = next(batches, None)
+            try:
+                if batch is None:
+                    conn.send({"type": "users_end"})
+                    ended.add(conn)
+                else:
+                    conn.send({"type": "users", "items": batch})
+                    user_cnt += len(batch)
+            except OSError as e:
+                logger.error(f"向 Agent {conn.address} 分发用户失败: {e}")
+                ended.add(conn)
+        # 所有 Agent 都已提前结束时，读完剩余用户让加载线程退出
+        undelivered = sum(len(batch) for batch in batches)
+        if undelivered:
+            logger.error(f"{test_suite.name} 所有 Agent 已结束，{undelivered} 个用户未分发")
+        loader.join()
+        return user_cnt
+
+    @staticmethod
+    def _collect_sessions(conns: List[_AgentConn], test_suite: TestSuite):
+        """ 取回各 Agent 的会话，按本地ID重新编号后写入本地存储 """
+        label = test_suite.name
+        session_cnt = 0
+        table = TransactionTable()
+        for conn in conns:
+            conn.send({"type": "fetch_sessions", "suite": label})
+            while True:
+                msg = conn.messages.get()
+                if msg is None:
+                    raise RuntimeError(f"agent {conn.address} disconnected")
+                if msg["type"] == "sessions_end":
+                    break
+                for record in msg["records"]:
+                    try:
+                        session = Session.from_dict(record)
+                    except Exception as e:
+                        logger.error("Failed to load session of {%s} from {%s}: {%s}", label, conn.address, e)
+                        continue
+                    session.session_id = Session.get_next_id(label)
+                    session.session_filename = f"{label}-{session.session_id:08d}.json"
+                    session.dump()
+                    table.extend_session(session)
+                    session_cnt += 1
+        table.save_for(label)
+        Session.release_ids(label)
+        close_session_store()
+        logger.info(f"{label} 已从 {len(conns)} 个 Agent 取回 {session_cnt} 个会话")
@@ -0,0 +1,110 @@
+from itertools import accumulate
+
+
+class LatencyHistogram:
+    """ HDR 风格的对数线性耗时直方图
+
+    以微秒为单位，每个2的幂区间内划分 2^sub_bucket_bits 个线性桶，相对误差约 1/2^(sub_bucket_bits-1)，
+    内存固定(默认约 3300 个计数)，可以直接按桶相加合并。超过 max_seconds 的值计入最后一个桶。
+    """
+
+    def __init__(self, sub_bucket_bits: int = 8, max_seconds: float = 3600):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_half = 1 << (sub_bucket_bits - 1)
+        self.max_us = int(max_seconds * 1_000_000)
+        self.counts = [0] * (self._index(self.max_us) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, us: int) -> int:
+        shift = us.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return us
+        return shift * self.sub_bucket_half + (us >> shift)
+
+    def _value(self, index: int) -> float:
+        """ 桶对应的代表值(区间中点，秒) """
+        if index < 2 * self.sub_bucket_half:
+            return index / 1_000_000
+        shift = index // self.sub_bucket_half - 1
+        lower = (index - shift * self.sub_bucket_half) << shift
+        return (lower + ((1 << shift) - 1) / 2) / 1_000_000
+
+    def record(self, seconds: float):
+        us = min(max(int(seconds * 1_000_000), 0), self.max_us)
+        self.counts[self._index(us)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        if len(other.counts) != len(self.counts):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def percentile(self, p: float) -> float:
+        """ p 取值 0~100，返回秒 """
+        if self.count == 0:
+            return 0.0
+        if p >= 100 and self.max is not None:
+            return self.max
+        target = min(self.count, max(1, int(self.count * p / 100 + 0.5)))
+        for i, c in enumerate(accumulate(self.counts)):
+            if c >= target:
+                return self._value(i) if self.max is None else min(self._value(i), self.max)
+        return self.max or 0.0
+
+    def copy(self) -> 'LatencyHistogram':
+        h = LatencyHistogram(self.sub_bucket_bits, self.max_us / 1_000_000)
+        return h.merge(self)
+
+    def since(self, prev: 'LatencyHistogram') -> 'LatencyHistogram':
+        """ 与之前的快照相减得到窗口内的分布，窗口内的最大最小值按桶估算 """
+        h = LatencyHistogram(self.sub_bucket_bits, self.max_us / 1_000_000)
+        h.counts = [a - b for a, b in zip(self.counts, prev.counts)]
+        h.count = sum(h.counts)
+        h.total = self.total - prev.total
+        return h
+
+    def to_dict(self) -> dict:
+        """ 稀疏格式，只记录非零桶，用于跨进程/跨机器传输 """
+        return {
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "max_seconds": self.max_us / 1_000_000,
+            "counts": [[i, c] for i, c in enumerate(self.counts) if c],
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'LatencyHistogram':
+        h = LatencyHistogram(data["sub_bucket_bits"], data["max_seconds"])
+        for i, c in data["counts"]:
+            h.counts[i] = c
+        h.count = data["count"]
+        h.total = data["total"]
+        h.min = data["min"]
+        h.max = data["max"]
+        return h
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> str:
+        return (f"p50 {self.percentile(50) * 1000:.2f}, p90 {self.percentile(90) * 1000:.2f}, "
+                f"p99 {self.percentile(99) * 1000:.2f}, p99.9 {self.percentile(99.9) * 1000:.2f}, "
+                f"max {self.percentile(100) * 1000:.2f} 毫秒")
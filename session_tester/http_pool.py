@@ -0,0 +1,206 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from . import timing
+from .logger import logger
+
+
+class _TimedConnectionMixin:
+    """ 当前线程有正在计时的请求时，记录 TCP 建连耗时 """
+
+    def _new_conn(self):
+        timer = timing.current()
+        start = time.perf_counter_ns()
+        try:
+            return super()._new_conn()
+        finally:
+            if timer is not None:
+                timer.connect_ns += time.perf_counter_ns() - start
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        timer = timing.current()
+        if timer is None:
+            return super().connect()
+        start = time.perf_counter_ns()
+        connect_ns = timer.connect_ns
+        try:
+            return super().connect()
+        finally:
+            # connect() 中除 TCP 建连以外的部分为 TLS 握手
+            timer.tls_ns += time.perf_counter_ns() - start - (timer.connect_ns - connect_ns)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """ 新建连接时按阶段记录耗时的 HTTPAdapter，见 timing.PhaseTimer """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+
+class HttpSessionPool:
+    """ 同步 Client 使用的 HTTP 连接池
+
+    所有 requests.Session 挂载同一个 HTTPAdapter，底层 urllib3 连接池在会话间共享：
+    - pool_maxsize: 每个目标主机保持的最大长连接数，通常与并发会话数一致
+    - pool_connections: 缓存的主机(连接池)个数
+    requests.Session 只用于隔离 cookie，由 checkout/checkin 显式借还，归还时清空 cookie。
+    新建连接的 TCP 建连和 TLS 握手耗时记录到当前线程的 timing.PhaseTimer。
+    """
+
+    def __init__(self, pool_maxsize: int = 10, pool_connections: int = 10, pool_block: bool = True):
+        self.pool_maxsize = pool_maxsize
+        # 重试统一由 RetryPolicy 处理，适配器本身不重试
+        self.adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=0, pool_block=pool_block)
+        self._lock = threading.Lock()
+        self._free: List[requests.Session] = []
+        self._baseline = (0, 0)
+
+    def checkout(self) -> requests.Session:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        s = requests.Session()
+        s.mount("http://", self.adapter)
+        s.mount("https://", self.adapter)
+        return s
+
+    def checkin(self, http_session: requests.Session):
+        http_session.cookies.clear()
+        with self._lock:
+            self._free.append(http_session)
+
+    @contextmanager
+    def session(self):
+        http_session = self.checkout()
+        try:
+            yield http_session
+        finally:
+            self.checkin(http_session)
+
+    def prewarm(self, url: str, n: int):
+        """ 预先与 url 所在主机建立 n 个长连接，放回连接池供后续请求复用，不计入新建连接数 """
+        n = min(n, self.pool_maxsize)
+        # 与 requests 发送时取连接池的方式保持一致，否则预建的连接落在另一个池中
+        if hasattr(self.adapter, "get_connection_with_tls_context"):
+            with self.session() as http_session:
+                settings = http_session.merge_environment_settings(url, {}, None, None, None)
+            pool = self.adapter.get_connection_with_tls_context(requests.Request("GET", url).prepare(),
+                                                                 verify=settings["verify"], proxies=settings["proxies"],
+                                                                 cert=settings["cert"])
+        else:
+            pool = self.adapter.get_connection(url)
+        conns = []
+        try:
+            for _ in range(n):
+                conn = pool._get_conn()  # pylint: disable=protected-access
+                conns.append(conn)
+                conn.connect()
+        except Exception as e:
+            logger.error(f"预建连接失败 {url}: {e}")
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)  # pylint: disable=protected-access
+        self.reset_stats()
+        logger.info(f"预建 {len(conns)} 个连接: {url}")
+
+    def _totals(self) -> Tuple[int, int]:
+        pools = self.adapter.poolmanager.pools
+        connections, requests_ = 0, 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_ += pool.num_requests
+        return connections, requests_
+
+    def reset_stats(self):
+        self._baseline = self._totals()
+
+    def conn_stats(self) -> Tuple[int, int]:
+        """ 返回自上次 reset_stats 以来 (新建连接数, 复用连接的请求数) """
+        connections, requests_ = self._totals()
+        new_cnt = connections - self._baseline[0]
+        return new_cnt, max(0, requests_ - self._baseline[1] - new_cnt)
+
+    def close(self):
+        with self._lock:
+            for s in self._free:
+                s.close()
+            self._free = []
+        self.adapter.close()
+
+
+def aiohttp_phase_trace_config():
+    """ 通过 trace_request_ctx 传入 timing.PhaseTimer 的请求，记录建连耗时和收到响应头的时刻 """
+    import aiohttp  # pylint: disable=import-outside-toplevel
+
+    async def on_request_start(_, ctx, __):
+        if isinstance(ctx.trace_request_ctx, timing.PhaseTimer):
+            ctx.trace_request_ctx.start = time.perf_counter_ns()
+
+    async def on_create_start(_, ctx, __):
+        ctx.connect_start = time.perf_counter_ns()
+
+    async def on_create_end(_, ctx, __):
+        if isinstance(ctx.trace_request_ctx, timing.PhaseTimer):
+            ctx.trace_request_ctx.connect_ns += time.perf_counter_ns() - ctx.connect_start
+
+    async def on_request_end(_, ctx, __):
+        if isinstance(ctx.trace_request_ctx, timing.PhaseTimer):
+            ctx.trace_request_ctx.mark_headers()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_create_start)
+    trace_config.on_connection_create_end.append(on_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+class AsyncConnStats:
+    """ aiohttp 连接复用统计，通过 TraceConfig 挂到 ClientSession 上 """
+
+    def __init__(self):
+        self.new_cnt = 0
+        self.reused_cnt = 0
+
+    def trace_config(self):
+        import aiohttp  # pylint: disable=import-outside-toplevel
+
+        async def on_create(*_):
+            self.new_cnt += 1
+
+        async def on_reuse(*_):
+            self.reused_cnt += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def conn_stats(self) -> Tuple[int, int]:
+        return self.new_cnt, self.reused_cnt
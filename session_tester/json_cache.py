@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from . import codec
+
+DEFAULT_JSON_CACHE_BYTES = 64 * 1024 * 1024
+_MISSING = object()
+
+
+class ParsedJsonCache:
+    """ JSON 解析结果缓存
+
+    以原始字符串为键，内容相同的报文只解析一次；按原始字符串总长度做 LRU 淘汰，限制缓存的解析树数量。
+    缓存的对象在所有用例间共享，校验函数不应修改 rsp_json()/req_json() 的返回值。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_JSON_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def peek(self, s, default=None):
+        """ 返回已缓存的解析结果，未缓存时返回 default，不会解析 """
+        with self._lock:
+            o = self._entries.get(s, _MISSING)
+            if o is _MISSING:
+                return default
+            self._entries.move_to_end(s)
+            self.hits += 1
+            return o
+
+    def loads(self, s):
+        with self._lock:
+            o = self._entries.get(s, _MISSING)
+            if o is not _MISSING:
+                self._entries.move_to_end(s)
+                self.hits += 1
+                return o
+
+        o = codec.loads(s)
+        with self._lock:
+            self.misses += 1
+            if s not in self._entries and len(s) <= self.max_bytes:
+                self._entries[s] = o
+                self.size += len(s)
+                while self.size > self.max_bytes:
+                    k, _ = self._entries.popitem(last=False)
+                    self.size -= len(k)
+        return o
+
+
+_cache: ParsedJsonCache = None
+
+
+def loads(s):
+    """ 解析 JSON，在 shared_json_cache 范围内复用已解析的结果 """
+    cache = _cache
+    if cache is None or not isinstance(s, (str, bytes)):
+        return codec.loads(s)
+    return cache.loads(s)
+
+
+def peek(s, default=None):
+    """ 返回共享解析缓存中 s 的解析结果，未启用缓存或未缓存时返回 default """
+    cache = _cache
+    if cache is None or not isinstance(s, (str, bytes)):
+        return default
+    return cache.peek(s, default)
+
+
+def enable_json_cache(max_bytes: int = DEFAULT_JSON_CACHE_BYTES) -> ParsedJsonCache:
+    global _cache
+    _cache = ParsedJsonCache(max_bytes)
+    return _cache
+
+
+def disable_json_cache():
+    global _cache
+    _cache = None
+
+
+@contextmanager
+def shared_json_cache(max_bytes: int = DEFAULT_JSON_CACHE_BYTES):
+    """ 在一次校验中启用共享解析缓存，发送阶段不启用，避免会话维护逻辑修改共享对象 """
+    cache = enable_json_cache(max_bytes)
+    try:
+        yield cache
+    finally:
+        disable_json_cache()
@@ -0,0 +1,199 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, List, Tuple, Union
+
+from . import json_cache
+
+# 路径语法: data.items[*].id、items[0]、["a.b"].c
+_STEP = re.compile(r'\.?([^.\[\]"]+)|\[(-?\d+|\*)\]|\["((?:[^"\\]|\\.)*)"\]')
+_WILDCARD = object()
+
+# 定位键时先去掉转义，只保留引号和括号，再去掉字符串和成对的括号，剩下的括号即为所在层级
+_STRUCT_BYTES = frozenset(b'"[]{}')
+_NOISE_BYTES = bytes(c for c in range(256) if c not in _STRUCT_BYTES)
+_STRING = re.compile(rb'"[^"]*"')
+# 字符串开头引号之后的剩余部分(含结尾引号)
+_STRING_TAIL = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+_decoder = json.JSONDecoder()
+_MISSING = object()
+
+
+@lru_cache(maxsize=1024)
+def _key_pattern(key: str):
+    # 非 ASCII 字符可能原样输出，也可能转义为 \uXXXX
+    forms = sorted({json.dumps(key, ensure_ascii=False), json.dumps(key)})
+    return re.compile("(?:" + "|".join(map(re.escape, forms)) + r')\s*:\s*')
+
+
+class JsonPath:
+    """ 编译后的 JSON 路径
+
+    extract 优先只解析路径指向的值: 用正则查找开头连续的对象键，确认其所在层级后从该位置解码，
+    不构建其他字段的解析树；同一报文已在共享解析缓存中时直接在解析结果上取值。
+    路径中含 [*] 时返回列表，缺失的元素跳过；路径不存在时返回 default。
+    同一对象中有重复的键时，定位到的是第一个，而 json.loads 取最后一个；响应可能含重复键时改用 rsp_json() 取值。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        steps: List[Union[str, int, object]] = []
+        pos = 0
+        while pos < len(path):
+            m = _STEP.match(path, pos)
+            if m is None or m.end() == pos:
+                raise ValueError(f"Invalid json path: {path}")
+            key, index, quoted = m.groups()
+            if key is not None:
+                steps.append(key)
+            elif index == "*":
+                steps.append(_WILDCARD)
+            elif index is not None:
+                steps.append(int(index))
+            else:
+                steps.append(json.loads(f'"{quoted}"'))
+            pos = m.end()
+        if not steps:
+            raise ValueError("Empty json path")
+        self.steps: Tuple = tuple(steps)
+        # 开头连续的对象键可以在原始报文中定位
+        n = 0
+        while n < len(steps) and isinstance(steps[n], str):
+            n += 1
+        self.key_prefix = self.steps[:n]
+
+    def evaluate(self, o, default=None, start: int = 0):
+        """ 在已解析的对象上取值，从第 start 步开始 """
+        value = _evaluate(o, self.steps, start)
+        return default if value is _MISSING else value
+
+    def extract(self, s: Union[str, bytes], default=None):
+        if s is None:
+            return default
+        o = json_cache.peek(s, _MISSING)
+        if o is not _MISSING:
+            return self.evaluate(o, default)
+        raw = s
+        if isinstance(s, bytes):
+            s = s.decode('utf-8')
+
+        pos = _skip_ws(s, 0)
+        if not self.key_prefix or not s.startswith('{', pos):
+            return self.evaluate(json_cache.loads(s), default)
+        for i, key in enumerate(self.key_prefix):
+            pos = _find_key(s, key, pos)
+            if pos < 0:
+                if '\\u' in s:
+                    # 键可能以其他转义形式出现(如 \u0041)，找不到时以完整解析为准
+                    return self.evaluate(json_cache.loads(raw), default)
+                return default
+            if i + 1 < len(self.key_prefix) and not s.startswith('{', pos):
+                # 中间节点不是对象，后续的键不存在
+                return default
+        value, _ = _decoder.raw_decode(s, pos)
+        return self.evaluate(value, default, len(self.key_prefix))
+
+    def __repr__(self):
+        return f"JsonPath({self.path!r})"
+
+
+def _skip_ws(s: str, pos: int) -> int:
+    while pos < len(s) and s[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _structure(segment: str) -> bytes:
+    b = segment.encode('utf-8')
+    if b'\\' in b:
+        # 连续的反斜杠从左到右两两成对，去掉后剩下的反斜杠只转义其后一个字符，再去掉转义的引号；
+        # 必须在去掉普通字符之前处理，否则 "\n\\" 这类转义会与相邻的反斜杠错误配对
+        b = b.replace(b'\\\\', b'').replace(b'\\"', b'')
+    b = b.translate(None, _NOISE_BYTES)
+    # 空字符串(或相邻字符串的边界)成对去掉，只剩下含括号的字符串
+    b = b.replace(b'""', b'')
+    if b'"' in b:
+        b = _STRING.sub(b'', b)
+    return b
+
+
+def _reduce(b: bytes) -> bytes:
+    while True:
+        r = b.replace(b'{}', b'').replace(b'[]', b'')
+        if len(r) == len(b):
+            return r
+        b = r
+
+
+def _find_key(s: str, key: str, start: int) -> int:
+    """ 在 s[start] 处开始的对象中查找直接子键 key，返回值的起始位置，不存在时返回 -1 """
+    # 从对象内部开始，剩余为空表示位于对象的直接子层级，以 } 开头表示对象已经结束
+    reduced = b""
+    pos = start + 1
+    for m in _key_pattern(key).finditer(s, pos):
+        if m.start() < pos:
+            # 候选位于已跳过的字符串中
+            continue
+        segment = _structure(s[pos:m.start()])
+        if b'"' in segment:
+            # 候选位于字符串内部: 字符串之前的结构并入当前状态，从候选之后找到字符串结尾继续，已扫描的部分不再重复处理
+            reduced = _reduce(reduced + segment[:segment.index(b'"')])
+            escape = m.start()
+            while s[escape - 1] == '\\':
+                escape -= 1
+            if (m.start() - escape) % 2 == 0:
+                # 候选的引号没有转义，是字符串的结尾引号
+                pos = m.start() + 1
+                continue
+            tail = _STRING_TAIL.match(s, m.start() + 1)
+            if tail is None:
+                return -1
+            pos = tail.end()
+            continue
+        reduced = _reduce(reduced + segment)
+        pos = m.start()
+        if not reduced:
+            return m.end()
+        if reduced.startswith(b"}"):
+            return -1
+    return -1
+
+
+def _evaluate(o, steps: Tuple, start: int):
+    for i in range(start, len(steps)):
+        step = steps[i]
+        if step is _WILDCARD:
+            if isinstance(o, dict):
+                o = list(o.values())
+            if not isinstance(o, list):
+                return _MISSING
+            ret = []
+            for x in o:
+                v = _evaluate(x, steps, i + 1)
+                if v is _MISSING:
+                    continue
+                # 多个 [*] 展开为一层列表
+                if isinstance(v, list) and _WILDCARD in steps[i + 1:]:
+                    ret += v
+                else:
+                    ret.append(v)
+            return ret
+        if isinstance(step, str):
+            if not isinstance(o, dict) or step not in o:
+                return _MISSING
+            o = o[step]
+        else:
+            if not isinstance(o, list) or not -len(o) <= step < len(o):
+                return _MISSING
+            o = o[step]
+    return o
+
+
+@lru_cache(maxsize=4096)
+def compile_path(path: str) -> JsonPath:
+    return JsonPath(path)
+
+
+def extract(s: Union[str, bytes], path: str, default=None) -> Any:
+    """ 从 JSON 报文中按路径取值，见 JsonPath """
+    return compile_path(path).extract(s, default)
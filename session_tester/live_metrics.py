@@ -0,0 +1,158 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+from .logger import logger
+from .send_stat import SendStat
+from .timing import PHASES
+
+
+def _escape_label(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class LiveMetrics:
+    """ 发送过程中的实时指标
+
+    每隔 interval 秒合并各发送线程的 SendStat 快照，与上一次快照相减得到窗口内的
+    QPS、错误率、重试率和耗时分位数，打印到日志；指定 port 时在本地以 Prometheus 文本格式提供 /metrics。
+    读取快照不加锁，个别计数可能与正在写入的线程相差一个请求，不影响观测。
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, suite_name: str, stats_getter: Callable[[], List[SendStat]], interval: float = 10,
+                 port: int = None, host: str = "127.0.0.1"):
+        self.suite_name = suite_name
+        self.stats_getter = stats_getter
+        self.interval = interval
+        self.port = port
+        self.host = host
+        self._stopped = threading.Event()
+        self._thread = None
+        self._server = None
+        self._lock = threading.Lock()
+        self._prev = None
+        self._prev_time = None
+        self._text = ""
+
+    def snapshot(self) -> SendStat:
+        total = SendStat()
+        for stat in self.stats_getter():
+            total.merge(stat)
+        return total
+
+    def update(self, log=True):
+        now = time.monotonic()
+        curr = self.snapshot()
+        prev = self._prev if self._prev is not None else SendStat()
+        elapsed = now - self._prev_time if self._prev_time is not None else self.interval
+        self._prev, self._prev_time = curr, now
+
+        send_cnt = curr.total_send_cnt - prev.total_send_cnt
+        qps = send_cnt / elapsed if elapsed > 0 else 0
+        err_rate = (curr.total_send_err_cnt - prev.total_send_err_cnt) / send_cnt if send_cnt else 0
+        retry_rate = (curr.total_retry_cnt - prev.total_retry_cnt) / send_cnt if send_cnt else 0
+        window = curr.latency.since(prev.latency)
+
+        if log:
+            logger.info(f"[{self.suite_name}] 实时: QPS {qps:.2f}, 在途会话 {curr.in_flight_session_cnt}, "
+                        f"错误率 {err_rate * 100:.2f}%, 重试率 {retry_rate * 100:.2f}%, "
+                        f"窗口耗时 {window.summary()}")
+
+        suite = _escape_label(self.suite_name)
+        lines = [
+            "# HELP session_tester_requests_total Requests finished.",
+            "# TYPE session_tester_requests_total counter",
+            f'session_tester_requests_total{{suite="{suite}"}} {curr.total_send_cnt}',
+            "# HELP session_tester_request_errors_total Requests finished with error.",
+            "# TYPE session_tester_request_errors_total counter",
+            f'session_tester_request_errors_total{{suite="{suite}"}} {curr.total_send_err_cnt}',
+            "# HELP session_tester_request_retries_total Request retries.",
+            "# TYPE session_tester_request_retries_total counter",
+            f'session_tester_request_retries_total{{suite="{suite}"}} {curr.total_retry_cnt}',
+            "# HELP session_tester_sessions_total Sessions finished.",
+            "# TYPE session_tester_sessions_total counter",
+            f'session_tester_sessions_total{{suite="{suite}"}} {curr.total_session_cnt}',
+            "# HELP session_tester_sessions_in_flight Sessions being sent.",
+            "# TYPE session_tester_sessions_in_flight gauge",
+            f'session_tester_sessions_in_flight{{suite="{suite}"}} {curr.in_flight_session_cnt}',
+            "# HELP session_tester_qps Requests per second in the last window.",
+            "# TYPE session_tester_qps gauge",
+            f'session_tester_qps{{suite="{suite}"}} {qps:.3f}',
+            "# HELP session_tester_request_latency_seconds Request latency, quantiles over the last window.",
+            "# TYPE session_tester_request_latency_seconds summary",
+        ]
+        for q in self.QUANTILES:
+            lines.append(f'session_tester_request_latency_seconds{{suite="{suite}",quantile="{q}"}} '
+                         f'{window.percentile(q * 100):.6f}')
+        lines.append(f'session_tester_request_latency_seconds_sum{{suite="{suite}"}} {curr.latency.total:.6f}')
+        lines.append(f'session_tester_request_latency_seconds_count{{suite="{suite}"}} {curr.latency.count}')
+        lines += [
+            "# HELP session_tester_request_phase_seconds Request phase latency, quantiles over the last window.",
+            "# TYPE session_tester_request_phase_seconds summary",
+        ]
+        for phase in PHASES:
+            h = curr.phase_latency[phase]
+            phase_window = h.since(prev.phase_latency[phase])
+            for q in self.QUANTILES:
+                lines.append(f'session_tester_request_phase_seconds{{suite="{suite}",phase="{phase}",quantile="{q}"}} '
+                             f'{phase_window.percentile(q * 100):.6f}')
+            lines.append(f'session_tester_request_phase_seconds_sum{{suite="{suite}",phase="{phase}"}} {h.total:.6f}')
+            lines.append(f'session_tester_request_phase_seconds_count{{suite="{suite}",phase="{phase}"}} {h.count}')
+        with self._lock:
+            self._text = "\n".join(lines) + "\n"
+
+    def metrics_text(self) -> str:
+        with self._lock:
+            return self._text
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.update()
+            except Exception as e:
+                logger.error(f"failed to update live metrics: {e}")
+
+    def start(self):
+        self._prev, self._prev_time = None, time.monotonic()
+        self.update(log=False)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        if self.port is not None:
+            self._server = _MetricsServer((self.host, self.port), _MetricsHandler)
+            self._server.live_metrics = self
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            logger.info(f"实时指标: http://{self.host}:{self._server.server_address[1]}/metrics")
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.update()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _MetricsServer(ThreadingHTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    live_metrics: LiveMetrics = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.live_metrics.metrics_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,113 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Sequence, Tuple
+
+from . import json_cache
+from .session import Session
+from .testcase import SingleRequestCase, SingleSessionCase, StreamingAllSessionCase, CheckResult
+
+_request_cases: List[SingleRequestCase] = []
+_session_cases: List[SingleSessionCase] = []
+_stream_cases: List[StreamingAllSessionCase] = []
+
+CheckOutput = Tuple[List[List[CheckResult]], List[List[CheckResult]], List[Any]]
+
+
+def _init_worker(request_cases, session_cases, stream_cases, json_cache_bytes):
+    global _request_cases, _session_cases, _stream_cases
+    _request_cases = request_cases
+    _session_cases = session_cases
+    _stream_cases = stream_cases
+    json_cache.enable_json_cache(json_cache_bytes)
+
+
+def check_sessions(request_cases: List[SingleRequestCase], session_cases: List[SingleSessionCase],
+                   sessions: List[Session], chunk_size: int = 64,
+                   stream_cases: Sequence[StreamingAllSessionCase] = ()) -> CheckOutput:
+    """ 对一批会话执行单请求和单会话用例，返回每个用例的结果列表，顺序与输入一致；
+    同时计算可流式校验的全体会话用例在这批会话上合并后的部分结果(没有会话时为 None)
+
+    按 chunk_size 个会话一组依次执行所有用例，同一报文在各用例间解析一次后即可从缓存命中。
+    响应报文已按保留策略丢弃的请求不执行单请求用例，结果记为 None(跳过，计入未覆盖)。
+    """
+    request_results = [[] for _ in request_cases]
+    session_results = [[] for _ in session_cases]
+    stream_parts = [None for _ in stream_cases]
+    for i in range(0, len(sessions), chunk_size):
+        chunk = sessions[i:i + chunk_size]
+        ok_transactions = [t for s in chunk for t in s.transactions if t.finished_without_error()]
+        kept = [j for j, t in enumerate(ok_transactions) if not t.response_dropped()]
+        kept_transactions = [ok_transactions[j] for j in kept]
+        ok_sessions = [s for s in chunk if s.finished_without_error()]
+        for results, case in zip(request_results, request_cases):
+            # 结果放回各自请求的位置，已丢弃响应的请求位置保持 None
+            chunk_results = [None] * len(ok_transactions)
+            for j, result in zip(kept, case.batch_check(kept_transactions)):
+                chunk_results[j] = result
+            results += chunk_results
+        for results, case in zip(session_results, session_cases):
+            results += case.batch_check(ok_sessions)
+        if ok_sessions:
+            for j, case in enumerate(stream_cases):
+                stream_parts[j] = case.safe_merge(stream_parts[j], case.safe_partial(ok_sessions))
+    return request_results, session_results, stream_parts
+
+
+def _check_chunk(sessions: List[Session]):
+    return check_sessions(_request_cases, _session_cases, sessions, stream_cases=_stream_cases)
+
+
+class ParallelChecker:
+    """ 多进程校验执行器
+
+    用例在进程启动时传入子进程(支持 fork 时直接继承，无需可序列化)，
+    每批会话切分为若干片分发到进程池，结果按分片顺序合并，异常堆栈由 batch_check 在子进程内记录。
+    可流式校验的全体会话用例在子进程中计算部分结果，只回传部分结果在父进程合并。
+    """
+
+    def __init__(self, request_cases: List[SingleRequestCase], session_cases: List[SingleSessionCase],
+                 workers: int, json_cache_bytes: int = json_cache.DEFAULT_JSON_CACHE_BYTES,
+                 stream_cases: Sequence[StreamingAllSessionCase] = ()):
+        self.request_cases = request_cases
+        self.session_cases = session_cases
+        self.stream_cases = list(stream_cases)
+        self.workers = workers
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        else:
+            mp_context = multiprocessing.get_context()
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                                            initargs=(request_cases, session_cases, self.stream_cases,
+                                                      json_cache_bytes))
+
+    def check(self, sessions: List[Session]) -> CheckOutput:
+        request_results = [[] for _ in self.request_cases]
+        session_results = [[] for _ in self.session_cases]
+        stream_parts = [None for _ in self.stream_cases]
+        if not sessions:
+            return request_results, session_results, stream_parts
+
+        # 每个进程分到两片，平衡各片耗时差异
+        chunk_size = max(1, math.ceil(len(sessions) / (self.workers * 2)))
+        futures = [self.executor.submit(_check_chunk, sessions[i:i + chunk_size])
+                   for i in range(0, len(sessions), chunk_size)]
+        for future in futures:
+            chunk_request_results, chunk_session_results, chunk_stream_parts = future.result()
+            for i, results in enumerate(chunk_request_results):
+                request_results[i] += results
+            for i, results in enumerate(chunk_session_results):
+                session_results[i] += results
+            for i, part in enumerate(chunk_stream_parts):
+                if part is not None:
+                    stream_parts[i] = self.stream_cases[i].safe_merge(stream_parts[i], part)
+        return request_results, session_results, stream_parts
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,167 @@
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import xlsxwriter
+
+from .logger import logger
+
+# Excel 单个工作表的最大行数(含表头)
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_SHEET_NAME_LEN = 31
+# 每行文字对应的行高
+LINE_HEIGHT = 20
+
+
+def _cell_value(v):
+    """ 转换为 xlsxwriter 可直接写入的值，None 和 NaN 写为空单元格 """
+    if v is None or isinstance(v, float) and math.isnan(v):
+        return None
+    if isinstance(v, (str, int, float, bool)):
+        return v
+    return str(v)
+
+
+def _line_count(v) -> int:
+    return str(v).count('\n') + 1 if v not in (None, "") else 0
+
+
+class ReportWriter:
+    """ 流式写入测试报告
+
+    详细数据表使用 xlsxwriter 的 constant_memory 模式按行写入，样式和行高在写入时一次设置，内存占用与行数无关。
+    constant_memory 模式下不能跨行合并单元格，汇总表行数很少，按普通模式写入，功能模块列按组合并。
+    详细数据超过 Excel 单表行数上限时拆分到多个工作表，max_detail_rows 非空时每个报告最多写入该行数。
+    """
+
+    SUMMARY_SHEET = "测试汇总"
+    SUMMARY_COLUMNS = [
+        # (列名, 列宽, 左对齐)
+        ("功能模块", 30, False),
+        ("功能点", 40, False),
+        ("预期结果", 60, True),
+        ("最终结果", 15, False),
+        ("通过", 8.5, False),
+        ("未通过", 10, False),
+        ("未覆盖", 10, False),
+        ("网络错误", 13, False),
+        ("异常说明", 55, True),
+    ]
+
+    def __init__(self, file_path: str, max_rows_per_sheet: int = EXCEL_MAX_ROWS, max_detail_rows: int = None):
+        if not 2 <= max_rows_per_sheet <= EXCEL_MAX_ROWS:
+            raise ValueError(f"max_rows_per_sheet must be between 2 and {EXCEL_MAX_ROWS}")
+        self.file_path = file_path
+        self.max_rows_per_sheet = max_rows_per_sheet
+        self.max_detail_rows = max_detail_rows
+        # 报告内容是数据，不转换为公式或超链接(超链接每表上限 65530 个)
+        # constant_memory 在创建工作表时按工作表生效，由 _add_sheet 逐个设置
+        self.workbook = xlsxwriter.Workbook(file_path, {"strings_to_formulas": False, "strings_to_urls": False})
+        self.sheet_names = set()
+        summary_font = {"font_size": 16, "valign": "vcenter", "text_wrap": True}
+        self.summary_header_format = self.workbook.add_format({**summary_font, "bold": True, "align": "center"})
+        self.summary_center_format = self.workbook.add_format({**summary_font, "align": "center"})
+        self.summary_left_format = self.workbook.add_format({**summary_font, "align": "left"})
+        # 每组首行带上边框
+        self.summary_group_center_format = self.workbook.add_format({**summary_font, "align": "center", "top": 1})
+        self.summary_group_left_format = self.workbook.add_format({**summary_font, "align": "left", "top": 1})
+        self.detail_header_format = self.workbook.add_format({"bold": True, "align": "center", "border": 1})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.workbook.close()
+
+    def _add_sheet(self, name: str, constant_memory: bool = True):
+        # 工作表名不区分大小写，截断后重名时加数字后缀
+        unique_name = name
+        n = 1
+        while unique_name.lower() in self.sheet_names:
+            n += 1
+            suffix = f"_{n}"
+            unique_name = name[:EXCEL_MAX_SHEET_NAME_LEN - len(suffix)] + suffix
+        self.sheet_names.add(unique_name.lower())
+        self.workbook.constant_memory = constant_memory
+        try:
+            return self.workbook.add_worksheet(unique_name)
+        finally:
+            # 工作簿本身保持普通模式，关闭时不对普通模式的工作表做 constant_memory 的清理
+            self.workbook.constant_memory = False
+
+    def write_summary(self, groups: List[Sequence[Sequence[Any]]]):
+        """ 写入汇总表，groups 为按功能模块分组的行，每行按 SUMMARY_COLUMNS 的顺序排列，功能模块列按组合并 """
+        ws = self._add_sheet(self.SUMMARY_SHEET, constant_memory=False)
+        formats, group_formats = [], []
+        for col, (_, width, left) in enumerate(self.SUMMARY_COLUMNS):
+            ws.set_column(col, col, width)
+            formats.append(self.summary_left_format if left else self.summary_center_format)
+            group_formats.append(self.summary_group_left_format if left else self.summary_group_center_format)
+
+        header = [name for name, _, _ in self.SUMMARY_COLUMNS]
+        ws.set_row(0, LINE_HEIGHT * max(_line_count(v) for v in header))
+        for col, v in enumerate(header):
+            ws.write(0, col, v, self.summary_header_format)
+
+        row = 1
+        for rows in groups:
+            first_row = row
+            for values in rows:
+                values = [_cell_value(v) for v in values]
+                ws.set_row(row, LINE_HEIGHT * max(1, max(_line_count(v) for v in values)))
+                row_formats = group_formats if row == first_row else formats
+                for col, v in enumerate(values):
+                    if v is None or col == 0 and row > first_row:
+                        ws.write_blank(row, col, None, row_formats[col])
+                    else:
+                        ws.write(row, col, v, row_formats[col])
+                row += 1
+            if row - first_row > 1:
+                ws.merge_range(first_row, 0, row - 1, 0, _cell_value(rows[0][0]), group_formats[0])
+
+    def _sheet_name(self, name: str, part: int) -> str:
+        suffix = f"({part})" if part > 1 else ""
+        return name[:EXCEL_MAX_SHEET_NAME_LEN - len(suffix)] + suffix
+
+    def write_detail(self, name: str, lines: List[Any]):
+        """ 写入详细数据，lines 的元素为字典(按键对应列)或者序列(按位置对应列) """
+        columns: Dict[Any, int] = {}
+        for line in lines:
+            for k in (line.keys() if isinstance(line, dict) else
+                      range(len(line)) if isinstance(line, (list, tuple)) else [0]):
+                if k not in columns:
+                    columns[k] = len(columns)
+        header = list(columns)
+
+        total = len(lines)
+        if self.max_detail_rows is not None and total > self.max_detail_rows:
+            logger.warning(f"详细数据-表-{name} 共 {total} 行，只保留前 {self.max_detail_rows} 行")
+            total = self.max_detail_rows
+
+        rows_per_sheet = self.max_rows_per_sheet - 1
+        ws: Optional[Any] = None
+        row = 0
+        part = 0
+        for i in range(total):
+            if ws is None or row > rows_per_sheet:
+                part += 1
+                ws = self._add_sheet(self._sheet_name(name, part))
+                for col, k in enumerate(header):
+                    ws.write(0, col, _cell_value(k), self.detail_header_format)
+                row = 1
+            line = lines[i]
+            if isinstance(line, dict):
+                items = ((columns[k], v) for k, v in line.items())
+            elif isinstance(line, (list, tuple)):
+                items = enumerate(line)
+            else:
+                items = [(0, line)]
+            for col, v in items:
+                v = _cell_value(v)
+                if v is not None:
+                    ws.write(row, col, v)
+            row += 1
+        if part > 1:
+            logger.info(f"详细数据-表-{name} 共 {total} 行，超过单表上限，拆分为 {part} 个表")
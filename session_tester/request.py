@@ -1,5 +1,10 @@
+import copy
+import uuid
 from dataclasses import dataclass
-from typing import Optional, Any
+from typing import Any, List, Optional
+
+from . import codec
+from .retry import RetryPolicy
 
 
 @dataclass
@@ -9,4 +14,79 @@ class StReq:
     http_method: Optional[str] = None
     timeout: Optional[tuple] = (1, 5)
     headers: Optional[dict] = None
-    retry: Optional[int] = 1
+    retry: Optional[int] = 1  # 未指定 retry_policy 时的最多重试次数，所有非 200 状态码都重试
+    retry_policy: Optional[RetryPolicy] = None
+
+
+class ReqTemplate:
+    """ 预编译的请求模板
+
+    请求体中不变的部分(设备信息、配置等)只序列化一次，每次请求只序列化 fields 中列出的字段并拼接到骨架中，
+    结果与直接序列化整个请求体(非 ASCII 字符转义)一致。
+    fields 为字段路径，嵌套字段用 "." 分隔，例如 "device.id"；骨架中这些字段的取值只作为占位，渲染时必须提供。
+    渲染得到的 StReq 共用同一个 headers 字典，调用方不应修改。
+    """
+
+    def __init__(self, skeleton: dict, fields: List[str], url: Optional[str] = None,
+                 http_method: Optional[str] = None, timeout: Optional[tuple] = (1, 5),
+                 headers: Optional[dict] = None, retry: Optional[int] = 1,
+                 retry_policy: Optional[RetryPolicy] = None):
+        self.fields = list(fields)
+        self.url = url
+        self.http_method = http_method
+        self.timeout = timeout
+        self.retry = retry
+        self.retry_policy = retry_policy
+        self.headers = dict(headers or {})
+        self.headers.setdefault("Content-Type", "application/json")
+
+        marker = uuid.uuid4().hex
+        placeholders = {}
+        skeleton = copy.deepcopy(skeleton)
+        for i, field in enumerate(self.fields):
+            o = skeleton
+            keys = field.split(".")
+            for k in keys[:-1]:
+                o = o.setdefault(k, {})
+                if not isinstance(o, dict):
+                    raise ValueError(f"Invalid template field: {field}")
+            placeholder = f"__st_{marker}_{i}__"
+            o[keys[-1]] = placeholder
+            placeholders[f'"{placeholder}"'] = field
+
+        # 按占位符在序列化结果中的位置切分骨架
+        text = codec.dumps(skeleton, ensure_ascii=True)
+        positions = []
+        for placeholder, field in placeholders.items():
+            pos = text.find(placeholder)
+            if pos < 0 or text.find(placeholder, pos + 1) >= 0:
+                raise ValueError(f"Invalid template field: {field}")
+            positions.append((pos, placeholder, field))
+        positions.sort()
+        self._parts = []
+        self._order = []
+        start = 0
+        for pos, placeholder, field in positions:
+            self._parts.append(text[start:pos])
+            self._order.append(field)
+            start = pos + len(placeholder)
+        self._parts.append(text[start:])
+
+    def render_body(self, values: dict = None, **kwargs) -> str:
+        if values:
+            kwargs.update(values)
+        parts = self._parts
+        out = [parts[0]]
+        for i, field in enumerate(self._order):
+            try:
+                value = kwargs[field]
+            except KeyError:
+                raise ValueError(f"Missing template field: {field}") from None
+            out.append(codec.dumps(value, ensure_ascii=True))
+            out.append(parts[i + 1])
+        return "".join(out)
+
+    def render(self, values: dict = None, **kwargs) -> StReq:
+        """ 渲染为 StReq，values 用于传入带 "." 的嵌套字段 """
+        return StReq(self.render_body(values, **kwargs), url=self.url, http_method=self.http_method,
+                     timeout=self.timeout, headers=self.headers, retry=self.retry, retry_policy=self.retry_policy)
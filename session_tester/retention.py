@@ -0,0 +1,77 @@
+import random
+
+from .session import HttpTransaction, Session
+from .session_store import body_digest
+
+
+class BodyRetention:
+    """ 响应报文保留策略
+
+    每收到一个响应后对会话调用 apply，只处理最新响应之前的那一个请求，最新响应始终保留给 update_session 使用。
+    被丢弃的报文只保留长度和摘要(rsp_size/rsp_digest)，这些请求不再参与单请求用例校验。
+    """
+
+    def apply(self, session: Session):
+        if len(session.transactions) < 2:
+            return
+        t = session.transactions[-2]
+        if t.response is not None and not self.keep(session, t):
+            drop_response(t)
+
+    def keep(self, session: Session, t: HttpTransaction) -> bool:
+        raise NotImplementedError
+
+
+def drop_response(t: HttpTransaction):
+    data = t.response.encode('utf-8') if isinstance(t.response, str) else t.response
+    t.rsp_size = len(data)
+    t.rsp_digest = body_digest(data)
+    t.response = None
+
+
+class KeepAll(BodyRetention):
+    """ 保留全部报文(默认) """
+
+    def apply(self, session: Session):
+        pass
+
+    def keep(self, session: Session, t: HttpTransaction) -> bool:
+        return True
+
+
+class KeepLastN(BodyRetention):
+    """ 每个会话只保留最近 n 个响应报文 """
+
+    def __init__(self, n: int):
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        self.n = n
+
+    def apply(self, session: Session):
+        if len(session.transactions) <= self.n:
+            return
+        t = session.transactions[-self.n - 1]
+        if t.response is not None:
+            drop_response(t)
+
+    def keep(self, session: Session, t: HttpTransaction) -> bool:
+        return False
+
+
+class KeepSampled(BodyRetention):
+    """ 按比例随机保留响应报文，ratio 取值 0~1 """
+
+    def __init__(self, ratio: float):
+        if not 0 <= ratio <= 1:
+            raise ValueError("ratio must be between 0 and 1")
+        self.ratio = ratio
+
+    def keep(self, session: Session, t: HttpTransaction) -> bool:
+        return random.random() < self.ratio
+
+
+class KeepDigestOnly(BodyRetention):
+    """ 只保留响应报文的长度和摘要 """
+
+    def keep(self, session: Session, t: HttpTransaction) -> bool:
+        return False
@@ -0,0 +1,62 @@
+import random
+import time
+from typing import Collection, Optional
+
+DEFAULT_RETRY_ON_STATUS = (429, 500, 502, 503, 504)
+
+
+class RetryPolicy:
+    """ 请求重试策略，同步和异步 Client 共用，是唯一的重试层
+
+    - max_retries: 最多重试次数(不含首次)
+    - backoff/backoff_factor/max_backoff: 第 n 次重试前等待 min(max_backoff, backoff * backoff_factor^(n-1)) 秒
+    - jitter: 0~1，等待时间随机缩短的最大比例，避免大量会话同时重试
+    - deadline: 单个请求(含所有重试和等待)的总时限，秒；超过后不再重试，并用剩余时间限制单次请求的读超时
+    - retry_on_status: 需要重试的状态码，None 表示所有非 200 状态码都重试，网络异常总是重试
+    """
+
+    def __init__(self, max_retries: int = 1, backoff: float = 0.5, backoff_factor: float = 2.0,
+                 max_backoff: float = 10.0, jitter: float = 0.5, deadline: Optional[float] = None,
+                 retry_on_status: Optional[Collection[int]] = DEFAULT_RETRY_ON_STATUS):
+        if max_retries < 0:
+            raise ValueError("max_retries must be non-negative")
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on_status = None if retry_on_status is None else frozenset(retry_on_status)
+
+    def backoff_delay(self, retry_no: int) -> float:
+        delay = min(self.max_backoff, self.backoff * self.backoff_factor ** (retry_no - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def next_delay(self, attempt_cnt: int, status_code: Optional[int], started: float) -> Optional[float]:
+        """ 第 attempt_cnt 次尝试结束后调用，返回下次重试前的等待时间，None 表示不再重试
+
+        status_code 为 None 表示请求异常，started 为首次尝试开始的 time.monotonic()
+        """
+        if attempt_cnt > self.max_retries:
+            return None
+        if status_code is not None and self.retry_on_status is not None and status_code not in self.retry_on_status:
+            return None
+        delay = self.backoff_delay(attempt_cnt)
+        if self.deadline is not None and time.monotonic() + delay - started >= self.deadline:
+            return None
+        return delay
+
+    def attempt_timeout(self, timeout, started: float):
+        """ 根据剩余时限收紧单次请求的超时，timeout 格式与 requests 一致 """
+        if self.deadline is None:
+            return timeout
+        remaining = max(0.001, self.deadline - (time.monotonic() - started))
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, (tuple, list)):
+            connect, read = timeout
+            return (min(connect, remaining) if connect is not None else remaining,
+                    min(read, remaining) if read is not None else remaining)
+        return min(timeout, remaining)
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+
+
+class ArrivalScheduler:
+    """ 开环定速调度器
+
+    按目标速率为每个请求分配计划发送时刻 start + n / rate，与上一个请求是否返回无关。
+    服务端变慢时发送方会落后于计划，这部分排队时间记为调度滞后(sched_lag)，与实际发送后的请求耗时(cost_time)分开保存；
+    耗时统计(SendStat、stat_http_transaction_cost)使用两者之和，即自计划发送时刻起的耗时，
+    避免闭环压测中的协调遗漏(coordinated omission)。
+    """
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError(f"Invalid arrival rate: {rate}")
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._start = None
+        self._n = 0
+
+    def start(self):
+        with self._lock:
+            self._start = time.monotonic()
+            self._n = 0
+
+    def next_slot(self) -> float:
+        """ 领取下一个计划发送时刻(time.monotonic 时间) """
+        with self._lock:
+            if self._start is None:
+                self._start = time.monotonic()
+            intended = self._start + self._n * self.interval
+            self._n += 1
+        return intended
+
+    def wait(self) -> float:
+        """ 阻塞到计划发送时刻，返回该时刻 """
+        intended = self.next_slot()
+        delay = intended - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return intended
+
+    async def async_wait(self) -> float:
+        intended = self.next_slot()
+        delay = intended - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return intended
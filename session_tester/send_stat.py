@@ -0,0 +1,141 @@
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+from .histogram import LatencyHistogram
+from .logger import logger
+from .session import Session, HttpTransaction
+from .timing import PHASES, PHASE_NAMES
+
+
+@dataclass
+class SendStat:
+    """ 发送统计，每个发送线程各持有一份，结束后合并，记录过程无需加锁 """
+    total_session_cnt: int = 0
+    total_session_cost: int = 0
+    total_send_cnt: int = 0
+    total_send_err_cnt: int = 0
+    total_retry_cnt: int = 0
+    total_send_cost: int = 0
+    total_sched_lag: float = 0
+    max_sched_lag: float = 0
+    in_flight_session_cnt: int = 0
+    new_conn_cnt: int = 0  # 发送过程中新建的连接数(不含预建)
+    reused_conn_cnt: int = 0  # 复用已有连接的请求数
+    arrival_rate: float = None
+    start_time: datetime.datetime = 0
+    end_time: datetime.datetime = 0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    # 开环模式下自计划发送时刻起的耗时
+    intended_latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    # (url, 状态码) -> 耗时分布
+    latency_by_key: Dict[Tuple[str, int], LatencyHistogram] = field(default_factory=dict)
+    # 阶段 -> 耗时分布，见 timing.PHASES
+    phase_latency: Dict[str, LatencyHistogram] = field(default_factory=lambda: {p: LatencyHistogram() for p in PHASES})
+
+    def report(self):
+        logger.info("发送请求统计：")
+        logger.info(f"    {self.total_session_cnt} 个会话")
+        logger.info(
+            f"    {self.total_send_cnt} 个请求(失败重试 {self.total_retry_cnt}, 最终失败 {self.total_send_err_cnt})")
+        logger.info(f"    总耗时: {((self.end_time - self.start_time).total_seconds()):.2f} 秒")
+        logger.info(f"    请求平均耗时: {(self.total_send_cost * 1000 / self.total_send_cnt):.2f} 毫秒")
+        logger.info(f"    会话平均耗时: {(self.total_session_cost * 1000 / self.total_session_cnt):.2f} 毫秒")
+        logger.info(f"    QPS: {(self.total_send_cnt / (self.end_time - self.start_time).total_seconds()):.2f}")
+        logger.info(f"    请求耗时分布: {self.latency.summary()}")
+        for phase in PHASES:
+            h = self.phase_latency[phase]
+            if h.count:
+                logger.info(f"        {PHASE_NAMES[phase]}: {h.summary()}")
+        if self.new_conn_cnt or self.reused_conn_cnt:
+            logger.info(f"    连接: 新建 {self.new_conn_cnt}, 复用 {self.reused_conn_cnt}")
+        for (url, status_code), h in sorted(self.latency_by_key.items(), key=lambda x: (x[0][0], x[0][1])):
+            logger.info(f"        {url} [{status_code}] {h.count} 个: {h.summary()}")
+        if self.arrival_rate:
+            # 开环模式下，请求耗时从计划发送时刻算起，包含发送方落后计划的排队时间
+            logger.info(f"    目标速率: {self.arrival_rate:.2f} 请求/秒")
+            logger.info(f"    调度滞后: 平均 {(self.total_sched_lag * 1000 / self.total_send_cnt):.2f} 毫秒, "
+                        f"最大 {self.max_sched_lag * 1000:.2f} 毫秒")
+            logger.info(f"    请求平均耗时(自计划发送时刻): "
+                        f"{((self.total_send_cost + self.total_sched_lag) * 1000 / self.total_send_cnt):.2f} 毫秒")
+            logger.info(f"    请求耗时分布(自计划发送时刻): {self.intended_latency.summary()}")
+
+    def add_transaction(self, x: HttpTransaction):
+        """ 每个请求结束时记录，发送过程中即可读到实时数据 """
+        self.total_send_cnt += 1
+        if not x.finished_without_error():
+            self.total_send_err_cnt += 1
+        self.total_retry_cnt += x.retry_cnt
+        self.total_send_cost += x.cost_time
+        self.total_sched_lag += x.sched_lag
+        self.max_sched_lag = max(self.max_sched_lag, x.sched_lag)
+
+        # 未收到响应的请求没有有效耗时，只计入失败数
+        if x.status_code is None:
+            return
+        self.latency.record(x.cost_time)
+        key = (x.url, x.status_code)
+        h = self.latency_by_key.get(key)
+        if h is None:
+            h = self.latency_by_key[key] = LatencyHistogram()
+        h.record(x.cost_time)
+        if x.phases is not None:
+            for phase, us in zip(PHASES, x.phases):
+                if us is not None:
+                    self.phase_latency[phase].record(us / 1_000_000)
+        if self.arrival_rate:
+            self.intended_latency.record(x.cost_time + x.sched_lag)
+
+    def add_session(self, _: Session, elapsed_time: float):
+        self.total_session_cnt += 1
+        self.total_session_cost += elapsed_time
+
+    def merge(self, other: 'SendStat') -> 'SendStat':
+        self.total_session_cnt += other.total_session_cnt
+        self.total_session_cost += other.total_session_cost
+        self.total_send_cnt += other.total_send_cnt
+        self.total_send_err_cnt += other.total_send_err_cnt
+        self.total_retry_cnt += other.total_retry_cnt
+        self.total_send_cost += other.total_send_cost
+        self.total_sched_lag += other.total_sched_lag
+        self.max_sched_lag = max(self.max_sched_lag, other.max_sched_lag)
+        self.in_flight_session_cnt += other.in_flight_session_cnt
+        self.new_conn_cnt += other.new_conn_cnt
+        self.reused_conn_cnt += other.reused_conn_cnt
+        self.latency.merge(other.latency)
+        self.intended_latency.merge(other.intended_latency)
+        # 发送过程中可能有新的 key 加入，先复制再遍历
+        for key, h in list(other.latency_by_key.items()):
+            if key in self.latency_by_key:
+                self.latency_by_key[key].merge(h)
+            else:
+                self.latency_by_key[key] = LatencyHistogram().merge(h)
+        for phase in PHASES:
+            self.phase_latency[phase].merge(other.phase_latency[phase])
+        return self
+
+    def to_dict(self) -> dict:
+        """ 转为可 JSON 序列化的字典，起止时间由汇总方自行记录，不包含在内 """
+        data = {k: getattr(self, k) for k in _SCALAR_FIELDS}
+        data["latency"] = self.latency.to_dict()
+        data["intended_latency"] = self.intended_latency.to_dict()
+        data["latency_by_key"] = [[url, status_code, h.to_dict()]
+                                  for (url, status_code), h in list(self.latency_by_key.items())]
+        data["phase_latency"] = {phase: h.to_dict() for phase, h in self.phase_latency.items()}
+        return data
+
+    @staticmethod
+    def from_dict(data: dict) -> 'SendStat':
+        stat = SendStat(**{k: data[k] for k in _SCALAR_FIELDS if k in data})
+        stat.latency = LatencyHistogram.from_dict(data["latency"])
+        stat.intended_latency = LatencyHistogram.from_dict(data["intended_latency"])
+        stat.latency_by_key = {(url, status_code): LatencyHistogram.from_dict(h)
+                               for url, status_code, h in data["latency_by_key"]}
+        for phase, h in data.get("phase_latency", {}).items():
+            stat.phase_latency[phase] = LatencyHistogram.from_dict(h)
+        return stat
+
+
+_SCALAR_FIELDS = ("total_session_cnt", "total_session_cost", "total_send_cnt", "total_send_err_cnt", "total_retry_cnt",
+                  "total_send_cost", "total_sched_lag", "max_sched_lag", "in_flight_session_cnt", "arrival_rate",
+                  "new_conn_cnt", "reused_conn_cnt")
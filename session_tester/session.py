@@ -1,56 +1,120 @@
-import glob
-import json
+import atexit
 import math
 import os
+import sys
 import threading
-from dataclasses import asdict
-from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
+from . import codec, json_cache, json_path
 from .logger import logger
+from .session_store import SessionStore, new_session_store, SESSION_STORE_FILE
 from .user_info import UserInfo
 
-test_session_dir = os.getenv("TEST_SESSION_DIR", "./test_sessions")
+_base_session_dir = os.getenv("TEST_SESSION_DIR", "./test_sessions")
+test_session_dir = _base_session_dir
 if not os.path.exists(test_session_dir):
     os.makedirs(test_session_dir)
-sub_session_dir_exists = False
+session_store_type = os.getenv("TEST_SESSION_STORE", SESSION_STORE_FILE)
+_session_store = None
+_session_store_lock = threading.Lock()
 
 
-def update_test_session_dir(name: str):
-    global test_session_dir, sub_session_dir_exists
-    test_session_dir = os.path.join(test_session_dir, name)
-    if not os.path.exists(test_session_dir):
-        os.makedirs(test_session_dir)
+def update_test_session_dir(*names: str):
+    """ 会话目录设为 TEST_SESSION_DIR 下的 names 子目录，总是相对根目录拼接，重复调用不会逐层嵌套 """
+    global test_session_dir
+    test_session_dir = os.path.join(_base_session_dir, *names)
+    # 同一台机器上的多个 Agent 同时启动时会并发创建 Tester 目录
+    os.makedirs(test_session_dir, exist_ok=True)
 
-    sub_session_dir_exists = True
+
+def update_session_store(store_type: str):
+    """ 切换会话存储后端: file 每个会话一个文件，segment 追加写入少量分段文件，dedup 在 segment 基础上按内容去重报文 """
+    global session_store_type
+    close_session_store()
+    new_session_store(store_type, test_session_dir)  # 提前校验
+    session_store_type = store_type
+
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None or _session_store.session_dir != test_session_dir:
+            if _session_store is not None:
+                _session_store.close()
+            _session_store = new_session_store(session_store_type, test_session_dir)
+        return _session_store
+
+
+@atexit.register
+def close_session_store():
+    global _session_store
+    with _session_store_lock:
+        if _session_store is not None:
+            _session_store.close()
+            _session_store = None
+
+
+class ResponseDroppedError(RuntimeError):
+    """ 响应报文已按保留策略丢弃，只剩长度和摘要；用例校验时遇到视为跳过(计入未覆盖)，不算失败 """
 
 
-@dataclass
 class HttpTransaction:
-    url: str  # 存储请求的URL
-    method: str  # 存储请求的方法
-    status_code: Optional[int]  # 存储HTTP状态码
-    request: Optional[str]  # 存储请求数据（序列化后的字符串）
-    response: Optional[str]  # 存储响应数据（序列化后的字符串）
-    request_time: Optional[datetime] = datetime.now()  # 存储请求时间
-    cost_time: Optional[float] = 0.0
-    retry_cnt: Optional[int] = 0
-
-    def to_json(self) -> str:
-        return json.dumps(self.to_dict(), indent=2)
+    """ 一次 HTTP 请求及其响应
+
+    使用 __slots__ 减少单个对象的内存，url/method 在整个测试中取值很少，统一 intern 后所有请求共享同一个字符串对象
+    """
+    __slots__ = ("url", "method", "status_code", "request", "response", "request_time", "cost_time", "retry_cnt",
+                 "sched_lag", "rsp_size", "rsp_digest", "attempts", "phases")
+    _fields = __slots__
+
+    def __init__(self, url: str, method: str, status_code: Optional[int] = None, request: Optional[str] = None,
+                 response: Optional[str] = None, request_time: Optional[datetime] = None,
+                 cost_time: Optional[float] = 0.0, retry_cnt: Optional[int] = 0, sched_lag: Optional[float] = 0.0,
+                 rsp_size: Optional[int] = None, rsp_digest: Optional[str] = None,
+                 attempts: Optional[list] = None, phases: Optional[list] = None):
+        self.url = sys.intern(url) if isinstance(url, str) else url  # 存储请求的URL
+        self.method = sys.intern(method) if isinstance(method, str) else method  # 存储请求的方法
+        self.status_code = status_code  # 存储HTTP状态码
+        self.request = request  # 存储请求数据（序列化后的字符串）
+        self.response = response  # 存储响应数据（序列化后的字符串）
+        self.request_time = request_time if request_time is not None else datetime.now()  # 存储请求时间
+        self.cost_time = cost_time  # 从首次尝试开始到最终结果的总耗时，包含重试等待
+        self.retry_cnt = retry_cnt
+        self.sched_lag = sched_lag  # 开环模式下实际发送时刻落后于计划发送时刻的时长
+        self.rsp_size = rsp_size  # 响应报文字节数，收到响应时记录，报文按保留策略丢弃后仍保留
+        self.rsp_digest = rsp_digest  # 响应报文按保留策略丢弃后记录的摘要
+        # 发生重试时记录每次尝试的 [耗时, 状态码, 异常类型]，只尝试一次时为 None
+        self.attempts = attempts
+        # 最后一次尝试的 [建连, TLS, 首字节, 下载] 耗时(微秒，单调时钟)，见 timing.PHASES，未收到响应时为 None
+        self.phases = phases
+
+    def to_json(self, indent=None) -> str:
+        return codec.dumps(self.to_dict(), indent=indent)
 
     def to_dict(self) -> dict:
+        data = {k: getattr(self, k) for k in self._fields}
         # 将 datetime 对象转换为字符串
-        data = asdict(self)
-        data['request_time'] = self.request_time.isoformat()
+        if isinstance(self.request_time, datetime):
+            data['request_time'] = self.request_time.isoformat()
         return data
 
     def req_json(self):
-        return json.loads(self.request)
+        return json_cache.loads(self.request)
 
     def rsp_json(self):
-        return json.loads(self.response)
+        self._check_dropped()
+        return json_cache.loads(self.response)
+
+    def extract(self, path: str, default=None):
+        """ 按路径从响应中取值，如 "data.items[*].id"，只解析路径指向的部分，路径不存在时返回 default """
+        self._check_dropped()
+        return json_path.extract(self.response, path, default)
+
+    def _check_dropped(self):
+        if self.response_dropped():
+            raise ResponseDroppedError(f"response of {self.url} dropped by body retention, "
+                                       f"size: {self.rsp_size}, digest: {self.rsp_digest}")
 
     def rsp_json_data(self):
         return self.rsp_json()["data"]
@@ -58,18 +122,42 @@ class HttpTransaction:
     def finished_without_error(self):
         return self.status_code == 200
 
+    def response_dropped(self):
+        return self.response is None and self.rsp_digest is not None
+
     @staticmethod
     def from_json(json_str: str) -> 'HttpTransaction':
-        data = json.loads(json_str)
+        data = codec.loads(json_str)
         # 将字符串转换回 datetime 对象
         data['request_time'] = datetime.fromisoformat(data['request_time'])
         return HttpTransaction(**data)
 
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self._fields)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self._fields)
+        return f"HttpTransaction({fields})"
+
 
 class IDGenerator:
+    """ 会话ID分配
+
+    ID 按块在内存中分配，ID 文件只记录已预留的高水位，每 id_block_size 个会话写一次盘。
+    文件内容为 "{已分配ID}" 表示正常释放；"{块起点} {高水位}" 表示有未释放的预留块，
+    进程异常退出后从高水位继续分配，(块起点, 高水位] 之间的 ID 可能未被使用，但绝不会被复用。
+    多进程发送时，子进程通过 share_ids 从父进程创建的共享计数器按块预留ID，ID 不连续但不会重复。
+    """
     _id = None
     _lock = threading.Lock()  # 使用线程锁来保护类变量
-    id_dict = {}
+    id_dict = {}  # 已分配的最大ID
+    hwm_dict = {}  # 已持久化预留的最大ID
+    shared_dict = {}  # 多进程发送时: label -> (共享计数器, 本次发送开始前的ID)
+    id_block_size = 1000
 
     @classmethod
     def _read_initial_id(cls, file_path):
@@ -77,32 +165,104 @@ class IDGenerator:
         file_path = os.path.join(test_session_dir, file_path)
         try:
             with open(file_path, 'r') as file:
-                cls.id_dict[k] = int(file.read().strip())
+                fields = file.read().split()
+            last_id = int(fields[0])
+            hwm = int(fields[1]) if len(fields) > 1 else last_id
         except:
-            cls.id_dict[k] = 0
+            last_id, hwm = 0, 0
+        if hwm > last_id:
+            logger.warning(f"会话ID[{k}] 上次分配未正常释放, ID ({last_id}, {hwm}] 可能未被使用, 从 {hwm + 1} 继续分配")
+        cls.id_dict[k] = hwm
+        cls.hwm_dict[k] = hwm
 
     @classmethod
     def _write_id_to_file(cls, file_path: str):
         k = file_path
         file_path = os.path.join(test_session_dir, file_path)
-        with open(file_path, 'w') as file:
-            file.write(str(cls.id_dict[k]))
+        if cls.hwm_dict[k] > cls.id_dict[k]:
+            content = f"{cls.id_dict[k]} {cls.hwm_dict[k]}"
+        else:
+            content = str(cls.id_dict[k])
+        cls._write_id_file(file_path, content)
+
+    @staticmethod
+    def _write_id_file(file_path: str, content: str):
+        # 先写临时文件再替换，避免写一半时退出导致ID文件损坏
+        tmp_file_path = file_path + ".tmp"
+        with open(tmp_file_path, 'w') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file_path, file_path)
 
     @classmethod
     def get_next_id(cls, file_path: str) -> int:
         with cls._lock:  # 使用线程锁来保护临界区
             if cls.id_dict.get(file_path, None) is None:
                 cls._read_initial_id(file_path)
+            if cls.id_dict[file_path] >= cls.hwm_dict[file_path]:
+                shared = cls.shared_dict.get(file_path)
+                if shared is None:
+                    # 当前块用完，先持久化新块的高水位再分配
+                    cls.hwm_dict[file_path] = cls.id_dict[file_path] + cls.id_block_size
+                    cls._write_id_to_file(file_path)
+                else:
+                    counter, base_id = shared
+                    with counter.get_lock():
+                        start = counter.value
+                        counter.value = start + cls.id_block_size
+                        cls._write_id_file(os.path.join(test_session_dir, file_path), f"{base_id} {counter.value}")
+                    cls.id_dict[file_path] = start
+                    cls.hwm_dict[file_path] = start + cls.id_block_size
             cls.id_dict[file_path] += 1
-            cls._write_id_to_file(file_path)
             return cls.id_dict[file_path]
 
     @classmethod
     def get_curr_id(cls, file_path: str) -> int:
         with cls._lock:  # 使用线程锁来保护临界区
-            cls._read_initial_id(file_path)
+            if cls.id_dict.get(file_path, None) is None:
+                cls._read_initial_id(file_path)
             return cls.id_dict[file_path]
 
+    @classmethod
+    def share_ids(cls, file_path: str, counter, base_id: int):
+        """ 发送子进程中调用，之后从共享计数器(multiprocessing.Value)按块预留ID，base_id 为本次发送开始前的ID """
+        with cls._lock:
+            cls.shared_dict[file_path] = (counter, base_id)
+            cls.id_dict[file_path] = base_id
+            cls.hwm_dict[file_path] = base_id
+
+    @classmethod
+    def set_curr_id(cls, file_path: str, curr_id: int):
+        """ 多进程发送结束后由父进程调用，记录所有子进程中分配的最大ID """
+        with cls._lock:
+            cls.id_dict[file_path] = curr_id
+            cls.hwm_dict[file_path] = curr_id
+            cls._write_id_to_file(file_path)
+
+    @classmethod
+    def release_ids(cls, file_path: str = None):
+        """ 归还未使用的预留ID，将实际分配的最大ID写回文件 """
+        with cls._lock:
+            for k in list(cls.id_dict.keys()):
+                if (file_path is not None and k != file_path) or k in cls.shared_dict:
+                    continue
+                if cls.hwm_dict[k] > cls.id_dict[k]:
+                    cls.hwm_dict[k] = cls.id_dict[k]
+                    cls._write_id_to_file(k)
+
+    @classmethod
+    def reset_ids(cls, file_path: str = None):
+        """ ID 文件被清理后，丢弃内存中的分配状态，下次从文件(或1)重新开始 """
+        with cls._lock:
+            for k in list(cls.id_dict.keys()):
+                if file_path is None or k == file_path:
+                    cls.id_dict.pop(k, None)
+                    cls.hwm_dict.pop(k, None)
+
+
+atexit.register(IDGenerator.release_ids)
+
 
 class Session(IDGenerator):
 
@@ -127,34 +287,38 @@ class Session(IDGenerator):
 
     @staticmethod
     def clear_sessions(label: str):
-        if sub_session_dir_exists:
-            # remote all files in test_session_dir but not remove the dir
-            for root, _, files in os.walk(test_session_dir, topdown=False):
-                for name in files:
-                    os.remove(os.path.join(root, name))
-            return
+        # 只清理本 label 的数据，同一目录(及其子目录)中其他测试套件、Agent 的会话不受影响
+        get_session_store().clear(label)
+        Session.reset_ids(label)
         id_file = os.path.join(test_session_dir, f"{label}")
-        session_filename_list = glob.glob(id_file + "-*.json")
-        files = session_filename_list + [id_file]
-        for filename in files:
+        try:
+            os.remove(id_file)
+        except Exception as e:
+            logger.error("Failed to remove session {%s}: {%s}", id_file, e)
+
+    @staticmethod
+    def iter_sessions(label: str, batch_size: int = 1000) -> Iterator[List['Session']]:
+        """ 按批次从存储中流式加载会话，每批最多 batch_size 个 """
+        batch = []
+        for record in get_session_store().read(label, Session.get_curr_id(label)):
             try:
-                os.remove(filename)
+                batch.append(Session.from_dict(record) if isinstance(record, dict) else Session.from_json(record))
             except Exception as e:
-                logger.error("Failed to remove session {%s}: {%s}", filename, e)
+                logger.error("Failed to load session of {%s}: {%s}", label, e)
+                continue
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     @staticmethod
     def load_sessions(label: str, n: int = math.inf) -> List['Session']:
         sessions = []
-        id_ = Session.get_curr_id(label)
-        while id_ > 0 and len(sessions) < n:
-            session_filename = f"{label}-{id_:08d}.json"
-            # TODO 数据量过大时，可以考虑分批加载和校验
-            try:
-                s = Session.load_session(os.path.join(test_session_dir, session_filename))
-                sessions.append(s)
-            except Exception as e:
-                logger.error("Failed to load session {%s}: {%s}", session_filename, e)
-            id_ -= 1
+        for batch in Session.iter_sessions(label):
+            sessions += batch
+            if len(sessions) >= n:
+                return sessions[:n]
         return sessions
 
     def create(self, user_info: UserInfo, transactions: List[HttpTransaction],
@@ -167,37 +331,39 @@ class Session(IDGenerator):
         self.session_filename = f"{self.label}-{self.session_id:08d}.json"
         self.ext_state = {}
         self.no_dump = no_dump
-        if not no_dump:
-            self.dump()
         return self
 
     def append_transaction(self, transaction: HttpTransaction):
         self.transactions.append(transaction)
 
-    def to_json(self) -> str:
-        return json.dumps({
+    def to_dict(self) -> dict:
+        return {
             'label': self.label,
             'session_id': self.session_id,
             'user_info': self.user_info.to_dict() if self.user_info else None,
             'transactions': [x.to_dict() for x in self.transactions],
             'ext_state': self.ext_state,
             'start_time': self.start_time
-        }, indent=2)
+        }
+
+    def to_json(self, indent=None) -> str:
+        return codec.dumps(self.to_dict(), indent=indent)
 
     def dump(self):
         if self.session_filename:
             if self.no_dump:
                 return
-            full_session_filename = os.path.join(test_session_dir, self.session_filename)
-            with open(full_session_filename, 'w') as file:
-                file.write(self.to_json())
+            get_session_store().write(self)
         else:
             raise ValueError("Session filename is not set")
 
     @staticmethod
     def from_json(json_str: str) -> 'Session':
-        data = json.loads(json_str)
-        user_info = UserInfo(**data['user_info'])  # 假设 UserInfo 类可以通过 **kwargs 初始化
+        return Session.from_dict(codec.loads(json_str))
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Session':
+        user_info = UserInfo.from_dict(data['user_info'])
         if not data['transactions']:
             raise ValueError("No transactions found")
 
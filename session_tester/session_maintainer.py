@@ -1,22 +1,46 @@
 import queue
+from typing import Iterable
 
-from .request import StReq
+from .request import ReqTemplate, StReq
+from .retention import BodyRetention
+from .retry import RetryPolicy
 from .session import Session
+from .user_info import UserInfo
 
 
 class SessionMaintainerBase:
     url: str = None
     http_method: str = "POST"
-
-    def __init__(self, url: str, http_method: str = "POST"):
+    body_retention: BodyRetention = None
+    # 可选的请求模板，wrap_req 中调用 req_template.render(...) 只序列化每次变化的字段
+    req_template: ReqTemplate = None
+    retry_policy: RetryPolicy = None
+
+    def __init__(self, url: str, http_method: str = "POST", user_info_queue_size: int = 0,
+                 body_retention: BodyRetention = None, retry_policy: RetryPolicy = None):
+        """
+        :param user_info_queue_size: 用户信息队列容量，大于0时 load_user_info 在队列满时阻塞，
+                                     边加载边发送，内存占用与用户总数无关；0 表示不限
+        :param body_retention: 响应报文保留策略，None 表示使用类属性 body_retention，都未设置时保留全部报文
+        :param retry_policy: 请求重试策略，StReq.retry_policy 优先，都未设置时按 StReq.retry 次数重试
+        """
         self.url = url
         self.http_method = http_method
-        self.user_info_queue = queue.Queue()
+        if body_retention is not None:
+            self.body_retention = body_retention
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        self.user_info_queue = queue.Queue(maxsize=user_info_queue_size)
 
     def load_user_info(self):
         if self.user_info_queue.empty():
             raise RuntimeError("user_info_queue is empty")
 
+    def put_user_info(self, user_infos: Iterable[UserInfo]):
+        """ 将用户信息逐个放入队列，配合 iter_user_info_from_* 边读边发，队列有界时随发送进度反压 """
+        for user_info in user_infos:
+            self.user_info_queue.put(user_info)
+
     @staticmethod
     def init_session(_: Session):
         raise NotImplementedError
@@ -0,0 +1,309 @@
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterator, Union
+
+from . import codec
+from .logger import logger
+
+SESSION_STORE_FILE = "file"
+SESSION_STORE_SEGMENT = "segment"
+SESSION_STORE_DEDUP = "dedup"
+
+
+def body_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SessionStore:
+    """ 会话存储后端，负责会话记录的写入、遍历和清理 """
+
+    def __init__(self, session_dir: str):
+        self.session_dir = session_dir
+
+    def write(self, session):
+        raise NotImplementedError
+
+    def read(self, label: str, max_id: int) -> Iterator[Union[str, dict]]:
+        """ 遍历 label 下的会话记录(JSON 字符串或已解析的字典)，max_id 为当前已分配的最大会话ID """
+        raise NotImplementedError
+
+    def clear(self, label: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSessionStore(SessionStore):
+    """ 每个会话一个 JSON 文件: {label}-{id:08d}.json
+
+    多进程发送时各进程按块预留ID，ID 可能不连续，读取时按目录中实际存在的文件遍历。
+    """
+
+    def write(self, session):
+        full_session_filename = os.path.join(self.session_dir, session.session_filename)
+        with open(full_session_filename, 'w', encoding='utf-8') as file:
+            file.write(session.to_json())
+
+    def read(self, label: str, max_id: int) -> Iterator[str]:
+        prefix = label + "-"
+        ids = []
+        with os.scandir(self.session_dir) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith(prefix) and name.endswith(".json"):
+                    id_part = name[len(prefix):-len(".json")]
+                    if id_part.isdigit() and int(id_part) <= max_id:
+                        ids.append(int(id_part))
+        for id_ in sorted(ids, reverse=True):
+            session_filename = f"{label}-{id_:08d}.json"
+            try:
+                with open(os.path.join(self.session_dir, session_filename), 'r', encoding='utf-8') as file:
+                    yield file.read()
+            except Exception as e:
+                logger.error("Failed to load session {%s}: {%s}", session_filename, e)
+
+    def clear(self, label: str):
+        session_filename_list = glob.glob(os.path.join(self.session_dir, glob.escape(label)) + "-*.json")
+        for filename in session_filename_list:
+            try:
+                os.remove(filename)
+            except Exception as e:
+                logger.error("Failed to remove session {%s}: {%s}", filename, e)
+
+
+class SegmentSessionStore(SessionStore):
+    """ 追加写的分段存储: 每个会话一行紧凑 JSON，写满 segment_size 字节后滚动到下一个分段文件
+
+    分段文件名为 {label}-seg-{pid}-{seq:05d}.jsonl，不同进程写各自的分段，互不干扰。
+    """
+
+    def __init__(self, session_dir: str, segment_size: int = 64 * 1024 * 1024):
+        super().__init__(session_dir)
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._writers = {}  # label -> [file, seq, size]
+
+    def _segment_pattern(self, label: str) -> str:
+        return os.path.join(self.session_dir, glob.escape(label)) + "-seg-*.jsonl"
+
+    def _open_segment(self, label: str, seq: int):
+        filename = os.path.join(self.session_dir, f"{label}-seg-{os.getpid()}-{seq:05d}.jsonl")
+        return open(filename, 'ab')
+
+    def write(self, session):
+        self._write_line(session.label, session.to_json(indent=None).encode('utf-8') + b"\n")
+
+    def _write_line(self, label: str, line: bytes):
+        with self._lock:
+            writer = self._writers.get(label)
+            if writer is None:
+                writer = [self._open_segment(label, 0), 0, 0]
+                self._writers[label] = writer
+            elif writer[2] >= self.segment_size:
+                writer[0].close()
+                writer[1] += 1
+                writer[0] = self._open_segment(label, writer[1])
+                writer[2] = 0
+            writer[0].write(line)
+            writer[2] += len(line)
+
+    def flush(self, label: str = None):
+        with self._lock:
+            for k, writer in self._writers.items():
+                if label is None or k == label:
+                    writer[0].flush()
+
+    def read(self, label: str, max_id: int) -> Iterator[str]:
+        self.flush(label)
+        for filename in sorted(glob.glob(self._segment_pattern(label))):
+            with open(filename, 'rb') as file:
+                for line in file:
+                    if line.strip():
+                        # 崩溃时最后一行可能截断在多字节字符中间，解码不报错，由解析时跳过
+                        yield line.decode('utf-8', errors='replace')
+
+    def clear(self, label: str):
+        with self._lock:
+            writer = self._writers.pop(label, None)
+            if writer is not None:
+                writer[0].close()
+        for filename in glob.glob(self._segment_pattern(label)):
+            try:
+                os.remove(filename)
+            except Exception as e:
+                logger.error("Failed to remove session segment {%s}: {%s}", filename, e)
+
+    def close(self):
+        with self._lock:
+            for writer in self._writers.values():
+                writer[0].close()
+            self._writers = {}
+
+
+class DedupSessionStore(SegmentSessionStore):
+    """ 按内容去重的分段存储
+
+    请求和响应报文按摘要写入 {label}-blob-{pid}.dat，每个内容只存一份，会话记录中以 {"$blob": 摘要} 引用；
+    读取时还原为原始报文，内容相同的报文共享同一个字符串对象。短于 min_blob_size 字节的报文仍内联存储。
+    blob 文件格式为 "{摘要} {长度}\n{报文}\n"，读取时只扫描头部建立索引，报文按需读取并缓存最近使用的部分。
+    """
+
+    def __init__(self, session_dir: str, segment_size: int = 64 * 1024 * 1024, min_blob_size: int = 256,
+                 cache_bytes: int = 64 * 1024 * 1024):
+        super().__init__(session_dir, segment_size)
+        self.min_blob_size = min_blob_size
+        self.cache_bytes = cache_bytes
+        self._blob_writers = {}  # label -> file
+        self._known_blobs = {}  # label -> set(摘要)
+
+    def _blob_pattern(self, label: str) -> str:
+        return os.path.join(self.session_dir, glob.escape(label)) + "-blob-*.dat"
+
+    @staticmethod
+    def _scan_blobs(filename: str) -> Iterator[tuple]:
+        """ 遍历 blob 文件，返回 (摘要, 报文偏移, 报文长度) """
+        with open(filename, 'rb') as file:
+            while True:
+                header = file.readline()
+                if not header:
+                    return
+                try:
+                    digest, size = header.split()
+                    size = int(size)
+                except ValueError:
+                    logger.error("Corrupt session blob header {%s} at %d", filename, file.tell() - len(header))
+                    return
+                offset = file.tell()
+                if offset + size + 1 > os.fstat(file.fileno()).st_size:
+                    logger.error("Truncated session blob {%s} at %d", filename, offset)
+                    return
+                yield digest.decode(), offset, size
+                file.seek(size + 1, os.SEEK_CUR)
+
+    def _put_blob(self, label: str, body: str) -> Union[str, dict]:
+        data = body.encode('utf-8')
+        if len(data) < self.min_blob_size:
+            return body
+        digest = body_digest(data)
+        known = self._known_blobs.get(label)
+        if known is None:
+            # 续跑时复用已有 blob，避免重复写入
+            known = set()
+            for filename in glob.glob(self._blob_pattern(label)):
+                known.update(x[0] for x in self._scan_blobs(filename))
+            self._known_blobs[label] = known
+        if digest not in known:
+            writer = self._blob_writers.get(label)
+            if writer is None:
+                filename = os.path.join(self.session_dir, f"{label}-blob-{os.getpid()}.dat")
+                writer = open(filename, 'ab')
+                self._blob_writers[label] = writer
+            writer.write(f"{digest} {len(data)}\n".encode() + data + b"\n")
+            known.add(digest)
+        return {"$blob": digest}
+
+    def write(self, session):
+        data = session.to_dict()
+        with self._lock:
+            for tx in data['transactions']:
+                for k in ('request', 'response'):
+                    if isinstance(tx.get(k), str):
+                        tx[k] = self._put_blob(session.label, tx[k])
+        line = codec.dumps(data).encode('utf-8') + b"\n"
+        self._write_line(session.label, line)
+
+    def flush(self, label: str = None):
+        with self._lock:
+            for k, writer in self._blob_writers.items():
+                if label is None or k == label:
+                    writer.flush()
+        super().flush(label)
+
+    def read(self, label: str, max_id: int) -> Iterator[Union[str, dict]]:
+        self.flush(label)
+        index = {}
+        for filename in glob.glob(self._blob_pattern(label)):
+            for digest, offset, size in self._scan_blobs(filename):
+                index[digest] = (filename, offset, size)
+
+        files = {}
+        cache = OrderedDict()
+        cache_size = 0
+
+        def load_blob(ref: dict) -> str:
+            nonlocal cache_size
+            digest = ref["$blob"]
+            cached = cache.get(digest)
+            if cached is not None:
+                cache.move_to_end(digest)
+                return cached[0]
+            filename, offset, size = index[digest]
+            file = files.get(filename)
+            if file is None:
+                file = files[filename] = open(filename, 'rb')
+            file.seek(offset)
+            body = file.read(size).decode('utf-8')
+            # 缓存按字节数计，淘汰时减去同样的字节数(非 ASCII 报文的字符数小于字节数)
+            cache[digest] = (body, size)
+            cache_size += size
+            while cache_size > self.cache_bytes and len(cache) > 1:
+                _, (_, evicted_size) = cache.popitem(last=False)
+                cache_size -= evicted_size
+            return body
+
+        try:
+            for record in super().read(label, max_id):
+                # 与其他存储一致，单条记录损坏(如崩溃时截断的最后一行)只跳过该记录
+                try:
+                    data = codec.loads(record)
+                    transactions = data['transactions']
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error("Failed to load session of {%s}: {%s}", label, e)
+                    continue
+                for tx in transactions:
+                    for k in ('request', 'response'):
+                        if isinstance(tx.get(k), dict):
+                            try:
+                                tx[k] = load_blob(tx[k])
+                            except KeyError:
+                                logger.error("Missing session blob {%s} of {%s}", tx[k]["$blob"], label)
+                                tx[k] = None
+                yield data
+        finally:
+            for file in files.values():
+                file.close()
+
+    def clear(self, label: str):
+        with self._lock:
+            writer = self._blob_writers.pop(label, None)
+            if writer is not None:
+                writer.close()
+            self._known_blobs.pop(label, None)
+        for filename in glob.glob(self._blob_pattern(label)):
+            try:
+                os.remove(filename)
+            except Exception as e:
+                logger.error("Failed to remove session blob {%s}: {%s}", filename, e)
+        super().clear(label)
+
+    def close(self):
+        with self._lock:
+            for writer in self._blob_writers.values():
+                writer.close()
+            self._blob_writers = {}
+            self._known_blobs = {}
+        super().close()
+
+
+def new_session_store(store_type: str, session_dir: str) -> SessionStore:
+    if store_type == SESSION_STORE_FILE:
+        return FileSessionStore(session_dir)
+    if store_type == SESSION_STORE_SEGMENT:
+        return SegmentSessionStore(session_dir)
+    if store_type == SESSION_STORE_DEDUP:
+        return DedupSessionStore(session_dir)
+    raise ValueError(f"Invalid session store: {store_type}")
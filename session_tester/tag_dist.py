@@ -0,0 +1,105 @@
+import math
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Tuple
+
+from .session import Session
+
+TAG_LEVEL_TRANSACTION = "transaction"
+TAG_LEVEL_SESSION = "session"
+
+_session_list: List[Session] = []
+_tag_func = None
+_tag_level = TAG_LEVEL_TRANSACTION
+_MISSING = object()
+
+
+def iter_tags(flags: Iterable) -> Iterable:
+    """ 展开标签函数的返回值，返回列表时每个元素各计一次 """
+    for flag in flags:
+        if isinstance(flag, list):
+            yield from flag
+        else:
+            yield flag
+
+
+def count_transaction_tags(session_list: List[Session], tag_func: Callable, counter: Counter = None,
+                           tag_path: str = None) -> Counter:
+    """ 对每个请求的响应 JSON 调用 tag_func 并计数，结果累加到 counter，报文已丢弃的请求不参与统计
+
+    tag_path 非空时只解析响应中该路径的值(见 HttpTransaction.extract)，tag_func 为空时直接以该值为标签，
+    否则对该值调用 tag_func；路径不存在的请求不计数
+    """
+    if counter is None:
+        counter = Counter()
+    transactions = (t for s in session_list for t in s.transactions if not t.response_dropped())
+    if tag_path is None:
+        flags = (tag_func(t.rsp_json()) for t in transactions)
+    elif tag_func is None:
+        flags = (t.extract(tag_path, []) for t in transactions)
+    else:
+        flags = (tag_func(v) for v in (t.extract(tag_path, _MISSING) for t in transactions) if v is not _MISSING)
+    # Counter.update 在 C 中完成哈希分组计数
+    counter.update(iter_tags(flags))
+    return counter
+
+
+def count_session_tags(session_list: List[Session], tag_func: Callable, counter: Counter = None) -> Counter:
+    """ 对每个会话调用 tag_func 并计数，结果累加到 counter """
+    if counter is None:
+        counter = Counter()
+    counter.update(iter_tags(tag_func(s) for s in session_list))
+    return counter
+
+
+def count_tags(session_list: List[Session], tag_func: Callable, level: str = TAG_LEVEL_TRANSACTION,
+               counter: Counter = None) -> Counter:
+    if level == TAG_LEVEL_TRANSACTION:
+        return count_transaction_tags(session_list, tag_func, counter)
+    if level == TAG_LEVEL_SESSION:
+        return count_session_tags(session_list, tag_func, counter)
+    raise ValueError(f"Invalid tag level: {level}")
+
+
+def _init_worker(session_list, tag_func, level):
+    global _session_list, _tag_func, _tag_level
+    _session_list = session_list
+    _tag_func = tag_func
+    _tag_level = level
+
+
+def _count_range(start: int, end: int) -> Counter:
+    return count_tags(_session_list[start:end], _tag_func, _tag_level)
+
+
+def count_tags_parallel(session_list: List[Session], tag_func: Callable, level: str = TAG_LEVEL_TRANSACTION,
+                        workers: int = 0) -> Counter:
+    """ 多进程提取标签，各进程返回部分计数后合并，workers 小于2时在当前进程计算
+
+    会话列表和 tag_func 由 fork 出的子进程直接继承(lambda 也可以使用)，任务只传分片的下标范围，
+    只回传计数，会话本身不做序列化；不支持 fork 的平台上序列化会话比提取标签更慢，在当前进程计算。
+    """
+    if workers < 2 or len(session_list) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return count_tags(session_list, tag_func, level)
+    counter = Counter()
+    chunk_size = max(1, math.ceil(len(session_list) / (workers * 2)))
+    starts = range(0, len(session_list), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                             initializer=_init_worker, initargs=(session_list, tag_func, level)) as executor:
+        for part in executor.map(_count_range, starts, [i + chunk_size for i in starts]):
+            counter.update(part)
+    return counter
+
+
+def dist_list(counter: Counter) -> List[Tuple]:
+    """ 转为 (标签, 数量, 占比) 列表，按数量降序 """
+    total = sum(counter.values())
+    return [(k, v, v / total) for k, v in counter.most_common()]
+
+
+def format_dist_list(rows: List[Tuple], format_ratio=True) -> List[dict]:
+    """ 转为报告行，format_ratio 为 True 时占比格式化为百分数字符串 """
+    if format_ratio:
+        return [{"group": k, "count": v, "ratio": f"{ratio * 100:.2f}%"} for k, v, ratio in rows]
+    return [{"group": k, "count": v, "ratio": ratio} for k, v, ratio in rows]
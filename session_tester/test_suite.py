@@ -1,20 +1,77 @@
 import ast
+import asyncio
+import concurrent.futures
 import datetime
+import functools
 import inspect
+import multiprocessing
+import os
 import queue
 import threading
-import time
-from dataclasses import dataclass
+import traceback
 from typing import List
 
+from .async_client import AsyncClient, new_http_session
 from .client import Client
+from .http_pool import AsyncConnStats, HttpSessionPool
+from .json_cache import shared_json_cache, DEFAULT_JSON_CACHE_BYTES
+from .live_metrics import LiveMetrics
 from .logger import logger
-from .session import Session
+from .parallel_check import ParallelChecker, check_sessions
+from .scheduler import ArrivalScheduler
+from .send_stat import SendStat
+from .session import Session, close_session_store
 from .session_maintainer import SessionMaintainerBase
-from .testcase import TestCase, SingleRequestCase, Report, SingleSessionCase, AllSessionCase
+from .testcase import TestCase, SingleRequestCase, Report, SingleSessionCase, AllSessionCase, \
+    StreamingAllSessionCase, TransactionTableCase
+from .transaction_table import TransactionTable
 from .utils import func_to_case, default_session_checker_prefix
 
 
+SEND_ENGINE_THREAD = "thread"
+SEND_ENGINE_ASYNCIO = "asyncio"
+
+# user_info_queue 的结束标记，每个消费者取到一个后退出
+_QUEUE_END = object()
+
+
+def _load_user_info(session_maintainer: SessionMaintainerBase, prefilled: bool, consumer_cnt: int):
+    """ 加载用户信息并追加结束标记，加载失败时也要通知消费者退出 """
+    try:
+        if not prefilled:
+            session_maintainer.load_user_info()
+    except Exception as e:
+        logger.error(f"failed to load user info: {e}")
+    finally:
+        for _ in range(consumer_cnt):
+            session_maintainer.user_info_queue.put(_QUEUE_END)
+
+
+def _send_process(test_suite: 'TestSuite', user_queue, result_queue, counter, base_id: int, send_kwargs: dict):
+    """ 发送子进程: 从父进程分发的队列中取用户信息，其余复用单进程的发送流程 """
+    try:
+        Session.share_ids(test_suite.name, counter, base_id)
+        session_maintainer = test_suite.session_maintainer
+        session_maintainer.user_info_queue = queue.Queue(maxsize=send_kwargs["thread_cnt"])
+        session_maintainer.load_user_info = lambda: session_maintainer.put_user_info(iter(user_queue.get, None))
+        send_stat = test_suite.do_send(**send_kwargs)
+        close_session_store()
+        result_queue.put((os.getpid(), send_stat, Session.get_curr_id(test_suite.name), None))
+    except BaseException:  # pylint: disable=broad-except
+        result_queue.put((os.getpid(), None, None, traceback.format_exc()))
+
+
+def _put_while_alive(q, item, procs):
+    """ 向子进程队列放入数据，子进程全部退出时不再阻塞 """
+    while True:
+        try:
+            q.put(item, timeout=1)
+            return
+        except queue.Full:
+            if not any(p.is_alive() for p in procs):
+                raise RuntimeError("all send processes exited") from None
+
+
 class TestSuite:
     def __init__(self, name=None, session_maintainer: SessionMaintainerBase = None, spec_cases=None):
         self.name = name
@@ -28,6 +85,8 @@ class TestSuite:
         self.session_maintainer: SessionMaintainerBase = session_maintainer
         self.report_list: List[Report] = []
         self.parent_name = None
+        # 发送过程中返回各发送线程(协程)当前统计的函数，发送结束后为 None
+        self.send_stats_getter = None
         self._check_cases = self.merge_cases(spec_cases)
 
     def merge_cases(self, spec_cases):
@@ -103,35 +162,36 @@ class TestSuite:
 
         return check_cases
 
-    def do_send(self, thread_cnt=50, no_dump=False):
-        stopped = threading.Event()
-        stopped.clear()
-        lock = threading.Lock()
+    def do_send(self, thread_cnt=50, no_dump=False, engine=SEND_ENGINE_THREAD, arrival_rate=None,
+                report_interval=None, metrics_port=None, pool_maxsize=None, prewarm_connections=0, processes=0):
+        """
+        :param thread_cnt: 并发会话数
+        :param no_dump: 不记录会话内容
+        :param engine: 发送引擎
+        :param arrival_rate: 目标请求速率(请求/秒)，非空时按开环定速发送，否则每个会话收到响应后立即发送下一个请求
+        :param report_interval: 实时指标打印间隔(秒)，为空时不打印
+        :param metrics_port: 本地 Prometheus 指标端口，为空时不开启
+        :param pool_maxsize: 每个主机的最大长连接数，为空时与并发会话数一致
+        :param prewarm_connections: 开始计时前预先建立的长连接数(仅线程引擎)
+        :param processes: 大于1时使用多个发送进程，thread_cnt 为每个进程内的并发会话数
+        """
+        if processes and processes > 1:
+            if metrics_port is not None:
+                logger.warning("多进程发送不支持 metrics_port，各进程按 report_interval 分别打印实时指标")
+            return self.do_send_multiprocess(processes, thread_cnt=thread_cnt, no_dump=no_dump, engine=engine,
+                                             arrival_rate=arrival_rate, report_interval=report_interval,
+                                             pool_maxsize=pool_maxsize, prewarm_connections=prewarm_connections)
+        if engine == SEND_ENGINE_ASYNCIO:
+            return asyncio.run(self.do_send_async(concurrency=thread_cnt, no_dump=no_dump, arrival_rate=arrival_rate,
+                                                  report_interval=report_interval, metrics_port=metrics_port,
+                                                  pool_maxsize=pool_maxsize))
+        if engine != SEND_ENGINE_THREAD:
+            raise ValueError(f"Invalid send engine: {engine}")
 
         logger.info(f"{self.name} 开始发送")
 
-        @dataclass
-        class SendStat:
-            total_session_cnt: int = 0
-            total_session_cost: int = 0
-            total_send_cnt: int = 0
-            total_send_err_cnt: int = 0
-            total_retry_cnt: int = 0
-            total_send_cost: int = 0
-            start_time: datetime.datetime = 0
-            end_time: datetime.datetime = 0
-
-            def report(self):
-                logger.info("发送请求统计：")
-                logger.info(f"    {self.total_session_cnt} 个会话")
-                logger.info(
-                    f"    {self.total_send_cnt} 个请求(失败重试 {self.total_retry_cnt}, 最终失败 {self.total_send_err_cnt})")
-                logger.info(f"    总耗时: {((self.end_time - self.start_time).total_seconds()):.2f} 秒")
-                logger.info(f"    请求平均耗时: {(self.total_send_cost * 1000 / self.total_send_cnt):.2f} 毫秒")
-                logger.info(f"    会话平均耗时: {(self.total_session_cost * 1000 / self.total_session_cnt):.2f} 毫秒")
-                logger.info(f"    QPS: {(self.total_send_cnt / (self.end_time - self.start_time).total_seconds()):.2f}")
-
-        send_stat = SendStat()
+        send_stat = SendStat(arrival_rate=arrival_rate)
+        scheduler = ArrivalScheduler(arrival_rate) if arrival_rate else None
 
         class SendWorker(threading.Thread):
             def __init__(self, label, session_maintainer_cls: SessionMaintainerBase):
@@ -139,105 +199,375 @@ class TestSuite:
                 self.label = label
                 self.user_info_queue = session_maintainer_cls.user_info_queue
                 self.session_maintainer_cls = session_maintainer_cls
+                self.send_stat = SendStat(arrival_rate=arrival_rate)
+                self.table = TransactionTable()
 
             def run(self):
                 while True:
+                    # 阻塞等待用户信息，收到结束标记后退出
+                    user_info = self.user_info_queue.get()
+                    if user_info is _QUEUE_END:
+                        return
+                    # 单个会话异常不能让线程退出，否则不再消费有界队列，加载线程会一直阻塞在 put 上
                     try:
-                        user_info = self.user_info_queue.get_nowait()
-                        session = Session(label=self.label)
-                        session.create(user_info=user_info, transactions=[], no_dump=no_dump)
-                        client = Client(session=session, session_maintainer=self.session_maintainer_cls)
-
-                        start_time = datetime.datetime.now()
-                        client.run()
-                        elapsed_time = (datetime.datetime.now() - start_time).total_seconds()  # 计算请求时间
-                        session.dump()
-                        with lock:
-                            nonlocal send_stat
-                            send_stat.total_session_cnt += 1
-                            send_stat.total_send_cnt += len(session.transactions)
-                            send_stat.total_send_err_cnt += len(
-                                [x for x in session.transactions if not x.finished_without_error()])
-                            send_stat.total_retry_cnt += sum([x.retry_cnt for x in session.transactions])
-                            send_stat.total_send_cost += sum([x.cost_time for x in session.transactions])
-                            send_stat.total_session_cost += elapsed_time
-                    except queue.Empty:
-                        if stopped.is_set():
-                            return
-                        time.sleep(0.1)
+                        self.send_session(user_info)
+                    except Exception as e:
+                        logger.error(f"failed to send session, user: {user_info}, error: {e}\n"
+                                     f"{traceback.format_exc()}")
+
+            def send_session(self, user_info):
+                session = Session(label=self.label)
+                session.create(user_info=user_info, transactions=[], no_dump=no_dump)
+                client = Client(session=session, session_maintainer=self.session_maintainer_cls,
+                                scheduler=scheduler, send_stat=self.send_stat, http_pool=http_pool)
+
+                start_time = datetime.datetime.now()
+                self.send_stat.in_flight_session_cnt += 1
+                try:
+                    client.run()
+                finally:
+                    self.send_stat.in_flight_session_cnt -= 1
+                elapsed_time = (datetime.datetime.now() - start_time).total_seconds()  # 计算请求时间
+                session.dump()
+                if not no_dump:
+                    self.table.extend_session(session)
+                self.send_stat.add_session(session, elapsed_time)
+
+        q = self.session_maintainer.user_info_queue
+        prefilled = not q.empty() and q.qsize() > 0
+        if prefilled:
+            thread_cnt = min(thread_cnt, q.qsize())
 
         class QueueLoader(threading.Thread):
             def __init__(self, session_maintainer_cls: SessionMaintainerBase):
                 threading.Thread.__init__(self)
-                self.user_info_queue = session_maintainer_cls.user_info_queue
                 self.session_maintainer_cls = session_maintainer_cls
 
             def run(self):
-                if not self.session_maintainer_cls.user_info_queue.empty():
-                    stopped.set()
-                    return
-
-                self.session_maintainer_cls.load_user_info()
-                stopped.set()
+                _load_user_info(self.session_maintainer_cls, prefilled, thread_cnt)
 
         t_list = [QueueLoader(self.session_maintainer)]
 
-        q = self.session_maintainer.user_info_queue
-        if not q.empty() and q.qsize() > 0:
-            thread_cnt = min(thread_cnt, q.qsize())
-
-        for _ in range(thread_cnt):
-            t = SendWorker(self.name, self.session_maintainer)
-            t_list.append(t)
+        workers = [SendWorker(self.name, self.session_maintainer) for _ in range(thread_cnt)]
+        t_list += workers
+        self.send_stats_getter = lambda: [t.send_stat for t in workers]
+        live_metrics = self._live_metrics(self.send_stats_getter, report_interval, metrics_port)
 
+        http_pool = HttpSessionPool(pool_maxsize=pool_maxsize or thread_cnt)
+        if prewarm_connections:
+            http_pool.prewarm(self.session_maintainer.url, prewarm_connections)
         send_stat.start_time = datetime.datetime.now()
+        if scheduler is not None:
+            scheduler.start()
+        if live_metrics is not None:
+            live_metrics.start()
         for t in t_list:
             t.start()
 
         for t in t_list:
             t.join()
         send_stat.end_time = datetime.datetime.now()
+        self.send_stats_getter = None
+        if live_metrics is not None:
+            live_metrics.stop()
+        table = TransactionTable()
+        for t in workers:
+            send_stat.merge(t.send_stat)
+            table.extend_table(t.table)
+        table.save_for(self.name)
+        send_stat.new_conn_cnt, send_stat.reused_conn_cnt = http_pool.conn_stats()
+        http_pool.close()
+        Session.release_ids(self.name)
         return send_stat
 
+    async def do_send_async(self, concurrency=1000, no_dump=False, arrival_rate=None,
+                            report_interval=None, metrics_port=None, pool_maxsize=None):
+        """ 单个事件循环内并发维持 concurrency 个会话，替代每个会话占用一个线程 """
+        logger.info(f"{self.name} 开始发送(asyncio, 并发 {concurrency})")
+
+        send_stat = SendStat(arrival_rate=arrival_rate)
+        table = TransactionTable()
+        scheduler = ArrivalScheduler(arrival_rate) if arrival_rate else None
+        session_maintainer = self.session_maintainer
+        q = session_maintainer.user_info_queue
+
+        # 预先填充时只追加结束标记，否则在线程中加载，load_user_info 可以阻塞在有界队列上
+        prefilled = not q.empty() and q.qsize() > 0
+        if prefilled:
+            concurrency = min(concurrency, q.qsize())
+        loop = asyncio.get_running_loop()
+        loader = loop.run_in_executor(None, _load_user_info, session_maintainer, prefilled, 1)
+
+        # 转发线程将用户信息搬到事件循环内的有界队列，队列满时反压到 user_info_queue
+        async_queue = asyncio.Queue(maxsize=concurrency)
+        stopped = threading.Event()
+
+        def put_async(item) -> bool:
+            """ 放入事件循环内的队列，发送中止时放弃并返回 False """
+            future = asyncio.run_coroutine_threadsafe(async_queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.5)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if stopped.is_set():
+                        future.cancel()
+                        return False
+
+        def forward():
+            while True:
+                item = q.get()
+                if item is _QUEUE_END:
+                    for _ in range(concurrency):
+                        if not put_async(_QUEUE_END):
+                            break
+                    return
+                if stopped.is_set() or not put_async(item):
+                    # 发送已中止，继续取出剩余的用户直到结束标记，加载线程不会阻塞在有界队列上
+                    continue
+
+        forwarder = loop.run_in_executor(None, forward)
+
+        async def send_worker(http_session):
+            while True:
+                user_info = await async_queue.get()
+                if user_info is _QUEUE_END:
+                    return
+
+                session = Session(label=self.name)
+                # 会话文件读写放到线程池，不阻塞事件循环
+                await loop.run_in_executor(None, functools.partial(
+                    session.create, user_info=user_info, transactions=[], no_dump=no_dump))
+                client = AsyncClient(session=session, session_maintainer=session_maintainer,
+                                     http_session=http_session, scheduler=scheduler, send_stat=send_stat)
+
+                start_time = datetime.datetime.now()
+                send_stat.in_flight_session_cnt += 1
+                try:
+                    await client.run()
+                finally:
+                    send_stat.in_flight_session_cnt -= 1
+                elapsed_time = (datetime.datetime.now() - start_time).total_seconds()
+                await loop.run_in_executor(None, session.dump)
+                if not no_dump:
+                    table.extend_session(session)
+                send_stat.add_session(session, elapsed_time)
+
+        self.send_stats_getter = lambda: [send_stat]
+        live_metrics = self._live_metrics(self.send_stats_getter, report_interval, metrics_port)
+        conn_stats = AsyncConnStats()
+        async with new_http_session(concurrency, pool_maxsize, conn_stats) as http_session:
+            send_stat.start_time = datetime.datetime.now()
+            if scheduler is not None:
+                scheduler.start()
+            if live_metrics is not None:
+                live_metrics.start()
+            tasks = [asyncio.ensure_future(send_worker(http_session)) for _ in range(concurrency)]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                # 正常结束时转发线程已退出；异常中止时取消其余会话，通知转发线程丢弃剩余用户，
+                # 否则加载和转发线程阻塞在有界队列上，事件循环关闭时等待线程池而卡住
+                stopped.set()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await forwarder
+                await loader
+                self.send_stats_getter = None
+                if live_metrics is not None:
+                    live_metrics.stop()
+        send_stat.end_time = datetime.datetime.now()
+        send_stat.new_conn_cnt, send_stat.reused_conn_cnt = conn_stats.conn_stats()
+        table.save_for(self.name)
+        Session.release_ids(self.name)
+        return send_stat
+
+    def do_send_multiprocess(self, processes, thread_cnt=50, no_dump=False, engine=SEND_ENGINE_THREAD,
+                             arrival_rate=None, report_interval=None, pool_maxsize=None, prewarm_connections=0):
+        """ 多进程发送: 父进程加载用户信息并分发给 processes 个子进程，子进程按块从共享计数器预留会话ID，
+        会话写入同一存储，结束后合并各进程的发送统计。需要 fork 启动方式，用例和会话维护对象由子进程直接继承。
+        """
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("multi-process send requires the fork start method")
+        ctx = multiprocessing.get_context("fork")
+        logger.info(f"{self.name} 开始发送({processes} 个进程, 每个进程并发 {thread_cnt})")
+
+        # 子进程各自打开存储，不能共用父进程已打开的文件
+        Session.release_ids(self.name)
+        close_session_store()
+        base_id = Session.get_curr_id(self.name)
+        counter = ctx.Value('q', base_id)
+        user_queue = ctx.Queue(maxsize=processes * thread_cnt)
+        result_queue = ctx.Queue()
+        send_kwargs = dict(thread_cnt=thread_cnt, no_dump=no_dump, engine=engine,
+                           arrival_rate=arrival_rate / processes if arrival_rate else None,
+                           report_interval=report_interval, pool_maxsize=pool_maxsize,
+                           prewarm_connections=prewarm_connections)
+        procs = [ctx.Process(target=_send_process, daemon=True,
+                             args=(self, user_queue, result_queue, counter, base_id, send_kwargs))
+                 for _ in range(processes)]
+
+        send_stat = SendStat(arrival_rate=arrival_rate)
+        send_stat.start_time = datetime.datetime.now()
+        for p in procs:
+            p.start()
+
+        # 子进程启动后再加载用户信息，fork 时父进程中没有其他线程
+        q = self.session_maintainer.user_info_queue
+        prefilled = not q.empty() and q.qsize() > 0
+        loader = threading.Thread(target=_load_user_info, args=(self.session_maintainer, prefilled, 1), daemon=True)
+        loader.start()
+        try:
+            while True:
+                item = q.get()
+                if item is _QUEUE_END:
+                    break
+                _put_while_alive(user_queue, item, procs)
+            for _ in procs:
+                _put_while_alive(user_queue, None, procs)
+        except RuntimeError as e:
+            logger.error(f"{self.name} 分发用户信息失败: {e}")
+
+        results = []
+        while len(results) < processes:
+            try:
+                results.append(result_queue.get(timeout=1))
+            except queue.Empty:
+                if not any(p.is_alive() for p in procs) and result_queue.empty():
+                    break
+        for p in procs:
+            p.join()
+        send_stat.end_time = datetime.datetime.now()
+
+        errors = [x for x in results if x[3] is not None]
+        for pid, _, _, error in errors:
+            logger.error(f"{self.name} 发送进程 {pid} 异常退出: {error}")
+        for _, child_stat, _, _ in results:
+            if child_stat is not None:
+                send_stat.merge(child_stat)
+        if errors or len(results) < processes:
+            # 有进程异常退出时无法确定实际使用的ID，保守地以已预留的最大ID为准
+            logger.error(f"{self.name} {processes - len(results) + len(errors)} 个发送进程失败, 统计数据不完整")
+            Session.set_curr_id(self.name, counter.value)
+        else:
+            Session.set_curr_id(self.name, max([base_id] + [x[2] for x in results]))
+        return send_stat
+
+    def _live_metrics(self, stats_getter, report_interval, metrics_port):
+        if not report_interval and metrics_port is None:
+            return None
+        return LiveMetrics(self.name, stats_getter, interval=report_interval or 10, port=metrics_port)
+
     def clear_sessions(self):
         Session.clear_sessions(self.name)
-
-    def check(self):
-        # 加载会话结果
-        session_list = Session.load_sessions(self.name)
-        self.report_list = []
+        TransactionTable.remove_for(self.name)
+
+    def check(self, batch_size=1000, workers=0, json_cache_bytes=DEFAULT_JSON_CACHE_BYTES):
+        """ 流式校验: 按批次加载会话，一次遍历同时喂给所有单请求和单会话用例，峰值内存取决于批次大小
+
+        全体会话用例需要完整的会话列表，仅在存在此类用例时才保留会话；可流式校验的全体会话用例按批合并部分结果，不保留会话。
+        请求元数据表用例读取发送时保存的 TransactionTable，只有此类用例时不加载会话。
+        :param batch_size: 每批加载的会话数
+        :param workers: 大于1时，单请求和单会话用例在多进程中并行校验
+        :param json_cache_bytes: 用例间共享的 JSON 解析缓存上限(按原始报文长度计)
+        """
+        with shared_json_cache(json_cache_bytes) as cache:
+            report_list = self._check(batch_size, workers, json_cache_bytes)
+            logger.debug(f"{self.name} JSON 解析缓存命中 {cache.hits} 次, 解析 {cache.misses} 次")
+            return report_list
+
+    def _check(self, batch_size, workers, json_cache_bytes):
+        reports = []
+        request_cases, session_cases, all_session_cases, stream_cases, table_cases = [], [], [], [], []
         for case in self.check_cases():
             if isinstance(case, SingleRequestCase):
                 report = Report(case.name, case.expectation, "SingleRequestCase")
-                transactions = [transaction for session in session_list for transaction in session.transactions]
-                report.total_case_count = len(transactions)
-                report.finished_with_err_count = len([x for x in transactions if not x.finished_without_error()])
-                report.case_results = case.batch_check([x for x in transactions if x.finished_without_error()])
-
+                request_cases.append((case, report))
             elif isinstance(case, SingleSessionCase):
                 report = Report(case.name, case.expectation, "SingleSessionCase")
-                report.finished_with_err_count = len([x for x in session_list if not x.finished_without_error()])
-                report.total_case_count = len(session_list)
-                report.case_results = case.batch_check([x for x in session_list if x.finished_without_error()])
+                session_cases.append((case, report))
+            elif isinstance(case, StreamingAllSessionCase):
+                report = Report(case.name, case.expectation, "AllSessionCase")
+                stream_cases.append((case, report))
             elif isinstance(case, AllSessionCase):
                 report = Report(case.name, case.expectation, "AllSessionCase")
-                session_list = [x for x in session_list if x.finished_without_error()]
-                if not session_list:
-                    report.uncover_case_count = 1
-                else:
-                    report.case_results = case.batch_check([session_list])
+                all_session_cases.append((case, report))
+            elif isinstance(case, TransactionTableCase):
+                report = Report(case.name, case.expectation, "AllSessionCase")
+                table_cases.append((case, report))
             else:
                 raise RuntimeError("unknown case type")
-
-            for result in report.case_results:
-                if result is None:
-                    report.uncover_case_count += 1
-                elif result.result:
-                    report.passed_case_count += 1
+            reports.append(report)
+
+        checker = None
+        if workers > 1 and (request_cases or session_cases or stream_cases):
+            checker = ParallelChecker([x[0] for x in request_cases], [x[0] for x in session_cases], workers,
+                                      json_cache_bytes, [x[0] for x in stream_cases])
+            logger.info(f"{self.name} 使用 {workers} 个进程并行校验")
+
+        # 加载会话结果，没有请求元数据表(如旧版本保存的会话)时顺便构建
+        session_list = []
+        stream_accs = [None for _ in stream_cases]
+        table = None if TransactionTable.exists(self.name) else TransactionTable()
+        need_sessions = table is not None or request_cases or session_cases or stream_cases or all_session_cases
+        try:
+            for batch in Session.iter_sessions(self.name, batch_size) if need_sessions else ():
+                if table is not None:
+                    table.extend_sessions(batch)
+                if checker is not None:
+                    request_results, session_results, stream_parts = checker.check(batch)
                 else:
-                    report.not_passed_case_count += 1
+                    request_results, session_results, stream_parts = check_sessions(
+                        [x[0] for x in request_cases], [x[0] for x in session_cases], batch,
+                        stream_cases=[x[0] for x in stream_cases])
+
+                ok_batch = [x for x in batch if x.finished_without_error()]
+                if request_cases:
+                    transactions = [transaction for session in batch for transaction in session.transactions]
+                    err_cnt = len([x for x in transactions if not x.finished_without_error()])
+                    for (_, report), results in zip(request_cases, request_results):
+                        report.total_case_count += len(transactions)
+                        report.finished_with_err_count += err_cnt
+                        report.add_results(results)
+
+                for (_, report), results in zip(session_cases, session_results):
+                    report.total_case_count += len(batch)
+                    report.finished_with_err_count += len(batch) - len(ok_batch)
+                    report.add_results(results)
+
+                for i, ((case, _), part) in enumerate(zip(stream_cases, stream_parts)):
+                    if part is not None:
+                        stream_accs[i] = case.safe_merge(stream_accs[i], part)
+
+                if all_session_cases:
+                    session_list += ok_batch
+        finally:
+            if checker is not None:
+                checker.close()
+        if table is not None:
+            table.save_for(self.name)
+        elif table_cases:
+            table = TransactionTable.load_for(self.name)
+        for case, report in table_cases:
+            if not len(table):
+                report.uncover_case_count = 1
+            else:
+                report.add_results(case.batch_check([table]))
+
+        for case, report in all_session_cases:
+            if not session_list:
+                report.uncover_case_count = 1
+            else:
+                report.add_results(case.batch_check([session_list]))
+        for (case, report), acc in zip(stream_cases, stream_accs):
+            if acc is None:
+                report.uncover_case_count = 1
+            else:
+                report.add_results([case.safe_finish(acc)])
 
-            self.report_list.append(report)
-            logger.info(f"{self.name}-{case.name} 检查完成")
+        self.report_list = reports
+        for report in reports:
+            logger.info(f"{self.name}-{report.name} 检查完成")
 
         return self.report_list
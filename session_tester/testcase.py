@@ -1,8 +1,10 @@
 import traceback
+import warnings
 from dataclasses import dataclass
 from typing import Callable, List, Optional, Any
 
-from .session import HttpTransaction, Session
+from .session import HttpTransaction, ResponseDroppedError, Session
+from .transaction_table import TransactionTable
 
 
 @dataclass
@@ -21,10 +23,13 @@ class TestCase:
         raise NotImplementedError
 
     def batch_check(self, arg_list: List[Any]) -> List[CheckResult]:
+        """ 依次校验，结果为 None 表示跳过(如用到的响应报文已按保留策略丢弃)，计入未覆盖 """
         ret = []
         for arg in arg_list:
             try:
                 check_result = self.check(arg)
+            except ResponseDroppedError:
+                check_result = None
             except Exception as e:
                 # 获取异常堆栈信息
                 stack_trace = traceback.format_exc()
@@ -60,14 +65,20 @@ def overwrite_name_and_expectation(name, expectation, doc):
 # 单个请求检查
 class SingleRequestCase(TestCase):
     def __init__(self, name: str = None, expectation: str = None,
-                 rsp_checker: Callable[[HttpTransaction], CheckResult] = None):
+                 rsp_checker: Callable[[HttpTransaction], CheckResult] = None, path: str = None):
+        """
+        :param path: 非空时 rsp_checker 的参数改为响应中该路径的值(见 HttpTransaction.extract)，路径不存在时为 None
+        """
         name, expectation = overwrite_name_and_expectation(name, expectation, rsp_checker.__doc__)
         super().__init__(name, expectation)
         self.rsp_checker = rsp_checker
+        self.path = path
 
     def check(self, transaction: HttpTransaction) -> CheckResult:
         if self.rsp_checker is None:
             raise RuntimeError("rsp_checker is required")
+        if self.path is not None:
+            return self.rsp_checker(transaction.extract(self.path))
         return self.rsp_checker(transaction)
 
 
@@ -99,7 +110,79 @@ class AllSessionCase(TestCase):
         return self.session_list_checker(session_list)
 
 
+# 全体请求元数据检查
+class TransactionTableCase(TestCase):
+    """ 参数为测试套件的请求元数据表(TransactionTable)，只用到状态码、耗时等元数据的统计不需要加载会话 """
+
+    def __init__(self, name: str = None, expectation: str = None,
+                 table_checker: Callable[[TransactionTable], CheckResult] = None):
+        name, expectation = overwrite_name_and_expectation(name, expectation, table_checker.__doc__)
+        super().__init__(name, expectation)
+        self.table_checker = table_checker
+
+    def check(self, table: TransactionTable):
+        if self.table_checker is None:
+            raise RuntimeError("table_checker is required")
+        return self.table_checker(table)
+
+
+# 可流式校验的全体会话用例
+class StreamingAllSessionCase(AllSessionCase):
+    """ 每批会话计算可合并的部分结果(partial)，所有批次合并(merge)后由 finish 得出结论
+
+    校验时不需要保留全部会话，多进程校验时部分结果在子进程中计算，只回传部分结果。
+    """
+
+    def partial(self, session_list: List[Session]) -> Any:
+        raise NotImplementedError
+
+    def merge(self, acc: Any, part: Any) -> Any:
+        raise NotImplementedError
+
+    def finish(self, acc: Any) -> CheckResult:
+        raise NotImplementedError
+
+    def check(self, session_list: List[Session]) -> CheckResult:
+        return self.finish(self.partial(session_list))
+
+    def safe_partial(self, session_list: List[Session]) -> Any:
+        """ 计算部分结果，异常时返回失败的 CheckResult，合并时该用例直接失败 """
+        try:
+            return self.partial(session_list)
+        except Exception as e:
+            stack_trace = traceback.format_exc()
+            return CheckResult(False, f"checking exception: {e}\nStack trace:\n{stack_trace}", None)
+
+    def safe_merge(self, acc: Any, part: Any) -> Any:
+        """ acc 为 None 表示还没有部分结果 """
+        if isinstance(acc, CheckResult):
+            return acc
+        if acc is None or isinstance(part, CheckResult):
+            return part
+        try:
+            return self.merge(acc, part)
+        except Exception as e:
+            stack_trace = traceback.format_exc()
+            return CheckResult(False, f"checking exception: {e}\nStack trace:\n{stack_trace}", None)
+
+    def safe_finish(self, acc: Any) -> CheckResult:
+        if isinstance(acc, CheckResult):
+            return acc
+        try:
+            return self.finish(acc)
+        except Exception as e:
+            stack_trace = traceback.format_exc()
+            return CheckResult(False, f"checking exception: {e}\nStack trace:\n{stack_trace}", None)
+
+
 class Report:
+    """ 测试用例的校验汇总
+
+    只累加计数、首个失败原因和额外报告，不持有每个校验结果；需要逐条结果时设置 keep_case_results = True，
+    结果保存在已弃用的 case_results 中。
+    """
+    keep_case_results = False
+
     def __init__(self, name: str, expectation: str, case_type: str):
         self.name = name
         self.expectation = expectation
@@ -107,28 +190,62 @@ class Report:
         self.result = None
         self.bad_case = None
         self.ext_report = []
-        self.case_results: List[CheckResult] = []
+        self.checked_count = 0
+        self.total_case_count = 0
         self.finished_with_err_count = 0
         self.passed_case_count = 0
         self.not_passed_case_count = 0
         self.uncover_case_count = 0
+        self._case_results: Optional[List[Optional[CheckResult]]] = [] if self.keep_case_results else None
+
+    @property
+    def case_results(self) -> List[Optional[CheckResult]]:
+        """ 已弃用: 逐条校验结果，只在 keep_case_results 为 True 时保留，请改用各计数字段 """
+        warnings.warn("Report.case_results is deprecated, use the counters (passed_case_count etc.) instead",
+                      DeprecationWarning, stacklevel=2)
+        if self._case_results is None:
+            raise AttributeError("case_results is not kept, set Report.keep_case_results = True before checking")
+        return self._case_results
+
+    @case_results.setter
+    def case_results(self, case_results: List[Optional[CheckResult]]):
+        # 兼容旧代码直接赋值: 重新按这批结果计数
+        warnings.warn("Report.case_results is deprecated, use Report.add_results instead", DeprecationWarning,
+                      stacklevel=2)
+        self.checked_count = self.passed_case_count = self.not_passed_case_count = self.uncover_case_count = 0
+        self.bad_case = None
+        self.ext_report = []
+        if self._case_results is not None:
+            self._case_results = []
+        self.add_results(case_results)
+
+    def add_results(self, case_results: List[CheckResult]):
+        """ 累加一批校验结果，只保留计数、首个失败原因和额外报告，不持有结果本身(keep_case_results 除外) """
+        if self._case_results is not None:
+            self._case_results += case_results
+        self.checked_count += len(case_results)
+        for case_result in case_results:
+            if case_result is None:
+                self.uncover_case_count += 1
+                continue
+            if case_result.report_lines is not None:
+                self.ext_report += case_result.report_lines
+            if case_result.result:
+                self.passed_case_count += 1
+            else:
+                if self.not_passed_case_count == 0:
+                    self.bad_case = case_result.exception
+                self.not_passed_case_count += 1
 
     def summary(self):
-        if not self.case_results:
+        if self.checked_count == 0:
             self.result = "未覆盖"
             return
         self.result = "通过"
 
-        self.ext_report = []
-        for case_result in self.case_results:
-            if case_result is not None and case_result.report_lines is not None:
-                self.ext_report += case_result.report_lines
-
-        for case_result in self.case_results:
-            if case_result is not None and not case_result.result:
-                self.result = "未通过"
-                self.bad_case = case_result.exception
-                return
+        if self.not_passed_case_count > 0:
+            self.result = "未通过"
+            return
 
         if self.uncover_case_count > 0 and self.passed_case_count == 0:
             self.result = "未覆盖"
@@ -1,14 +1,11 @@
 import os
 from typing import List
 
-import pandas as pd
-from openpyxl.reader.excel import load_workbook
-from openpyxl.styles import Alignment, Font
-
 from .logger import logger
-from .session import update_test_session_dir
-from .test_suite import TestSuite
-from .testcase import Report
+from .report_writer import ReportWriter
+from .session import update_test_session_dir, update_session_store
+from .session_store import SESSION_STORE_FILE, SESSION_STORE_SEGMENT, SESSION_STORE_DEDUP
+from .test_suite import TestSuite, SEND_ENGINE_THREAD, SEND_ENGINE_ASYNCIO
 
 test_report_dir = os.getenv("TEST_REPORT_DIR", "./test_reports")
 if not os.path.exists(test_report_dir):
@@ -20,9 +17,23 @@ class Tester:
     RUN_MODE_CHECK = 1
     RUN_MODE_BENCHMARK = 2
 
+    # 发送引擎: 每个会话一个线程，或者单个事件循环内的协程(需安装 aiohttp)
+    ENGINE_THREAD = SEND_ENGINE_THREAD
+    ENGINE_ASYNCIO = SEND_ENGINE_ASYNCIO
+
+    # 会话存储: 每个会话一个 JSON 文件，或者追加写入少量分段文件
+    STORE_FILE = SESSION_STORE_FILE
+    STORE_SEGMENT = SESSION_STORE_SEGMENT
+    STORE_DEDUP = SESSION_STORE_DEDUP
+
     def __init__(self,
                  name: str,
-                 test_suites: List[TestSuite]):
+                 test_suites: List[TestSuite],
+                 session_store: str = None):
+        """
+        :param session_store: 会话存储后端，Tester.STORE_FILE、Tester.STORE_SEGMENT 或 Tester.STORE_DEDUP(按内容去重报文)，
+                              默认取环境变量 TEST_SESSION_STORE，未设置时为 Tester.STORE_FILE
+        """
         self.name = name
         self.test_suites = test_suites
         # Check no duplicate names
@@ -35,76 +46,90 @@ class Tester:
             if len(names) != len(set(names)):
                 raise ValueError(f"Duplicate test case names in suite {test_suite.name}")
         update_test_session_dir(self.name)
-
-    def run(self, mode=RUN_MODE_NEW, thread_cnt=50):
+        if session_store is not None:
+            update_session_store(session_store)
+
+    def run(self, mode=RUN_MODE_NEW, thread_cnt=50, engine=ENGINE_THREAD, arrival_rate=None, check_batch_size=1000,
+            check_workers=0, report_interval=None, metrics_port=None, pool_maxsize=None, prewarm_connections=0,
+            processes=0, max_detail_rows=None):
+        """
+        :param mode: 运行模式
+        :param thread_cnt: 并发会话数，线程引擎下为线程数，asyncio 引擎下为协程数
+        :param engine: 发送引擎，Tester.ENGINE_THREAD 或 Tester.ENGINE_ASYNCIO
+        :param arrival_rate: 目标请求速率(请求/秒)，设置后按开环定速发送，耗时从计划发送时刻算起，
+                             并发会话数需足以支撑该速率，否则体现为调度滞后
+        :param check_batch_size: 校验时每批加载的会话数
+        :param check_workers: 校验进程数，大于1时单请求和单会话用例多进程并行校验
+        :param report_interval: 发送过程中实时指标(QPS、在途会话、错误率、重试率、窗口耗时分位数)的打印间隔(秒)
+        :param metrics_port: 发送过程中在本地该端口以 Prometheus 文本格式提供 /metrics
+        :param pool_maxsize: 每个主机的最大长连接数，为空时与并发会话数一致
+        :param prewarm_connections: 线程引擎下开始计时前预先建立的长连接数
+        :param processes: 发送进程数，大于1时多进程发送，thread_cnt 和 arrival_rate 分别为每个进程的并发数和全部进程的总速率
+        :param max_detail_rows: 报告中每个用例详细数据的最大行数，为空时不限制
+        """
         if mode not in [self.RUN_MODE_NEW, self.RUN_MODE_CHECK, self.RUN_MODE_BENCHMARK]:
             raise ValueError(f"Invalid tester run mode: {mode}")
+        if engine not in [self.ENGINE_THREAD, self.ENGINE_ASYNCIO]:
+            raise ValueError(f"Invalid tester send engine: {engine}")
 
         if mode == Tester.RUN_MODE_NEW:
             for test_suite in self.test_suites:
                 test_suite.clear_sessions()
             logger.info("清除会话数据成功")
             for test_suite in self.test_suites:
-                test_suite.do_send(thread_cnt=thread_cnt)
+                test_suite.do_send(thread_cnt=thread_cnt, engine=engine, arrival_rate=arrival_rate,
+                                   report_interval=report_interval, metrics_port=metrics_port,
+                                   pool_maxsize=pool_maxsize, prewarm_connections=prewarm_connections,
+                                   processes=processes)
             logger.info("发送请求完成")
         elif mode == Tester.RUN_MODE_BENCHMARK:
             logger.info("启动压力测试")
             for test_suite in self.test_suites:
-                result = test_suite.do_send(thread_cnt=thread_cnt, no_dump=True)
+                result = test_suite.do_send(thread_cnt=thread_cnt, no_dump=True, engine=engine,
+                                            arrival_rate=arrival_rate, report_interval=report_interval,
+                                            metrics_port=metrics_port, pool_maxsize=pool_maxsize,
+                                            prewarm_connections=prewarm_connections, processes=processes)
                 result.report()
             logger.info("压测请求完成")
 
         # 只有新模式和校验模式下才会执行校验
         if mode in [Tester.RUN_MODE_NEW, Tester.RUN_MODE_CHECK]:
-            for test_suite in self.test_suites:
-                test_suite.check()
-                logger.info(f"{test_suite.name}校验完成")
+            self.check_and_report(check_batch_size, check_workers, max_detail_rows)
+
+    def check_and_report(self, check_batch_size=1000, check_workers=0, max_detail_rows=None):
+        """ 校验所有测试套件已保存的会话并生成报告
 
-            # 保存为Excel文件
-            with pd.ExcelWriter(self.report_file(), engine='xlsxwriter') as writer:
-                self.gen_summary(writer)
-                self.gen_detail_report(writer)
-                logger.info(f"汇总报告-内容生成完成")
+        :param max_detail_rows: 每个报告详细数据的最大行数，为空时不限制，超过 Excel 单表上限的部分拆分到多个表
+        """
+        for test_suite in self.test_suites:
+            test_suite.check(batch_size=check_batch_size, workers=check_workers)
+            for report in test_suite.report_list:
+                report.summary()
+            logger.info(f"{test_suite.name}校验完成")
 
-            self.format()
-            logger.info(f"汇总报告-已成功保存到 {self.report_file()}")
+        with ReportWriter(self.report_file(), max_detail_rows=max_detail_rows) as writer:
+            self.gen_summary(writer)
+            self.gen_detail_report(writer)
+            logger.info(f"汇总报告-内容生成完成")
+        logger.info(f"汇总报告-已成功保存到 {self.report_file()}")
 
     def report_file(self):
         return os.path.join(test_report_dir, f"测试报告-{self.name}.xlsx")
 
-    def gen_summary(self, writer):
-        # 解析数据
-        parsed_data = []
-        reports: List[Report]
+    def gen_summary(self, writer: ReportWriter):
+        groups = []
         for test_suite in self.test_suites:
-            reports = test_suite.report_list
-            for report in reports:
-                report.summary()
-                # 创建一个包含字典数据的列表
-                parsed_data.append({
-                    "功能模块": test_suite.name,
-                    "功能点": report.name,
-                    "预期结果": report.expectation,
-                    "最终结果": report.result,
-                    "通过": report.passed_case_count,
-                    "未通过": report.not_passed_case_count,
-                    "未覆盖": report.uncover_case_count,
-                    "网络错误": report.finished_with_err_count,
-                    "异常说明": report.bad_case
-                })
-
-            # 汇总信息
-            df = pd.DataFrame(parsed_data)
-            df.to_excel(writer, sheet_name="测试汇总", index=False)
-
-    def gen_detail_report(self, writer):
+            groups.append([[test_suite.name, report.name, report.expectation, report.result,
+                            report.passed_case_count, report.not_passed_case_count, report.uncover_case_count,
+                            report.finished_with_err_count, report.bad_case]
+                           for report in test_suite.report_list])
+        writer.write_summary(groups)
 
+    def gen_detail_report(self, writer: ReportWriter):
         k = set()
         dup_test_case_name_set = set()
         for test_suite in self.test_suites:
-            reports = test_suite.report_list
-            for report in reports:
-                report.summary()
+            for report in test_suite.report_list:
                 if not report.ext_report:
                     continue
                 if report.name in k:
@@ -112,81 +137,14 @@ class Tester:
                 k.add(report.name)
 
         for test_suite in self.test_suites:
-            reports = test_suite.report_list
-            for report in reports:
-                report.summary()
+            for report in test_suite.report_list:
                 if not report.ext_report:
                     continue
 
-                # 保存为Excel文件
-                ext_df = pd.DataFrame(report.ext_report)
                 if report.name in dup_test_case_name_set:
                     sheet_name = f"{report.name}({test_suite.name})"
                 else:
                     sheet_name = report.name
 
-                ext_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                writer.write_detail(sheet_name, report.ext_report)
                 logger.info(f"详细数据-已成功保存到 表-{sheet_name}")
-
-    def format(self):
-        # 加载生成的Excel文件
-        output_file = self.report_file()
-        wb = load_workbook(output_file)
-        ws = wb.active
-
-        # 设置列宽
-        column_widths = {
-            'A': 30,  # 功能模块
-            'B': 40,  # 功能点
-            'C': 60,  # 预期结果
-            'D': 15,  # 最终结果
-            'E': 8.5,  # 通过
-            'F': 10,  # 未通过
-            'G': 10,  # 未覆盖
-            'H': 13,  # 网络错误
-            'I': 55,  # 异常说明
-        }
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-
-        font = Font(size=16)
-        for row in ws.iter_rows():
-            for cell in row:
-                cell.font = font
-                if cell.row == 1:
-                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                    cell.font = Font(size=16, bold=True)
-                elif cell.column_letter in ['C', 'I']:
-                    cell.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-                else:  # elif cell.column_letter in ['A', 'B', 'D', 'E', 'G']:
-                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-        # 合并A列连续相同的单元格
-        start_row = 2
-        end_row = ws.max_row
-        current_value = None
-        merge_start = start_row
-        for row in range(start_row, end_row + 1):
-            cell_value = ws[f'A{row}'].value
-            if cell_value != current_value:
-                if merge_start < row - 1:
-                    ws.merge_cells(start_row=merge_start, start_column=1, end_row=row - 1, end_column=1)
-                current_value = cell_value
-                merge_start = row
-
-        # 最后一组相同值的单元格合并
-        if merge_start < end_row:
-            ws.merge_cells(start_row=merge_start, start_column=1, end_row=end_row, end_column=1)
-
-        # 自动调整行高
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row):
-            max_height = 0
-            for cell in row:
-                if cell.value:
-                    lines = str(cell.value).split('\n')
-                    max_height = max(max_height, len(lines))
-            if max_height > 0:
-                ws.row_dimensions[row[0].row].height = max_height * 20
-
-        # 保存调整后的Excel文件
-        wb.save(output_file)
@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import List, Optional
+
+# 请求阶段: 建连(TCP)、TLS 握手、首字节(自发出请求到收到响应头，含服务端处理)、下载响应体
+PHASES = ("connect", "tls", "ttfb", "download")
+PHASE_NAMES = {"connect": "建连", "tls": "TLS", "ttfb": "首字节", "download": "下载"}
+
+_local = threading.local()
+
+
+class PhaseTimer:
+    """ 用 time.perf_counter_ns() 记录一次请求尝试的各阶段耗时
+
+    复用连接时建连和 TLS 耗时为0；tls_ns 为 None 表示无法单独区分，TLS 握手计入建连(aiohttp)
+    """
+    __slots__ = ("start", "connect_ns", "tls_ns", "headers", "end")
+
+    def __init__(self, separate_tls: bool = True):
+        self.start = time.perf_counter_ns()
+        self.connect_ns = 0
+        self.tls_ns = 0 if separate_tls else None
+        self.headers = None
+        self.end = None
+
+    def mark_headers(self):
+        self.headers = time.perf_counter_ns()
+
+    def mark_end(self):
+        self.end = time.perf_counter_ns()
+
+    def phases(self) -> Optional[List[Optional[int]]]:
+        """ 按 PHASES 的顺序返回各阶段耗时(微秒)，未收到完整响应时返回 None """
+        if self.headers is None or self.end is None:
+            return None
+        setup = self.connect_ns + (self.tls_ns or 0)
+        return [self.connect_ns // 1000, None if self.tls_ns is None else self.tls_ns // 1000,
+                max(0, self.headers - self.start - setup) // 1000, (self.end - self.headers) // 1000]
+
+
+def activate(timer: Optional[PhaseTimer]):
+    """ 设置当前线程正在计时的请求，同步发送时供连接建立的钩子记录耗时 """
+    _local.timer = timer
+
+
+def current() -> Optional[PhaseTimer]:
+    return getattr(_local, "timer", None)
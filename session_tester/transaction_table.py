@@ -0,0 +1,226 @@
+import glob
+import math
+import os
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+
+from . import session as session_module
+from .logger import logger
+from .session import HttpTransaction, Session
+
+# 列名 -> array 类型码(与 numpy dtype 字符一致)
+COLUMNS = (
+    ("session_id", 'q'),
+    ("round_idx", 'I'),  # 请求在会话中的序号，从0开始
+    ("url_code", 'I'),
+    ("method_code", 'B'),
+    ("status_code", 'h'),  # 无响应时为 -1
+    ("request_time", 'd'),  # 时间戳(秒)，无为 nan
+    ("cost_time", 'd'),  # 无耗时为 nan
+    ("retry_cnt", 'I'),
+    ("sched_lag", 'd'),
+    ("rsp_size", 'q'),  # 响应报文字节数，无响应为 -1
+    # 各阶段耗时(秒)，见 timing.PHASES，未记录为 nan
+    ("connect_time", 'd'),
+    ("tls_time", 'd'),
+    ("ttfb", 'd'),
+    ("download_time", 'd'),
+)
+PHASE_COLUMNS = ("connect_time", "tls_time", "ttfb", "download_time")
+
+
+class TransactionTable:
+    """ 按列存储的请求元数据(不含请求和响应报文)
+
+    每列是一个 array，每个请求只占几十字节；url/method 编码为整数，取值表只保存一份。
+    适合只需要状态码、耗时等元数据的统计，不必在内存中保留完整的 HttpTransaction 对象。
+    column()/to_numpy() 返回 numpy 数组(不复制)，to_frame() 返回 pandas DataFrame，统计时直接做向量运算。
+    发送时每个会话结束后追加，发送结束后以 .npz 格式保存在会话目录下，文件名为 {label}-transactions-{首个会话ID}.npz，
+    多进程和多次发送各自保存，加载时合并。
+    """
+
+    def __init__(self, urls: List[str] = None, methods: List[str] = None, cols: Dict[str, np.ndarray] = None):
+        """
+        :param cols: 列名 -> 已有的列数据(从文件加载)，未给出时为空表
+        """
+        self.urls: List[str] = urls or []
+        self.methods: List[str] = methods or []
+        self._url_codes = {u: i for i, u in enumerate(self.urls)}
+        self._method_codes = {m: i for i, m in enumerate(self.methods)}
+        # 列名 -> array，从文件加载时为 numpy 数组，追加前转为 array
+        self._cols: Dict[str, Union[array, np.ndarray]] = \
+            cols if cols is not None else {name: array(typecode) for name, typecode in COLUMNS}
+
+    @staticmethod
+    def _encode(value, values: list, codes: dict) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            values.append(value)
+            codes[value] = code
+        return code
+
+    def _thaw(self):
+        # 从文件加载的列是 numpy 数组，追加前转回 array
+        cols = self._cols
+        if not isinstance(cols["status_code"], array):
+            for name, typecode in COLUMNS:
+                cols[name] = array(typecode, np.ascontiguousarray(cols[name], typecode).tobytes())
+
+    def append(self, t: HttpTransaction, session_id: int = 0, round_idx: int = 0):
+        self._thaw()
+        cols = self._cols
+        cols["session_id"].append(session_id)
+        cols["round_idx"].append(round_idx)
+        cols["url_code"].append(self._encode(t.url, self.urls, self._url_codes))
+        cols["method_code"].append(self._encode(t.method, self.methods, self._method_codes))
+        cols["status_code"].append(-1 if t.status_code is None else t.status_code)
+        request_time = t.request_time
+        if isinstance(request_time, str):
+            request_time = datetime.fromisoformat(request_time)
+        cols["request_time"].append(request_time.timestamp() if request_time is not None else float("nan"))
+        cols["cost_time"].append(float("nan") if t.cost_time is None else t.cost_time)
+        cols["retry_cnt"].append(t.retry_cnt or 0)
+        cols["sched_lag"].append(t.sched_lag or 0.0)
+        if t.rsp_size is not None:
+            # 发送时已记录字节数，不再重新编码报文
+            cols["rsp_size"].append(t.rsp_size)
+        elif t.response is not None:
+            # 旧版本保存的会话没有记录字节数
+            cols["rsp_size"].append(len(t.response.encode('utf-8') if isinstance(t.response, str) else t.response))
+        else:
+            cols["rsp_size"].append(-1)
+        phases = t.phases or ()
+        for i, name in enumerate(PHASE_COLUMNS):
+            us = phases[i] if i < len(phases) else None
+            cols[name].append(float("nan") if us is None else us / 1_000_000)
+
+    def extend(self, transactions: Iterable[HttpTransaction], session_id: int = 0):
+        for i, t in enumerate(transactions):
+            self.append(t, session_id, i)
+
+    def extend_session(self, session: Session):
+        self.extend(session.transactions, session.session_id)
+
+    def extend_sessions(self, sessions: Iterable[Session]):
+        for s in sessions:
+            self.extend_session(s)
+
+    def extend_table(self, other: 'TransactionTable'):
+        """ 追加另一个表的全部行，url/method 按本表的取值表重新编码 """
+        self._thaw()
+        url_map = np.array([self._encode(u, self.urls, self._url_codes) for u in other.urls], dtype='I')
+        method_map = np.array([self._encode(m, self.methods, self._method_codes) for m in other.methods], dtype='B')
+        for name, typecode in COLUMNS:
+            values = other.column(name)
+            if name == "url_code" and len(values):
+                values = url_map[values]
+            elif name == "method_code" and len(values):
+                values = method_map[values]
+            self._cols[name].frombytes(np.ascontiguousarray(values, typecode).tobytes())
+
+    @staticmethod
+    def from_sessions(sessions: Iterable[Session]) -> 'TransactionTable':
+        table = TransactionTable()
+        table.extend_sessions(sessions)
+        return table
+
+    def __len__(self):
+        return len(self._cols["status_code"])
+
+    def __getitem__(self, i: int) -> HttpTransaction:
+        """ 还原为不含报文的 HttpTransaction """
+        cols = self._cols
+        status_code = int(cols["status_code"][i])
+        cost_time = float(cols["cost_time"][i])
+        request_time = float(cols["request_time"][i])
+        t = HttpTransaction(self.urls[cols["url_code"][i]], self.methods[cols["method_code"][i]],
+                            None if status_code < 0 else status_code, None, None,
+                            None if math.isnan(request_time) else datetime.fromtimestamp(request_time),
+                            None if math.isnan(cost_time) else cost_time,
+                            int(cols["retry_cnt"][i]), float(cols["sched_lag"][i]))
+        rsp_size = int(cols["rsp_size"][i])
+        t.rsp_size = None if rsp_size < 0 else rsp_size
+        phases = [float(cols[name][i]) for name in PHASE_COLUMNS]
+        if not all(math.isnan(v) for v in phases):
+            t.phases = [None if math.isnan(v) else round(v * 1_000_000) for v in phases]
+        return t
+
+    def column(self, name: str) -> np.ndarray:
+        values = self._cols[name]
+        if isinstance(values, array):
+            return np.frombuffer(values, dtype=values.typecode) if len(values) else np.empty(0, values.typecode)
+        return values
+
+    def intended_latency(self) -> np.ndarray:
+        """ 自计划发送时刻起的耗时: 请求耗时 + 调度滞后，未开启定速发送时调度滞后为0，与请求耗时相同 """
+        return self.column("cost_time") + self.column("sched_lag")
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name, _ in COLUMNS}
+
+    def to_frame(self):
+        """ 转为 pandas DataFrame，url/method 为分类列 """
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        data = self.to_numpy()
+        url_code, method_code = data.pop("url_code"), data.pop("method_code")
+        df = pd.DataFrame(data)
+        df.insert(2, "url", pd.Categorical.from_codes(url_code.astype('int64'), categories=self.urls or [""]))
+        df.insert(3, "method", pd.Categorical.from_codes(method_code.astype('int64'), categories=self.methods or [""]))
+        return df
+
+    def save(self, file_path: str):
+        np.savez(file_path, urls=np.array(self.urls, dtype=str), methods=np.array(self.methods, dtype=str),
+                 **self.to_numpy())
+
+    @staticmethod
+    def load(file_path: str) -> 'TransactionTable':
+        with np.load(file_path) as data:
+            size = len(data["status_code"])
+            # 早期保存的文件没有阶段耗时列
+            cols = {name: data[name] if name in data else np.full(size, np.nan, typecode) for name, typecode in COLUMNS}
+            return TransactionTable(np.asarray(data["urls"]).tolist(), np.asarray(data["methods"]).tolist(), cols)
+
+    @staticmethod
+    def _file_pattern(label: str) -> str:
+        return os.path.join(session_module.test_session_dir, glob.escape(label)) + "-transactions-*.npz"
+
+    @staticmethod
+    def exists(label: str) -> bool:
+        return bool(glob.glob(TransactionTable._file_pattern(label)))
+
+    def save_for(self, label: str):
+        """ 保存为 label 的一个分片，空表不保存 """
+        if len(self) == 0:
+            return
+        first_id = int(self.column("session_id").min())
+        self.save(os.path.join(session_module.test_session_dir, f"{label}-transactions-{first_id:08d}.npz"))
+
+    @staticmethod
+    def load_for(label: str) -> 'TransactionTable':
+        """ 加载并合并 label 的所有分片，不存在时从已保存的会话构建并保存 """
+        filenames = sorted(glob.glob(TransactionTable._file_pattern(label)))
+        if not filenames:
+            table = TransactionTable()
+            for batch in Session.iter_sessions(label):
+                table.extend_sessions(batch)
+            table.save_for(label)
+            return table
+        if len(filenames) == 1:
+            return TransactionTable.load(filenames[0])
+        table = TransactionTable()
+        for filename in filenames:
+            table.extend_table(TransactionTable.load(filename))
+        return table
+
+    @staticmethod
+    def remove_for(label: str):
+        for filename in glob.glob(TransactionTable._file_pattern(label)):
+            try:
+                os.remove(filename)
+            except Exception as e:
+                logger.error("Failed to remove transaction table {%s}: {%s}", filename, e)
@@ -1,27 +1,85 @@
-from dataclasses import dataclass, asdict, field
+import dataclasses
 from typing import List
 
 
-@dataclass
 class UserInfo:
-    userid: str = None
-    area: str = None
-    plat: str = None
-    partition: str = None
-    user_type: str = None
-    role_id: str = None
-    extra: dict = field(default_factory=dict)
+    """ 用户信息
+
+    使用 __slots__ 存放基础字段，extra 在首次写入时才创建，排队的大量用户只占用少量内存。
+    保留 __dict__ 槽位，仍可随意设置其他属性，__dict__ 在首次设置时才创建。
+    可以用 @dataclass 继承增加字段，子类字段与基础字段一起由 to_dict 输出。
+    """
+    __slots__ = ("userid", "area", "plat", "partition", "user_type", "role_id", "_extra", "__dict__")
+    _fields = ("userid", "area", "plat", "partition", "user_type", "role_id")
+
+    def __init__(self, userid: str = None, area: str = None, plat: str = None, partition: str = None,
+                 user_type: str = None, role_id: str = None, extra: dict = None):
+        self.userid = userid
+        self.area = area
+        self.plat = plat
+        self.partition = partition
+        self.user_type = user_type
+        self.role_id = role_id
+        self._extra = extra or None
+
+    def __post_init__(self):
+        # @dataclass 子类生成的 __init__ 不调用 UserInfo.__init__，补齐未设置的基础字段
+        for k in self._fields + ("_extra",):
+            if not hasattr(self, k):
+                setattr(self, k, None)
+
+    def _subclass_fields(self) -> tuple:
+        if not dataclasses.is_dataclass(self):
+            return ()
+        return tuple(f.name for f in dataclasses.fields(self))
+
+    @property
+    def extra(self) -> dict:
+        if self._extra is None:
+            self._extra = {}
+        return self._extra
+
+    @extra.setter
+    def extra(self, value: dict):
+        self._extra = value or None
 
     def to_dict(self):
-        return asdict(self)
+        d = {k: getattr(self, k) for k in self._fields}
+        if dataclasses.is_dataclass(self):
+            # 与 dataclasses.asdict 一致，子类字段递归复制
+            d.update(dataclasses.asdict(self))
+        d["extra"] = dict(self._extra) if self._extra else {}
+        return d
+
+    @staticmethod
+    def from_dict(d: dict) -> 'UserInfo':
+        """ 从 to_dict 的结果还原为 UserInfo，子类字段等未知字段放入 extra """
+        user_info = UserInfo()
+        user_info.parse(d)
+        return user_info
 
     def parse(self, info_dict):
+        # 先合并 extra，未知字段不会被随后的 extra 覆盖
+        if info_dict.get("extra"):
+            self.extra.update(info_dict["extra"])
+        fields = self._subclass_fields()
         for key, value in info_dict.items():
-            if hasattr(self, key):
+            if key == "extra":
+                continue
+            if key in self._fields or key in fields:
                 setattr(self, key, value)
             else:
                 self.extra[key] = value
 
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items())
+        return f"{self.__class__.__name__}({fields})"
+
 
 class UserInfoGenerator:
     """ 用户信息生成器 """
@@ -1,13 +1,16 @@
 import ast
 import inspect
 import sys
-from typing import List, Callable
+from typing import Callable, Iterable, Iterator, List, Union
 
 import numpy as np
 import pandas as pd
 
+from . import codec, tag_dist
 from .session import Session, HttpTransaction
-from .testcase import SingleSessionCase, SingleRequestCase, AllSessionCase, TestCase
+from .timing import PHASE_NAMES, PHASES
+from .transaction_table import PHASE_COLUMNS, TransactionTable
+from .testcase import SingleSessionCase, SingleRequestCase, AllSessionCase, TestCase, TransactionTableCase
 from .user_info import UserInfo
 
 _session_checker_prefix = "chk"
@@ -17,100 +20,67 @@ def default_session_checker_prefix():
     return _session_checker_prefix
 
 
-def _dist_dict_to_list(dist: dict):
-    kv_list = list(dist.items())
-    kv_list = sorted(kv_list, key=lambda x: x[1], reverse=True)
-    output = []
-    total = 0
-    for _, v in kv_list:
-        total += v
-
-    for k, v in kv_list:
-        ratio = v / total
-        output.append((k, v, ratio))
-
-    output = sorted(output, key=lambda x: (-x[1], x[2]))
-    return output
-
-
 def _dist_list_to_format_dict(dist_list: List, format_ratio=True):
-    ret = []
-    for k, v, ratio in dist_list:
-        if format_ratio:
-            ret.append({"group": k, "count": v, "ratio": f"{ratio * 100:.2f}%"})
-        else:
-            ret.append({"group": k, "count": v, "ratio": ratio})
-    return ret
+    return tag_dist.format_dist_list(dist_list, format_ratio)
 
 
-def transaction_elem_dist_stat_(session_list: List[Session], custom_flag_func: Callable):
-    """HTTP transaction级别元素分布统计
+def transaction_elem_dist_stat_(session_list: List[Session], custom_flag_func: Callable, workers: int = 0):
+    """HTTP transaction级别元素分布统计，workers 大于1时多进程提取
     """
-    dist = {}
-    for ss in session_list:
-        for s in ss.transactions:
-            rsp = s.rsp_json()
-            flag = custom_flag_func(rsp)
-            if isinstance(flag, list):
-                for f in flag:
-                    dist[f] = dist.get(f, 0) + 1
-            else:
-                dist[flag] = dist.get(flag, 0) + 1
-    return _dist_dict_to_list(dist)
-
-
-def transaction_elem_dist_stat(session_list: List[Session], custom_flag_func: Callable, format_ratio=True):
+    counter = tag_dist.count_tags_parallel(session_list, custom_flag_func, tag_dist.TAG_LEVEL_TRANSACTION, workers)
+    return tag_dist.dist_list(counter)
+
+
+def transaction_elem_dist_stat(session_list: List[Session], custom_flag_func: Callable, format_ratio=True,
+                               workers: int = 0):
     """HTTP transaction级别元素分布统计
     """
-    dist_list = transaction_elem_dist_stat_(session_list, custom_flag_func)
+    dist_list = transaction_elem_dist_stat_(session_list, custom_flag_func, workers)
     return _dist_list_to_format_dict(dist_list, format_ratio)
 
 
-def session_elem_dist_stat_(session_list: List[Session], custom_flag_func: Callable):
-    """session级别元素分布统计
+def session_elem_dist_stat_(session_list: List[Session], custom_flag_func: Callable, workers: int = 0):
+    """session级别元素分布统计，workers 大于1时多进程提取
     """
-    dist = {}
-    for s in session_list:
-        flag = custom_flag_func(s)
-        if isinstance(flag, list):
-            for f in flag:
-                dist[f] = dist.get(f, 0) + 1
-        else:
-            dist[flag] = dist.get(flag, 0) + 1
-
-    return _dist_dict_to_list(dist)
+    counter = tag_dist.count_tags_parallel(session_list, custom_flag_func, tag_dist.TAG_LEVEL_SESSION, workers)
+    return tag_dist.dist_list(counter)
 
 
-def session_elem_dist_stat(session_list: List[Session], custom_flag_func: Callable, format_ratio=True):
+def session_elem_dist_stat(session_list: List[Session], custom_flag_func: Callable, format_ratio=True,
+                           workers: int = 0):
     """session级别元素分布统计
     """
-    dist_list = session_elem_dist_stat_(session_list, custom_flag_func)
+    dist_list = session_elem_dist_stat_(session_list, custom_flag_func, workers)
     return _dist_list_to_format_dict(dist_list, format_ratio)
 
 
-def stat_http_transaction_cost(session_list: List[Session]):
-    """统计请求耗时，按照平均值，中位值，P90，P99进行统计"""
-    request_times = []
-    for s in session_list:
-        for t in s.transactions:
-            if t.cost_time is not None:
-                request_times.append(t.cost_time)
-
-    # 计算平均值
-    mean_time = np.mean(request_times)
+def _ok_rows(table: TransactionTable, ok_sessions_only: bool) -> np.ndarray:
+    """ 有耗时记录的行，ok_sessions_only 为 True 时只保留所有请求都返回 200 的会话(与单机校验的会话过滤一致) """
+    mask = ~np.isnan(table.column("cost_time"))
+    if ok_sessions_only and len(table):
+        session_ids = table.column("session_id")
+        failed_ids = np.unique(session_ids[table.column("status_code") != 200])
+        mask &= ~np.isin(session_ids, failed_ids)
+    return mask
 
-    # 计算中位值
-    median_time = np.median(request_times)
 
-    # 计算 P90
-    p90_time = np.percentile(request_times, 90)
+def stat_http_transaction_cost(session_list: Union[List[Session], TransactionTable], ok_sessions_only: bool = False):
+    """统计请求耗时，按照平均值，中位值，P90，P99进行统计，可以直接传入已加载的 TransactionTable
+    耗时自计划发送时刻算起(含定速发送的调度滞后)，见 TransactionTable.intended_latency
+    :param ok_sessions_only: 只统计所有请求都返回 200 的会话，失败请求的耗时(含重试等待)不计入
+    :return: (平均值, P50, P90, P99), 报告；没有可统计的请求时返回 None, []
+    """
+    table = session_list if isinstance(session_list, TransactionTable) else TransactionTable.from_sessions(session_list)
+    request_times = table.intended_latency()[_ok_rows(table, ok_sessions_only)]
+    if not len(request_times):
+        return None, []
 
-    # 计算 P99
-    p99_time = np.percentile(request_times, 99)
+    mean_time = np.mean(request_times)
+    median_time, p90_time, p99_time = np.percentile(request_times, [50, 90, 99])
 
     report = [
         {"耗时类型": "平均值", "耗时": f"{int(mean_time * 1000)}ms"},
-        {"耗时类型": "P50", "耗时": f"{int(mean_time * 1000)}ms"},
+        {"耗时类型": "P50", "耗时": f"{int(median_time * 1000)}ms"},
         {"耗时类型": "P90", "耗时": f"{int(p90_time * 1000)}ms"},
         {"耗时类型": "P99", "耗时": f"{int(p99_time * 1000)}ms"},
     ]
@@ -118,6 +88,28 @@ def stat_http_transaction_cost(session_list: List[Session]):
     return (mean_time, median_time, p90_time, p99_time), report
 
 
+def stat_http_transaction_phases(session_list: Union[List[Session], TransactionTable], ok_sessions_only: bool = False):
+    """统计请求各阶段(建连、TLS、首字节、下载)耗时，按照平均值，中位值，P90，P99进行统计，未记录的阶段不输出
+    :param ok_sessions_only: 同 stat_http_transaction_cost
+    """
+    table = session_list if isinstance(session_list, TransactionTable) else TransactionTable.from_sessions(session_list)
+    rows = _ok_rows(table, ok_sessions_only)
+    stats = {}
+    report = []
+    for phase, name in zip(PHASES, PHASE_COLUMNS):
+        values = table.column(name)[rows]
+        values = values[~np.isnan(values)]
+        if not len(values):
+            continue
+        mean_time = np.mean(values)
+        median_time, p90_time, p99_time = np.percentile(values, [50, 90, 99])
+        stats[phase] = (mean_time, median_time, p90_time, p99_time)
+        report.append({"阶段": PHASE_NAMES[phase], "请求数": len(values),
+                       "平均值": f"{mean_time * 1000:.2f}ms", "P50": f"{median_time * 1000:.2f}ms",
+                       "P90": f"{p90_time * 1000:.2f}ms", "P99": f"{p99_time * 1000:.2f}ms"})
+    return stats, report
+
+
 def func_to_case(name: str, func) -> TestCase:
     signature = inspect.signature(func)
     params = list(signature.parameters.values())
@@ -131,9 +123,12 @@ def func_to_case(name: str, func) -> TestCase:
         elif params[0].annotation == List[Session]:
             # 所有会话
             case = AllSessionCase(session_list_checker=func)
+        elif params[0].annotation == TransactionTable:
+            # 请求元数据表
+            case = TransactionTableCase(table_checker=func)
         else:
             raise ValueError(
-                f"First parameter of function {name} should be of type HttpTransaction or Session")
+                f"First parameter of function {name} should be of type HttpTransaction, Session or TransactionTable")
 
         if not case.name:
             raise ValueError(f"Function {name} should have a name")
@@ -167,16 +162,51 @@ def _replace_map_key(o: dict, k1, k2):
     del o[k1]
 
 
-def load_user_info_from_json(content) -> List[UserInfo]:
-    user_info_list = []
+# 用户信息字段别名 -> UserInfo 字段
+_user_info_key_alias = [("platid", "plat"), ("areaid", "area"), ("open_id", "userid"), ("openid", "userid"),
+                        ("roleid", "role_id"), ("user_id", "userid"), ("plat_id", "plat")]
+
+
+def _to_user_info(user_info_json: dict) -> UserInfo:
+    user_info = UserInfo()
+    for k1, k2 in _user_info_key_alias:
+        _replace_map_key(user_info_json, k1, k2)
+    user_info.parse(user_info_json)
+    return user_info
+
+
+def iter_user_info_from_json(content: Iterable[dict]) -> Iterator[UserInfo]:
     for user_info_json in content:
-        user_info = UserInfo()
-        for k1, k2 in [("platid", "plat"), ("areaid", "area"), ("open_id", "userid"), ("openid", "userid"),
-                       ("roleid", "role_id"), ("user_id", "userid"), ("plat_id", "plat")]:
-            _replace_map_key(user_info_json, k1, k2)
-        user_info.parse(user_info_json)
-        user_info_list.append(user_info)
-    return user_info_list
+        yield _to_user_info(user_info_json)
+
+
+def load_user_info_from_json(content) -> List[UserInfo]:
+    return list(iter_user_info_from_json(content))
+
+
+def iter_user_info_from_json_lines(file_path) -> Iterator[UserInfo]:
+    """ 逐行读取 JSON lines 文件，每行一个用户 """
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield _to_user_info(codec.loads(line))
+
+
+def iter_user_info_from_csv(file_path, headers=None, skip_header=False, sep=',', chunksize=10000,
+                            dtype=None) -> Iterator[UserInfo]:
+    """ 按 chunksize 行分块读取 CSV，内存占用与文件大小无关
+
+    每块单独推断列类型，如果某列在不同块中类型可能不一致(例如纯数字的ID)，可以通过 dtype 指定
+    """
+    if headers:
+        reader = pd.read_csv(file_path, sep=sep, names=headers, header=0 if skip_header else None,
+                             chunksize=chunksize, dtype=dtype)
+    else:
+        reader = pd.read_csv(file_path, sep=sep, chunksize=chunksize, dtype=dtype)
+    with reader:
+        for chunk in reader:
+            yield from iter_user_info_from_json(chunk.to_dict(orient='records'))
 
 
 def load_user_info_from_csv(file_path, headers=None, skip_header=False, sep=',') -> List[UserInfo]:
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from session_tester import codec
+
+DATA = {"name": "测试", "emoji": "😀", "path": "/a/b", "n": [1, 2.5, None, True], "big": 1 << 70}
+
+
+@pytest.fixture(params=[codec.JSON_BACKEND_STDLIB, codec.JSON_BACKEND_ORJSON, codec.JSON_BACKEND_UJSON])
+def backend(request):
+    prev = codec.backend()
+    try:
+        codec.use_backend(request.param)
+    except RuntimeError:
+        pytest.skip(f"{request.param} is not installed")
+    yield request.param
+    codec.use_backend(prev)
+
+
+def test_storage_keeps_non_ascii(backend):
+    s = codec.dumps(DATA)
+    assert "测试" in s and codec.loads(s) == DATA, backend
+
+
+def test_request_escapes_non_ascii(backend):
+    s = codec.dumps(DATA, ensure_ascii=True)
+    assert s == json.dumps(DATA, separators=(',', ':')), backend
+    assert codec.dumps({"a": "x"}, ensure_ascii=True) == '{"a":"x"}'
@@ -0,0 +1,42 @@
+import pytest
+
+from session_tester import HttpTransaction
+from session_tester.transaction_table import TransactionTable
+from session_tester.utils import stat_http_transaction_cost, stat_http_transaction_phases
+
+
+def _table(rows) -> TransactionTable:
+    table = TransactionTable()
+    for session_id, status_code, cost_time in rows:
+        table.append(HttpTransaction("http://localhost/x", "POST", status_code, "{}", "{}", cost_time=cost_time),
+                     session_id=session_id)
+    return table
+
+
+def test_cost_stat_only_ok_sessions():
+    # 会话2 有一个 500 请求(耗时含重试等待)，整个会话不计入
+    table = _table([(1, 200, 0.1), (1, 200, 0.3), (2, 200, 0.2), (2, 500, 5.0), (3, None, 9.0)])
+    (mean_time, median_time, _, p99_time), report = stat_http_transaction_cost(table, ok_sessions_only=True)
+    assert mean_time == pytest.approx(0.2)
+    assert median_time == pytest.approx(0.2)
+    assert p99_time < 0.3 + 1e-9
+    assert report[0] == {"耗时类型": "平均值", "耗时": "200ms"}
+
+    (mean_time, *_), _ = stat_http_transaction_cost(table)
+    assert mean_time == pytest.approx(14.6 / 5)
+
+
+@pytest.mark.parametrize("rows", [[], [(1, 200, None)], [(1, 500, 0.1)]])
+def test_cost_stat_empty(rows):
+    assert stat_http_transaction_cost(_table(rows), ok_sessions_only=True) == (None, [])
+    assert stat_http_transaction_phases(_table(rows), ok_sessions_only=True) == ({}, [])
+
+
+def test_cost_stat_includes_sched_lag():
+    # 定速发送时耗时自计划发送时刻算起，调度滞后计入
+    table = TransactionTable()
+    for lag in (0.0, 0.1, 0.2):
+        table.append(HttpTransaction("http://localhost/x", "POST", 200, "{}", "{}", cost_time=0.1, sched_lag=lag))
+    (mean_time, *_), _ = stat_http_transaction_cost(table)
+    assert mean_time == pytest.approx(0.2)
+    assert table.column("cost_time").tolist() == [0.1, 0.1, 0.1]
@@ -0,0 +1,189 @@
+import collections
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from session_tester import Agent, CheckResult, Coordinator, HttpTransaction, Session, SessionMaintainerBase, \
+    TestSuite, Tester, UserInfo
+from session_tester import session as session_module
+
+USER_CNT = 60
+ROUNDS = 3
+SLOW_DELAY = 0.1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    counter = collections.Counter()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.counter[req["agent"]] += 1
+        body = json.dumps({"user_id": req["user_id"], "next_round": req["round"] + 1}).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+class _SessionMaintainer(SessionMaintainerBase):
+    # Agent 进程中设置，请求中带上 Agent 名称，慢 Agent 每个请求后额外等待
+    agent = "coordinator"
+    delay = 0.0
+
+    def load_user_info(self):
+        for i in range(USER_CNT):
+            self.user_info_queue.put(UserInfo(userid=uuid.uuid4().hex, extra={"index": i}))
+
+    @staticmethod
+    def init_session(s: Session):
+        s.ext_state["round"] = 0
+
+    @staticmethod
+    def wrap_req(s: Session):
+        return {"user_id": s.user_info.userid, "round": s.ext_state["round"], "agent": _SessionMaintainer.agent}
+
+    @staticmethod
+    def update_session(s: Session):
+        s.ext_state["round"] = s.transactions[-1].rsp_json()["next_round"]
+        time.sleep(_SessionMaintainer.delay)
+
+    @staticmethod
+    def should_stop_session(s: Session) -> bool:
+        return len(s.transactions) >= ROUNDS
+
+
+class _Suite(TestSuite):
+    """分布式测试"""
+
+    @staticmethod
+    def chk_user_id(t: HttpTransaction) -> CheckResult:
+        """单请求-用户校验:
+        1. 响应中的 user_id 与请求一致
+        """
+        if t.rsp_json()["user_id"] == t.req_json()["user_id"]:
+            return CheckResult(True, "user_id check pass")
+        return CheckResult(False, f"user_id check failed, {t.response}")
+
+
+def _new_tester(url: str) -> Tester:
+    return Tester(name="dist", test_suites=[_Suite(session_maintainer=_SessionMaintainer(url))])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run_agent(url: str, port: int, agent: str, delay: float):
+    _SessionMaintainer.agent = agent
+    _SessionMaintainer.delay = delay
+    Agent(_new_tester(url), host="127.0.0.1", port=port).serve_forever()
+
+
+def _wait_listening(port: int):
+    # 探测连接被 Agent 当作一次 Coordinator 连接处理，断开后 Agent 继续等待下一个连接
+    deadline = time.time() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+@pytest.fixture
+def http_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.counter.clear()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_module, "_base_session_dir", str(tmp_path / "test_sessions"))
+    monkeypatch.setattr(session_module, "test_session_dir", session_module.test_session_dir)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "test_reports").mkdir()
+    yield tmp_path / "test_sessions"
+    session_module.close_session_store()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="agents are started with fork")
+def test_coordinator_with_two_agents(http_url, session_dir):
+    ctx = multiprocessing.get_context("fork")
+    agents = {"fast": (_free_port(), 0.0), "slow": (_free_port(), SLOW_DELAY)}
+    procs = [ctx.Process(target=_run_agent, args=(http_url, port, name, delay), daemon=True)
+             for name, (port, delay) in agents.items()]
+    for p in procs:
+        p.start()
+    try:
+        for port, _ in agents.values():
+            _wait_listening(port)
+        tester = _new_tester(http_url)
+        results = Coordinator(tester, [f"127.0.0.1:{port}" for port, _ in agents.values()]).run(
+            thread_cnt=2, report_interval=0, user_batch_size=2, start_delay=0.2)
+    finally:
+        for p in procs:
+            p.terminate()
+            p.join()
+
+    stat = results["分布式测试"]
+    assert stat.total_session_cnt == USER_CNT
+    assert stat.total_send_cnt == USER_CNT * ROUNDS
+    assert stat.total_send_err_cnt == 0
+    # 按拉取分发: 慢 Agent 分到的用户少，两个 Agent 合计等于分发的用户数
+    assert sum(_Handler.counter.values()) == USER_CNT * ROUNDS
+    assert 0 < _Handler.counter["slow"] < _Handler.counter["fast"]
+
+    # 会话已取回到 Coordinator 的会话目录，Agent 的数据在各自子目录中
+    assert session_module.test_session_dir == os.path.join(str(session_dir), "dist")
+    sessions = [s for batch in Session.iter_sessions("分布式测试") for s in batch]
+    assert len(sessions) == USER_CNT
+    assert sorted(s.user_info.extra["index"] for s in sessions) == list(range(USER_CNT))
+    assert sorted(s.session_id for s in sessions) == list(range(1, USER_CNT + 1))
+    for port, _ in agents.values():
+        assert (session_dir / "dist" / f"agent-{port}").is_dir()
+
+
+def test_update_test_session_dir_does_not_nest(session_dir):
+    session_module.update_test_session_dir("t")
+    session_module.update_test_session_dir("t", "agent-1")
+    session_module.update_test_session_dir("t", "agent-1")
+    assert session_module.test_session_dir == os.path.join(str(session_dir), "t", "agent-1")
+    session_module.update_test_session_dir("t")
+    assert session_module.test_session_dir == os.path.join(str(session_dir), "t")
+
+
+def test_clear_sessions_keeps_other_labels(session_dir):
+    session_module.update_test_session_dir("t")
+    for label in ("a", "b"):
+        s = Session(label)
+        s.user_info = UserInfo(userid=label)
+        s.session_filename = f"{label}-{s.session_id:08d}.json"
+        s.dump()
+    agent_file = session_dir / "t" / "agent-1" / "a-00000001.json"
+    agent_file.parent.mkdir()
+    agent_file.write_text("{}")
+
+    Session.clear_sessions("a")
+    session_module.close_session_store()
+    assert not list((session_dir / "t").glob("a-*.json"))
+    assert list((session_dir / "t").glob("b-*.json"))
+    assert agent_file.exists()
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from session_tester.histogram import LatencyHistogram
+
+PERCENTILES = (1, 10, 50, 90, 99, 99.9)
+
+
+def _samples(n: int, seed: int):
+    rnd = random.Random(seed)
+    # 覆盖微秒到秒级的长尾分布
+    return [rnd.lognormvariate(-4, 1.5) for _ in range(n)]
+
+
+def _exact(sorted_values, p: float) -> float:
+    target = min(len(sorted_values), max(1, int(len(sorted_values) * p / 100 + 0.5)))
+    return sorted_values[target - 1]
+
+
+def _record(values, h: LatencyHistogram = None) -> LatencyHistogram:
+    h = h or LatencyHistogram()
+    for v in values:
+        h.record(v)
+    return h
+
+
+@pytest.mark.parametrize("sub_bucket_bits", [6, 8])
+def test_percentile_relative_error(sub_bucket_bits):
+    values = _samples(20000, sub_bucket_bits)
+    h = _record(values, LatencyHistogram(sub_bucket_bits))
+    values.sort()
+    max_error = 1 / (1 << (sub_bucket_bits - 1))
+    for p in PERCENTILES:
+        exact = _exact(values, p)
+        assert abs(h.percentile(p) - exact) <= exact * max_error + 1e-6, p
+    assert h.percentile(100) == values[-1]
+    assert h.min == values[0] and h.mean() == pytest.approx(sum(values) / len(values))
+
+
+def test_merge_equals_recording_everything():
+    a_values, b_values = _samples(5000, 1), _samples(3000, 2)
+    merged = _record(a_values).merge(_record(b_values))
+    full = _record(a_values + b_values)
+    assert merged.counts == full.counts
+    assert (merged.count, merged.min, merged.max) == (full.count, full.min, full.max)
+    assert merged.total == pytest.approx(full.total)
+    for p in PERCENTILES:
+        assert merged.percentile(p) == full.percentile(p)
+
+    # 跨进程传输的稀疏格式合并结果一致
+    restored = LatencyHistogram.from_dict(_record(a_values).to_dict()).merge(
+        LatencyHistogram.from_dict(_record(b_values).to_dict()))
+    assert restored.counts == full.counts
+
+
+def test_merge_into_empty_and_since():
+    values = _samples(1000, 3)
+    h = _record(values)
+    assert LatencyHistogram().merge(h).counts == h.counts
+    assert h.copy().counts == h.counts
+
+    prev = h.copy()
+    _record(values[:100], h)
+    window = h.since(prev)
+    assert window.count == 100
+    assert window.counts == _record(values[:100]).counts
+
+
+def test_merge_rejects_different_layout():
+    with pytest.raises(ValueError):
+        LatencyHistogram(8).merge(LatencyHistogram(6))
+
+
+def test_empty_and_overflow():
+    h = LatencyHistogram(max_seconds=1)
+    assert h.percentile(50) == 0.0 and h.mean() == 0.0
+    h.record(5)
+    h.record(-1)
+    assert h.count == 2
+    assert h.percentile(100) == 5
+    assert h.percentile(99) <= 5
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from session_tester import session as session_module
+from session_tester.session import IDGenerator
+
+ID_FILE = "ids.txt"
+
+
+@pytest.fixture
+def id_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_module, "test_session_dir", str(tmp_path))
+    monkeypatch.setattr(IDGenerator, "id_block_size", 5)
+    _restart(monkeypatch)
+    return tmp_path
+
+
+def _restart(monkeypatch):
+    # 模拟进程重启: 丢弃内存中的分配状态，只剩 ID 文件
+    monkeypatch.setattr(IDGenerator, "id_dict", {})
+    monkeypatch.setattr(IDGenerator, "hwm_dict", {})
+    monkeypatch.setattr(IDGenerator, "shared_dict", {})
+
+
+def _id_file(id_dir) -> str:
+    return (id_dir / ID_FILE).read_text()
+
+
+def test_block_reserved_before_use(id_dir):
+    assert [IDGenerator.get_next_id(ID_FILE) for _ in range(3)] == [1, 2, 3]
+    # 整块预留只写一次文件
+    assert _id_file(id_dir) == "0 5"
+    assert [IDGenerator.get_next_id(ID_FILE) for _ in range(3)] == [4, 5, 6]
+    assert _id_file(id_dir) == "5 10"
+
+    IDGenerator.release_ids(ID_FILE)
+    assert _id_file(id_dir) == "6"
+    assert IDGenerator.get_curr_id(ID_FILE) == 6
+
+
+@pytest.mark.usefixtures("id_dir")
+def test_resume_after_release(monkeypatch):
+    ids = [IDGenerator.get_next_id(ID_FILE) for _ in range(7)]
+    IDGenerator.release_ids(ID_FILE)
+    _restart(monkeypatch)
+    ids += [IDGenerator.get_next_id(ID_FILE) for _ in range(3)]
+    assert ids == list(range(1, 11))
+
+
+def test_crash_resume_never_reuses_ids(id_dir, monkeypatch):
+    ids = [IDGenerator.get_next_id(ID_FILE) for _ in range(7)]
+    # 未调用 release_ids 即退出，从已预留的高水位之后继续
+    _restart(monkeypatch)
+    resumed = [IDGenerator.get_next_id(ID_FILE) for _ in range(7)]
+    assert resumed == list(range(11, 18))
+    assert not set(ids) & set(resumed)
+
+    # ID 文件写到一半时只留下临时文件，原文件不受影响
+    (id_dir / (ID_FILE + ".tmp")).write_text("1")
+    _restart(monkeypatch)
+    assert IDGenerator.get_next_id(ID_FILE) == 21
+
+
+@pytest.mark.usefixtures("id_dir")
+def test_threads_get_unique_ids():
+    ids = []
+    lock = threading.Lock()
+
+    def alloc():
+        got = [IDGenerator.get_next_id(ID_FILE) for _ in range(50)]
+        with lock:
+            ids.extend(got)
+
+    threads = [threading.Thread(target=alloc) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(ids) == list(range(1, 401))
@@ -0,0 +1,99 @@
+import json
+import random
+
+import pytest
+
+from session_tester import json_path
+
+_MISSING = object()
+
+
+@pytest.mark.parametrize("body, path, expected", [
+    ('{"msg": "a\\nb\\\\", "items": [1, 2]}', "items", [1, 2]),
+    ('{"msg": "\\u00e9\\\\", "data": {"code": 7}}', "data.code", 7),
+    ('{"msg": "\\\\\\"", "data": {"code": 7}}', "data.code", 7),
+    ('{"s": "x\\"key", "key": 1}', "key", 1),
+    ('{"s": "\\"key\\": 2", "key": 1}', "key", 1),
+    ('{"a": {"b": 1}, "c": {"d": 2}}', "a.d", None),
+    ('{"c": {"b": 2}, "a": {"x": [{"b": 3}]}}', "a.b", None),
+    ('{"a": [[{"id": 1}, {"id": 2}], [{"id": 3}]]}', "a[*][*].id", [1, 2, 3]),
+    ('{"a": [[{"id": 1}, {"x": 2}], [{"id": 3}]]}', "a[*][*].id", [1, 3]),
+    ('{"a": "}{][", "b": {"c": "\\\\"}, "d": 4}', "d", 4),
+    ('{"a.b": {"c": 5}}', '["a.b"].c', 5),
+    ('[{"a": 1}]', "[0].a", 1),
+    ('{"abc":":", ":": 5}', '[":"]', 5),
+    ('{"s": "\\\\", "k": "\\"k\\": 1", "k\\"": 2, "a": {"k": 3}}', "a.k", 3),
+])
+def test_extract(body, path, expected):
+    assert json_path.extract(body, path) == expected
+    assert json_path.extract(body.encode('utf-8'), path) == expected
+
+
+def _random_string(rnd: random.Random) -> str:
+    alphabet = ['a', 'k', '"', '\\', '\n', '{', '}', '[', ']', ':', ',', ' ', 'é', '中', ' ', '\x01']
+    return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 6)))
+
+
+def _random_value(rnd: random.Random, depth: int):
+    kind = rnd.randint(0, 5 if depth < 4 else 2)
+    if kind == 0:
+        return rnd.randint(-5, 5)
+    if kind == 1:
+        return _random_string(rnd)
+    if kind == 2:
+        return rnd.choice([None, True, False, 1.5])
+    if kind == 3:
+        return [_random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 3))]
+    keys = ["k", "a", "b", "k\\", 'k"', '"k', ":", "é", "{"]
+    return {rnd.choice(keys): _random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))}
+
+
+def _paths(o, prefix=""):
+    if isinstance(o, dict):
+        for k, v in o.items():
+            p = f"{prefix}[{json.dumps(k)}]"
+            yield p
+            yield from _paths(v, p)
+    elif isinstance(o, list):
+        for i, v in enumerate(o):
+            yield from _paths(v, f"{prefix}[{i}]")
+        if o:
+            yield from _paths(o[0], f"{prefix}[*]")
+
+
+def _expected(o, path: str):
+    return json_path.compile_path(path).evaluate(o, _MISSING)
+
+
+def test_extract_matches_json_loads():
+    rnd = random.Random(20261017)
+    checks = 0
+    for _ in range(3000):
+        o = {"x": _random_value(rnd, 0), "k": _random_value(rnd, 0), "a": _random_value(rnd, 1)}
+        paths = set(_paths(o))
+        # 其他对象中存在的键组合，用来检查不会匹配到兄弟对象
+        paths.update(p.replace('["a"]', '["k"]') for p in list(paths))
+        for ensure_ascii in (True, False):
+            body = json.dumps(o, ensure_ascii=ensure_ascii)
+            parsed = json.loads(body)
+            for path in paths:
+                assert json_path.extract(body, path, _MISSING) == _expected(parsed, path), (body, path)
+                checks += 1
+    assert checks > 10000
+
+
+def test_candidates_in_strings_are_scanned_once(monkeypatch):
+    # 以 \"k 结尾的键中都有候选 "k":，键名之前的部分不应重复扫描
+    body = "{" + "".join(f'"{i}\\"k": [{i}], ' for i in range(2000)) + '"k": 2}'
+    scanned = []
+    structure = json_path._structure  # pylint: disable=protected-access
+    monkeypatch.setattr(json_path, "_structure", lambda segment: scanned.append(len(segment)) or structure(segment))
+    assert json_path.extract(body, "k") == 2
+    assert sum(scanned) <= len(body)
+
+
+def test_duplicate_keys_take_the_first():
+    # 与 json.loads 不同，定位到同一对象中的第一个键
+    body = '{"k": 1, "k": 2}'
+    assert json_path.extract(body, "k") == 1
+    assert json.loads(body)["k"] == 2
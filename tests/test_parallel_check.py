@@ -0,0 +1,33 @@
+from session_tester import CheckResult, HttpTransaction, Session
+from session_tester.parallel_check import check_sessions
+from session_tester.retention import drop_response
+from session_tester.testcase import SingleRequestCase
+
+
+def _check_n(t: HttpTransaction) -> CheckResult:
+    """单请求-序号:
+    1. 返回响应序号
+    """
+    return CheckResult(True, str(t.rsp_json()["n"]))
+
+
+def _sessions(cnt: int, per_session: int):
+    sessions = []
+    for i in range(cnt):
+        s = Session("pc", create_flag=False)
+        s.transactions = [HttpTransaction("http://localhost/x", "POST", 200, "{}", f'{{"n": {i * per_session + j}}}')
+                          for j in range(per_session)]
+        sessions.append(s)
+    return sessions
+
+
+def test_dropped_transactions_keep_their_position():
+    sessions = _sessions(5, 3)
+    dropped = {1, 3, 4, 11}
+    for n, t in enumerate(t for s in sessions for t in s.transactions):
+        if n in dropped:
+            drop_response(t)
+
+    (results,), _, _ = check_sessions([SingleRequestCase(rsp_checker=_check_n)], [], sessions, chunk_size=2)
+    assert len(results) == 15
+    assert [r if r is None else int(r.exception) for r in results] == [None if n in dropped else n for n in range(15)]
@@ -0,0 +1,32 @@
+import pytest
+
+from session_tester import CheckResult
+from session_tester.testcase import Report
+
+_RESULTS = [CheckResult(True), CheckResult(False, "bad"), None, CheckResult(False, "worse")]
+
+
+def test_report_counts_without_keeping_results():
+    report = Report("r", "e", "SingleRequestCase")
+    report.add_results(_RESULTS)
+    report.summary()
+    assert (report.checked_count, report.passed_case_count, report.not_passed_case_count,
+            report.uncover_case_count) == (4, 1, 2, 1)
+    assert report.result == "未通过" and report.bad_case == "bad"
+    with pytest.deprecated_call(), pytest.raises(AttributeError):
+        _ = report.case_results
+
+
+def test_report_case_results_compat(monkeypatch):
+    monkeypatch.setattr(Report, "keep_case_results", True)
+    report = Report("r", "e", "SingleRequestCase")
+    report.add_results(_RESULTS[:2])
+    report.add_results(_RESULTS[2:])
+    with pytest.deprecated_call():
+        assert report.case_results == _RESULTS
+
+    # 旧代码直接赋值时重新计数
+    with pytest.deprecated_call():
+        report.case_results = [CheckResult(True)]
+    report.summary()
+    assert report.result == "通过" and report.checked_count == 1
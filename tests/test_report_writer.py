@@ -0,0 +1,71 @@
+import pytest
+
+from session_tester.report_writer import EXCEL_MAX_SHEET_NAME_LEN, ReportWriter
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def _summary_row(module: str, name: str):
+    return [module, name, "预期", "通过", 1, 0, 0, 0, None]
+
+
+def _write(tmp_path, fn, **kwargs):
+    path = str(tmp_path / "report.xlsx")
+    with ReportWriter(path, **kwargs) as writer:
+        fn(writer)
+    return openpyxl.load_workbook(path)
+
+
+def test_summary_merges_module_column(tmp_path):
+    groups = [[_summary_row("模块A", "a1"), _summary_row("模块A", "a2"), _summary_row("模块A", "a3")],
+              [_summary_row("模块B", "b1")],
+              [_summary_row("模块C", "c1"), _summary_row("模块C", "c2")]]
+    wb = _write(tmp_path, lambda w: w.write_summary(groups))
+    ws = wb[ReportWriter.SUMMARY_SHEET]
+    assert sorted(str(r) for r in ws.merged_cells.ranges) == ["A2:A4", "A6:A7"]
+    assert [ws.cell(row, 1).value for row in (2, 5, 6)] == ["模块A", "模块B", "模块C"]
+    assert [ws.cell(row, 2).value for row in range(2, 8)] == ["a1", "a2", "a3", "b1", "c1", "c2"]
+    assert ws.cell(1, 1).value == "功能模块"
+
+
+def test_detail_split_across_sheets(tmp_path):
+    lines = [{"id": i, "msg": f"行{i}"} for i in range(10)]
+    wb = _write(tmp_path, lambda w: w.write_detail("明细", lines), max_rows_per_sheet=4)
+    assert wb.sheetnames == ["明细", "明细(2)", "明细(3)", "明细(4)"]
+    rows = []
+    for ws in wb.worksheets:
+        values = list(ws.iter_rows(values_only=True))
+        assert values[0] == ("id", "msg") and len(values) <= 4
+        rows += values[1:]
+    assert rows == [(i, f"行{i}") for i in range(10)]
+
+
+def test_detail_max_rows_and_sequence_lines(tmp_path):
+    lines = [[i, None, float("nan"), {"k": i}] for i in range(5)]
+    wb = _write(tmp_path, lambda w: w.write_detail("seq", lines), max_detail_rows=3)
+    values = list(wb["seq"].iter_rows(values_only=True))
+    assert values == [(0, 1, 2, 3)] + [(i, None, None, str({"k": i})) for i in range(3)]
+
+
+def test_sheet_names_are_deduped(tmp_path):
+    long_name = "x" * 40
+
+    def write(w):
+        w.write_summary([])
+        w.write_detail("测试汇总", [[1]])
+        w.write_detail("Detail", [[1]])
+        w.write_detail("DETAIL", [[1]])
+        w.write_detail(long_name, [[1]])
+        w.write_detail(long_name, [[1], [2], [3]])
+
+    wb = _write(tmp_path, write, max_rows_per_sheet=2)
+    names = wb.sheetnames
+    assert names[:4] == ["测试汇总", "测试汇总_2", "Detail", "DETAIL_2"]
+    assert len({n.lower() for n in names}) == len(names)
+    assert all(len(n) <= EXCEL_MAX_SHEET_NAME_LEN for n in names)
+    assert names[4:] == ["x" * 31, "x" * 29 + "_2", "x" * 28 + "(2)", "x" * 28 + "(3)"]
+
+
+def test_max_rows_per_sheet_bounds(tmp_path):
+    with pytest.raises(ValueError):
+        ReportWriter(str(tmp_path / "r.xlsx"), max_rows_per_sheet=1)
@@ -0,0 +1,67 @@
+import copy
+
+import pytest
+
+from session_tester import codec
+from session_tester.request import ReqTemplate
+
+SKELETON = {
+    "cmd": "query",
+    "device": {"id": "", "os": "安卓", "tags": ["a", "标签"]},
+    "ts": 0,
+    "params": {"page": 1, "filter": {"city": "北京"}},
+}
+
+
+def _set(data: dict, field: str, value):
+    keys = field.split(".")
+    for k in keys[:-1]:
+        data = data.setdefault(k, {})
+    data[keys[-1]] = value
+
+
+@pytest.fixture(params=[codec.JSON_BACKEND_STDLIB, codec.JSON_BACKEND_ORJSON])
+def backend(request):
+    prev = codec.backend()
+    try:
+        codec.use_backend(request.param)
+    except RuntimeError:
+        pytest.skip(f"{request.param} is not installed")
+    yield request.param
+    codec.use_backend(prev)
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.parametrize("values", [
+    {"ts": 1700000000123, "device.id": "d-1", "params.filter.city": "上海"},
+    {"ts": 1.5, "device.id": {"imei": "终端", "n": [1, None]}, "params.filter.city": None},
+    {"ts": "ts-\"quoted\"\n", "device.id": "", "params.filter.city": ["深圳", "😀"]},
+])
+def test_render_equals_dumps(values):
+    template = ReqTemplate(SKELETON, list(values), url="http://localhost/q", http_method="POST")
+    expected = copy.deepcopy(SKELETON)
+    for field, value in values.items():
+        _set(expected, field, value)
+
+    body = template.render(values).req_data
+    assert body == codec.dumps(expected, ensure_ascii=True)
+    assert body.isascii()
+    assert codec.loads(body) == expected
+    # 骨架不被修改
+    assert SKELETON["device"]["id"] == ""
+
+
+def test_render_keyword_fields_and_new_nested_field():
+    template = ReqTemplate({"a": 1}, ["uid", "ext.token"], headers={"X-App": "t"})
+    req = template.render({"ext.token": "令牌"}, uid=7)
+    assert codec.loads(req.req_data) == {"a": 1, "uid": 7, "ext": {"token": "令牌"}}
+    assert req.headers == {"X-App": "t", "Content-Type": "application/json"}
+    assert template.render({"ext.token": "x"}, uid=8).headers is req.headers
+
+
+def test_missing_and_invalid_fields():
+    template = ReqTemplate(SKELETON, ["ts", "device.id"])
+    with pytest.raises(ValueError, match="device.id"):
+        template.render(ts=1)
+    with pytest.raises(ValueError):
+        ReqTemplate(SKELETON, ["cmd.x"])
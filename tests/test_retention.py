@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from session_tester import HttpTransaction, KeepAll, KeepDigestOnly, KeepLastN, KeepSampled, ResponseDroppedError, \
+    Session, UserInfo
+from session_tester.session_store import body_digest
+
+ROUNDS = 6
+
+
+def _body(i: int) -> str:
+    return f'{{"n": {i}, "name": "响应{i}"}}'
+
+
+def _run(retention) -> Session:
+    # 与 Client 一致: 每收到一个响应后调用 apply
+    s = Session("retention", create_flag=False)
+    s.session_id = 1
+    s.user_info = UserInfo(userid="u1")
+    for i in range(ROUNDS):
+        s.append_transaction(HttpTransaction("http://localhost/x", "POST", 200, "{}", _body(i)))
+        retention.apply(s)
+        assert s.transactions[-1].rsp_json()["n"] == i
+    return s
+
+
+def _kept(s: Session):
+    return [i for i, t in enumerate(s.transactions) if not t.response_dropped()]
+
+
+def test_keep_all():
+    assert _kept(_run(KeepAll())) == list(range(ROUNDS))
+
+
+def test_keep_digest_only_keeps_latest():
+    s = _run(KeepDigestOnly())
+    assert _kept(s) == [ROUNDS - 1]
+    t = s.transactions[0]
+    assert t.response is None
+    assert t.rsp_size == len(_body(0).encode('utf-8'))
+    assert t.rsp_digest == body_digest(_body(0).encode('utf-8'))
+    with pytest.raises(ResponseDroppedError):
+        t.rsp_json()
+    with pytest.raises(ResponseDroppedError):
+        t.extract("n")
+
+    # 丢弃信息随会话保存
+    restored = Session.from_json(s.to_json())
+    assert _kept(restored) == [ROUNDS - 1]
+    assert restored.transactions[0].rsp_digest == t.rsp_digest
+
+
+@pytest.mark.parametrize("n", [1, 2, ROUNDS, ROUNDS + 1])
+def test_keep_last_n(n):
+    assert _kept(_run(KeepLastN(n))) == list(range(max(0, ROUNDS - n), ROUNDS))
+
+
+def test_keep_last_n_rejects_zero():
+    with pytest.raises(ValueError):
+        KeepLastN(0)
+
+
+def test_keep_sampled(monkeypatch):
+    assert _kept(_run(KeepSampled(1))) == list(range(ROUNDS))
+    assert _kept(_run(KeepSampled(0))) == [ROUNDS - 1]
+
+    monkeypatch.setattr(random, "random", iter([0.1, 0.9, 0.4, 0.6, 0.2]).__next__)
+    assert _kept(_run(KeepSampled(0.5))) == [0, 2, 4, 5]
+
+    with pytest.raises(ValueError):
+        KeepSampled(1.5)
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from session_tester import RetryPolicy, Session, SessionMaintainerBase, StReq, sm_simple_n
+from session_tester.client import Client
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    policy = RetryPolicy(max_retries=10, backoff=0.1, backoff_factor=2, max_backoff=1, jitter=0)
+    assert [policy.backoff_delay(n) for n in range(1, 7)] == pytest.approx([0.1, 0.2, 0.4, 0.8, 1, 1])
+
+    jittered = RetryPolicy(backoff=1, jitter=0.5)
+    monkeypatch.setattr(random, "random", lambda: 1.0)
+    assert jittered.backoff_delay(1) == pytest.approx(0.5)
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+    assert jittered.backoff_delay(1) == pytest.approx(1)
+
+
+def test_max_retries():
+    policy = RetryPolicy(max_retries=2, backoff=0.1, jitter=0)
+    started = time.monotonic()
+    assert [policy.next_delay(n, None, started) for n in range(1, 4)] == pytest.approx([0.1, 0.2, None])
+    assert RetryPolicy(max_retries=0).next_delay(1, None, started) is None
+    with pytest.raises(ValueError):
+        RetryPolicy(max_retries=-1)
+    with pytest.raises(ValueError):
+        RetryPolicy(jitter=2)
+
+
+def test_retry_on_status():
+    started = time.monotonic()
+    explicit = RetryPolicy(max_retries=3, jitter=0)
+    for status in (429, 500, 502, 503, 504):
+        assert explicit.next_delay(1, status, started) is not None
+    for status in (400, 404, 501):
+        assert explicit.next_delay(1, status, started) is None
+    # 网络异常总是重试
+    assert explicit.next_delay(1, None, started) is not None
+
+    assert RetryPolicy(retry_on_status=[404]).next_delay(1, 404, started) is not None
+    assert RetryPolicy(retry_on_status=None).next_delay(1, 404, started) is not None
+
+
+def test_deadline():
+    policy = RetryPolicy(max_retries=5, backoff=0.3, jitter=0, deadline=1)
+    now = time.monotonic()
+    assert policy.next_delay(1, None, now) == pytest.approx(0.3)
+    # 等待后会超过总时限则不再重试
+    assert policy.next_delay(1, None, now - 0.8) is None
+
+    # 单次请求的超时不超过剩余时间
+    connect, read = policy.attempt_timeout((1, 5), now - 0.6)
+    assert connect == pytest.approx(0.4, abs=0.05) and read == pytest.approx(0.4, abs=0.05)
+    assert policy.attempt_timeout(0.1, now) == 0.1
+    assert policy.attempt_timeout(None, now - 2) == 0.001
+    assert RetryPolicy().attempt_timeout((1, 5), now - 100) == (1, 5)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    calls = 0
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers["Content-Length"]))
+        _Handler.calls += 1
+        body = b'{"ok": 1}'
+        self.send_response(404 if _Handler.calls == 1 else 200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+@sm_simple_n(1)
+class _SessionMaintainer(SessionMaintainerBase):
+    @staticmethod
+    def wrap_req(s: Session):
+        return StReq({"a": 1}, retry=s.ext_state["retry"])
+
+
+@pytest.fixture
+def http_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.calls = 0
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _send(url: str, retry: int, retry_policy: RetryPolicy = None):
+    s = Session("retry", create_flag=False)
+    s.ext_state = {"retry": retry}
+    Client(s, _SessionMaintainer(url, retry_policy=retry_policy)).run()
+    return s.transactions[0]
+
+
+@pytest.mark.parametrize("retry, status_code, calls", [(0, 404, 1), (1, 200, 2)])
+def test_default_policy_retries_any_status(http_url, retry, status_code, calls):
+    t = _send(http_url, retry)
+    assert (t.status_code, t.retry_cnt, _Handler.calls) == (status_code, calls - 1, calls)
+
+
+def test_explicit_policy_keeps_status_set(http_url):
+    t = _send(http_url, 3, RetryPolicy(max_retries=3, backoff=0.01))
+    assert (t.status_code, t.retry_cnt, _Handler.calls) == (404, 0, 1)
@@ -0,0 +1,103 @@
+import glob
+import os
+
+import pytest
+
+from session_tester import HttpTransaction, Session, UserInfo
+from session_tester.session_store import DedupSessionStore, SegmentSessionStore
+
+LABEL = "store"
+
+
+def _session(i: int, body: str) -> Session:
+    s = Session(LABEL, create_flag=False)
+    s.session_id = i
+    s.session_filename = f"{LABEL}-{i:08d}.json"
+    s.user_info = UserInfo(userid=f"u{i}", extra={"i": i})
+    s.transactions = [HttpTransaction("http://localhost/x", "POST", 200, f'{{"i": {i}}}', body, cost_time=0.01)]
+    return s
+
+
+def _write(store, n: int, body: str = None):
+    for i in range(1, n + 1):
+        store.write(_session(i, body or f'{{"n": {i}, "pad": "{"x" * 300}"}}'))
+    store.close()
+
+
+def _truncate(filename: str, n: int):
+    with open(filename, 'rb+') as file:
+        file.truncate(os.path.getsize(filename) - n)
+
+
+def _load(record) -> Session:
+    return Session.from_dict(record) if isinstance(record, dict) else Session.from_json(record)
+
+
+@pytest.mark.parametrize("store_cls", [SegmentSessionStore, DedupSessionStore])
+def test_round_trip_across_segments(tmp_path, store_cls):
+    store = store_cls(str(tmp_path), segment_size=1024)
+    expected = [_session(i, f'{{"n": {i}, "name": "会话{i}", "pad": "{"x" * 300}"}}') for i in range(1, 21)]
+    for s in expected:
+        store.write(s)
+    other = _session(99, '{"n": 99}')
+    other.label = "other"
+    store.write(other)
+
+    # 未关闭时读取先刷盘
+    assert [_load(r).session_id for r in store.read(LABEL, 20)] == list(range(1, 21))
+    store.close()
+    assert len(glob.glob(str(tmp_path / f"{LABEL}-seg-*.jsonl"))) > 1
+
+    sessions = [_load(r) for r in store_cls(str(tmp_path)).read(LABEL, 20)]
+    assert [s.session_id for s in sessions] == list(range(1, 21))
+    for s, e in zip(sessions, expected):
+        assert s.label == LABEL
+        assert s.user_info.to_dict() == e.user_info.to_dict()
+        assert [t.to_dict() for t in s.transactions] == [t.to_dict() for t in e.transactions]
+    assert sessions[3].transactions[0].rsp_json()["name"] == "会话4"
+
+    store = store_cls(str(tmp_path))
+    store.clear(LABEL)
+    assert not list(store.read(LABEL, 20))
+    assert [_load(r).session_id for r in store.read("other", 99)] == [99]
+
+
+@pytest.mark.parametrize("store_cls", [SegmentSessionStore, DedupSessionStore])
+def test_truncated_last_record_is_skipped(tmp_path, store_cls):
+    store = store_cls(str(tmp_path))
+    _write(store, 5)
+    segment, = glob.glob(str(tmp_path / f"{LABEL}-seg-*.jsonl"))
+    _truncate(segment, 20)
+
+    sessions = []
+    for record in store_cls(str(tmp_path)).read(LABEL, 5):
+        try:
+            sessions.append(_load(record))
+        except ValueError:
+            continue
+    assert [s.session_id for s in sessions] == [1, 2, 3, 4]
+    assert sessions[-1].transactions[0].rsp_json()["n"] == 4
+
+
+def test_truncated_blob_only_drops_its_body(tmp_path):
+    store = DedupSessionStore(str(tmp_path))
+    _write(store, 3)
+    blob, = glob.glob(str(tmp_path / f"{LABEL}-blob-*.dat"))
+    _truncate(blob, 10)
+
+    records = list(DedupSessionStore(str(tmp_path)).read(LABEL, 3))
+    assert len(records) == 3
+    responses = [r["transactions"][0]["response"] for r in records]
+    assert responses[-1] is None
+    assert [Session.from_dict(r).transactions[0].rsp_json()["n"] for r in records[:2]] == [1, 2]
+
+
+def test_truncated_blob_header_is_ignored(tmp_path):
+    store = DedupSessionStore(str(tmp_path))
+    _write(store, 3)
+    blob, = glob.glob(str(tmp_path / f"{LABEL}-blob-*.dat"))
+    with open(blob, 'ab') as file:
+        file.write(b"deadbeef")
+
+    records = list(DedupSessionStore(str(tmp_path)).read(LABEL, 3))
+    assert [Session.from_dict(r).transactions[0].rsp_json()["n"] for r in records] == [1, 2, 3]
@@ -0,0 +1,59 @@
+import multiprocessing
+
+import pytest
+
+from session_tester import HttpTransaction, Session, tag_dist
+from session_tester.cases import HttpTransactionDistStatCheckAllSessionCase
+
+
+class _UnpicklableSession(Session):
+    def __reduce_ex__(self, protocol):
+        raise AssertionError("sessions must not be sent to the worker processes")
+
+
+def _sessions(cnt: int):
+    sessions = []
+    for i in range(cnt):
+        s = _UnpicklableSession("tag", create_flag=False)
+        s.transactions = [HttpTransaction("http://localhost/x", "POST", 200, "{}",
+                                          f'{{"items": [{{"id": "a"}}, {{"id": "{"b" if (i + j) % 3 else "c"}"}}]}}')
+                          for j in range(4)]
+        sessions.append(s)
+    return sessions
+
+
+def _ids(rsp: dict):
+    return [item["id"] for item in rsp["items"]]
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="workers are forked")
+@pytest.mark.parametrize("level, tag_func", [
+    (tag_dist.TAG_LEVEL_TRANSACTION, _ids),
+    (tag_dist.TAG_LEVEL_SESSION, lambda s: len(s.transactions)),
+])
+def test_parallel_matches_serial(level, tag_func):
+    sessions = _sessions(50)
+    serial = tag_dist.count_tags(sessions, tag_func, level)
+    assert tag_dist.count_tags_parallel(sessions, tag_func, level, workers=3) == serial
+    assert sum(serial.values()) == (400 if level == tag_dist.TAG_LEVEL_TRANSACTION else 50)
+
+
+def _check(dist_expectation: dict, acc=None):
+    case = HttpTransactionDistStatCheckAllSessionCase("dist", "e", tag_path="items[*].id",
+                                                      dist_expectation=dist_expectation, tolerance=0.01)
+    if acc is None:
+        acc = case.safe_partial(_sessions(3))
+    return case.finish(acc)
+
+
+def test_check_absent_expected_tag_counts_as_zero():
+    # 3 个会话共 24 个标签: a 12 个，b 8 个，c 4 个
+    assert _check({"a": 0.5, "b": 1 / 3, "c": 1 / 6}).result
+    assert _check({"a": 0.5, "b": 1 / 3, "c": 1 / 6, "d": 0}).result
+
+    result = _check({"a": 0.5, "b": 1 / 3, "c": 1 / 6, "d": 0.1})
+    assert not result.result and "key d" in result.exception
+    assert result.report_lines[-1] == {"group": "d", "count": 0, "ratio": 0.0, "expectition": 0.1}
+
+    result = _check({"a": 0.5, "b": 1 / 3})
+    assert not result.result and "not in expectation" in result.exception
@@ -0,0 +1,44 @@
+import pickle
+from dataclasses import dataclass, field
+
+from session_tester import UserInfo
+
+
+@dataclass
+class _GameUser(UserInfo):
+    level: int = 0
+    tags: list = field(default_factory=list)
+
+
+def test_arbitrary_attributes():
+    u = UserInfo(userid="u1")
+    u.score = 3
+    assert u.score == 3
+    assert pickle.loads(pickle.dumps(u)).score == 3
+    assert "score" not in u.to_dict()
+
+
+def test_dataclass_subclass_fields_in_to_dict():
+    u = _GameUser(level=2, tags=["a"])
+    u.userid = "u1"
+    u.extra["k"] = 1
+    d = u.to_dict()
+    assert d["userid"] == "u1" and d["level"] == 2 and d["tags"] == ["a"] and d["extra"] == {"k": 1}
+    assert d["tags"] is not u.tags
+    assert pickle.loads(pickle.dumps(u)).to_dict() == d
+
+    # 还原为 UserInfo 时子类字段放入 extra
+    restored = UserInfo.from_dict(d)
+    assert restored.userid == "u1"
+    assert restored.extra == {"k": 1, "level": 2, "tags": ["a"]}
+
+
+def test_parse_keeps_unknown_fields_before_extra():
+    u = UserInfo()
+    u.parse({"userid": "u1", "k": 1, "extra": {"e": 2}})
+    assert u.userid == "u1"
+    assert u.extra == {"e": 2, "k": 1}
+
+    g = _GameUser()
+    g.parse({"level": 5, "x": 1})
+    assert g.level == 5 and g.extra == {"x": 1} and g.userid is None